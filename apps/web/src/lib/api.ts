@@ -16,3 +16,48 @@ export async function apiPost(path: string, token: string, body: any) {
   });
   return res.json();
 }
+
+// Follows GET /v1/lessons/{id}/events until the stream ends; returns a function that stops it.
+export function apiEvents(path: string, token: string, onEvent: (data: any) => void) {
+  const controller = new AbortController();
+  let lastEventId: string | null = null;
+
+  async function connect() {
+    const headers: Record<string, string> = { Authorization: `Bearer ${token}` };
+    if (lastEventId) headers["Last-Event-ID"] = lastEventId;
+    const res = await fetch(`http://localhost:8000${path}`, { headers, signal: controller.signal });
+    if (!res.ok || !res.body) return;
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) return;
+      buffer += decoder.decode(value, { stream: true });
+      const frames = buffer.split("\n\n");
+      buffer = frames.pop() ?? "";
+      for (const frame of frames) {
+        const id = frame.match(/^id: (.*)$/m);
+        const data = frame.match(/^data: (.*)$/m);
+        if (id) lastEventId = id[1];
+        if (data) onEvent(JSON.parse(data[1]));
+      }
+    }
+  }
+
+  (async () => {
+    // Reconnect after dropped connections; a finished lesson ends the stream normally.
+    while (!controller.signal.aborted) {
+      try {
+        await connect();
+        return;
+      } catch {
+        if (controller.signal.aborted) return;
+        await new Promise((resolve) => setTimeout(resolve, 3000));
+      }
+    }
+  })();
+
+  return () => controller.abort();
+}
@@ -1,7 +1,7 @@
 ﻿import React, { useEffect, useState } from "react";
 import { Pressable, StyleSheet, Text, View } from "react-native";
 import { supabase } from "../lib/supabase";
-import { apiGet } from "../lib/api";
+import { apiEvents, apiGet } from "../lib/api";
 
 export default function ReviewScreen(props: { lessonId: string; onBack: () => void }) {
   const [status, setStatus] = useState<any>(null);
@@ -14,8 +14,19 @@ export default function ReviewScreen(props: { lessonId: string; onBack: () => vo
   }
 
   useEffect(() => {
-    refresh();
-  }, []);
+    let stop: (() => void) | null = null;
+    let cancelled = false;
+    supabase.auth.getSession().then(({ data }) => {
+      if (cancelled || !data.session) return;
+      stop = apiEvents(`/v1/lessons/${props.lessonId}/events`, data.session.access_token, (event) =>
+        setStatus({ success: true, data: event })
+      );
+    });
+    return () => {
+      cancelled = true;
+      stop?.();
+    };
+  }, [props.lessonId]);
 
   return (
     <View style={styles.container}>
@@ -1,7 +1,27 @@
--- Reference schema, actual source of truth is supabase/migrations/001_init.sql
+-- Reference schema, actual source of truth is supabase/migrations/ (applied in order)
 
 -- profiles: 1 per auth user
 -- students: belongs to profile
 -- lessons: belongs to student plus profile
 -- outputs: 3 per lesson
 -- jobs: pipeline status and retry tracking
+-- ai_result_cache: extraction and generation results by content hash (service role only)
+-- audio_transcripts: transcripts by audio hash and model (service role only)
+-- pipeline_checkpoints: per-stage results of a running lesson, for resuming retries (service role only)
+-- rate_limits: shared OpenAI request and token buckets when OPENAI_RATE_STORE=table (service role only)
+-- inflight_calls: leases for AI calls in flight when SINGLE_FLIGHT_BACKEND=table (service role only)
+-- idempotency_keys: stored responses per (owner, Idempotency-Key), with a TTL (service role only)
+-- plan_weights, queue_clock, queue_tenants: fair job scheduling state; jobs.lane, jobs.vstart (015)
+-- lesson_status_v: view, lesson plus its latest job for status polling
+
+-- Indexes follow the API access paths (owner, lesson, newest first); see migrations 005-007.
+-- services/api/tests/test_query_plans.py fails when an API query falls back to a seq scan.
+
+-- RPCs (service role only)
+-- claim_job: next runnable job, FOR UPDATE SKIP LOCKED (002); fair across owners, interactive lane first (015)
+-- update_outputs_batch, mark_outputs_sent: owner-scoped batch output writes (008)
+-- complete_lesson, fail_lesson: pipeline results and failures in one transaction (009)
+-- rate_reserve, rate_pause: OpenAI budget shared across processes (011)
+-- inflight_claim, inflight_finish: one process runs an AI call, the others wait for its result (012)
+-- idempotency_claim, idempotency_complete: Idempotency-Key claim and stored response (013)
+-- apply_extraction_edit: corrected extraction plus the outputs regenerated from it (014)
@@ -4,13 +4,19 @@ from dataclasses import dataclass
 from typing import Protocol
 
 
+class AdapterError(Exception):
+    """A completion failed. The runner reports it against the output that asked for it."""
+
+
 @dataclass(frozen=True)
 class AdapterResult:
     text: str
 
 
 class LLMAdapter(Protocol):
-    def complete(self, prompt: str) -> AdapterResult: ...
+    def complete(self, prompt: str) -> AdapterResult:
+        """Raises AdapterError when the completion fails."""
+        ...
 
 
 class DeterministicAdapter:
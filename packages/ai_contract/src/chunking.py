@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+
+import jsonschema
+
+from .registry import registry
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_UNKNOWN = {"", "unknown"}
+
+
+def _norm(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _pieces(transcript: str, max_chars: int) -> list[str]:
+    """Speaker turns (lines); a turn longer than max_chars is split on sentence ends, then hard-wrapped."""
+    pieces: list[str] = []
+    for line in transcript.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if len(line) <= max_chars:
+            pieces.append(line)
+            continue
+        for sentence in _SENTENCE_END.split(line):
+            while len(sentence) > max_chars:
+                pieces.append(sentence[:max_chars])
+                sentence = sentence[max_chars:]
+            if sentence:
+                pieces.append(sentence)
+    return pieces
+
+
+def split_transcript(transcript: str, max_chars: int) -> list[str]:
+    """Pack whole speaker turns (or sentences of very long turns) into chunks of at most max_chars."""
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for piece in _pieces(transcript, max_chars):
+        if current and size + len(piece) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def chunk_note(index: int, total: int) -> str:
+    """Tells the model it is reading one part of a longer lesson."""
+    return (
+        f"This is part {index + 1} of {total} of a longer lesson transcript. "
+        "Extract only what this part contains; use \"Unknown\" or empty arrays for anything it does not mention."
+    )
+
+
+def _most_common(values: list[str]) -> str:
+    known = [v for v in values if v.strip().lower() not in _UNKNOWN]
+    if not known:
+        return values[0] if values else "Unknown"
+    counts = Counter(_norm(v) for v in known)
+    best = max(counts.values())
+    return next(v for v in known if counts[_norm(v)] == best)
+
+
+def _unique(items: list[str]) -> list[str]:
+    seen: set[str] = set()
+    out: list[str] = []
+    for item in items:
+        key = _norm(item)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+
+def merge_extractions(parts: list[dict]) -> dict:
+    """
+    Reduce per-chunk extractions (in transcript order) into one LessonExtraction.
+    - student and instrument: most frequent known value
+    - highlights and focus areas: de-duplicated, first mention wins
+    - assignments: de-duplicated by task, keeping the most confident version
+    - evidence: de-duplicated, each item tagged with the index of the chunk it was quoted from
+    Each part is validated first (registry.chunk_validator); a malformed one raises
+    jsonschema.ValidationError naming the part.
+    """
+    for index, part in enumerate(parts):
+        try:
+            registry.chunk_validator().validate(part)
+        except jsonschema.ValidationError as e:
+            raise jsonschema.ValidationError(f"part {index + 1} of {len(parts)}: {e.message}") from e
+
+    assignments: dict[str, dict] = {}
+    evidence: dict[tuple[str, str], dict] = {}
+    for index, part in enumerate(parts):
+        for assignment in part["assignments"]:
+            key = _norm(assignment["task"])
+            kept = assignments.get(key)
+            if kept is None or assignment["confidence"] > kept["confidence"]:
+                assignments[key] = dict(assignment)
+        for item in part["evidence"]:
+            key = (_norm(item["claim"]), _norm(item["quote"]))
+            if key not in evidence:
+                evidence[key] = {"claim": item["claim"], "quote": item["quote"], "chunk": index}
+
+    return {
+        "student": _most_common([p["student"] for p in parts]),
+        "instrument": _most_common([p["instrument"] for p in parts]),
+        "highlights": _unique([h for p in parts for h in p["highlights"]]),
+        "focus_areas": _unique([f for p in parts for f in p["focus_areas"]]),
+        "assignments": list(assignments.values()),
+        "evidence": list(evidence.values()),
+    }
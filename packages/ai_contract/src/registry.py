@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+
+from jsonschema import Draft202012Validator
+
+ROOT = Path(__file__).resolve().parents[1]
+
+EXTRACTION_SCHEMA = "lesson_extraction.schema.json"
+OUTPUTS_SCHEMA = "outputs.schema.json"
+
+# Output name -> prompt file. Order is the order outputs are reported in.
+OUTPUT_PROMPTS = {
+    "student_recap": "student_recap.md",
+    "practice_plan": "practice_plan.md",
+    "parent_email": "parent_email.md",
+}
+
+# Output name -> the extraction fields its prompt uses (prompts/dependencies.json).
+# Editing a field only regenerates the outputs that list it.
+DEPENDENCIES = "dependencies.json"
+
+
+class ContractRegistry:
+    """
+    Prompts, schemas and compiled validators, read from disk once per process.
+    Prompts that embed a schema are pre-rendered so per-call work is only the
+    dynamic part (transcript or extraction JSON).
+    Call reload() after editing prompt or schema files during development.
+    """
+
+    def __init__(self, root: Path = ROOT) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        self._texts: dict[Path, str] = {}
+        self._schemas: dict[str, dict] = {}
+        self._validators: dict[tuple[str, str | None], Draft202012Validator] = {}
+        self._rendered: dict[str, str] = {}
+        self._dependencies: dict[str, frozenset[str]] | None = None
+        self._chunk_validator: Draft202012Validator | None = None
+
+    def reload(self) -> None:
+        with self._lock:
+            self._texts.clear()
+            self._schemas.clear()
+            self._validators.clear()
+            self._rendered.clear()
+            self._dependencies = None
+            self._chunk_validator = None
+
+    def _text(self, path: Path) -> str:
+        text = self._texts.get(path)
+        if text is None:
+            text = path.read_text(encoding="utf-8")
+            with self._lock:
+                self._texts[path] = text
+        return text
+
+    def prompt(self, name: str) -> str:
+        return self._text(self.root / "prompts" / name)
+
+    def schema_text(self, name: str) -> str:
+        return self._text(self.root / "schema" / name)
+
+    def schema(self, name: str) -> dict:
+        schema = self._schemas.get(name)
+        if schema is None:
+            schema = json.loads(self.schema_text(name))
+            with self._lock:
+                self._schemas[name] = schema
+        return schema
+
+    def validator(self, name: str, prop: str | None = None) -> Draft202012Validator:
+        """Compiled validator for a schema, or for one top-level property of it."""
+        key = (name, prop)
+        validator = self._validators.get(key)
+        if validator is None:
+            schema = self.schema(name)
+            if prop is not None:
+                schema = schema["properties"][prop]
+            Draft202012Validator.check_schema(schema)
+            validator = Draft202012Validator(schema)
+            with self._lock:
+                self._validators[key] = validator
+        return validator
+
+    def chunk_validator(self) -> Draft202012Validator:
+        """
+        Validator for the extraction of one chunk of a long transcript: the extraction schema
+        with empty lists allowed, since one part of a lesson may mention no assignments.
+        """
+        validator = self._chunk_validator
+        if validator is None:
+            schema = json.loads(self.schema_text(EXTRACTION_SCHEMA))
+            for prop in schema["properties"].values():
+                prop.pop("minItems", None)
+            validator = Draft202012Validator(schema)
+            with self._lock:
+                self._chunk_validator = validator
+        return validator
+
+    def rendered(self, prompt_name: str, schema_name: str) -> str:
+        """Prompt with {{SCHEMA_JSON}} substituted; other placeholders are left for the caller."""
+        key = f"{prompt_name}:{schema_name}"
+        text = self._rendered.get(key)
+        if text is None:
+            text = self.prompt(prompt_name).replace("{{SCHEMA_JSON}}", self.schema_text(schema_name))
+            with self._lock:
+                self._rendered[key] = text
+        return text
+
+    def dependencies(self) -> dict[str, frozenset[str]]:
+        """Extraction fields per output. Every output must be listed, with fields the schema has."""
+        deps = self._dependencies
+        if deps is None:
+            raw = json.loads(self.prompt(DEPENDENCIES))
+            if set(raw) != set(OUTPUT_PROMPTS):
+                raise ValueError(f"{DEPENDENCIES} must list exactly {sorted(OUTPUT_PROMPTS)}")
+            fields = set(self.schema(EXTRACTION_SCHEMA)["properties"])
+            deps = {}
+            for name in OUTPUT_PROMPTS:
+                unknown = set(raw[name]) - fields
+                if unknown:
+                    raise ValueError(f"{DEPENDENCIES}: {name} uses unknown fields {sorted(unknown)}")
+                deps[name] = frozenset(raw[name])
+            with self._lock:
+                self._dependencies = deps
+        return deps
+
+    def affected_outputs(self, before: dict, after: dict) -> list[str]:
+        """Outputs (in OUTPUT_PROMPTS order) that read a field whose value differs between extractions."""
+        changed = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+        return [name for name, fields in self.dependencies().items() if fields & changed]
+
+    def output_input(self, name: str, extraction: dict) -> dict:
+        """The extraction fields that output name declares in dependencies.json, and no others."""
+        fields = self.dependencies()[name]
+        return {key: value for key, value in extraction.items() if key in fields}
+
+    def output_prompt(self, name: str, extraction: dict) -> str:
+        """
+        Prompt for one output, rendered with only its declared fields: an extraction edit that
+        affected_outputs() does not regenerate for can never change what the output was given.
+        """
+        data = json.dumps(self.output_input(name, extraction), ensure_ascii=False)
+        return self.prompt(OUTPUT_PROMPTS[name]).replace("{{EXTRACTION_JSON}}", data)
+
+    def combined_prompt(self, extraction: dict) -> str:
+        """
+        All-outputs prompt, rendered once with the union of the outputs' declared fields: a
+        field several outputs read is sent once, so one call never costs more input than three.
+        """
+        fields = frozenset().union(*self.dependencies().values())
+        data = json.dumps({k: v for k, v in extraction.items() if k in fields}, ensure_ascii=False)
+        return self.combined_outputs_prompt().replace("{{EXTRACTION_JSON}}", data)
+
+    def extraction_prompt(self) -> str:
+        return self.rendered("extraction.md", EXTRACTION_SCHEMA)
+
+    def combined_outputs_prompt(self) -> str:
+        return self.rendered("all_outputs.md", OUTPUTS_SCHEMA)
+
+
+registry = ContractRegistry()
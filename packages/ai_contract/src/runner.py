@@ -1,13 +1,22 @@
 from __future__ import annotations
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from .adapters import LLMAdapter
-from .validate import load_schema, validate_json
+import jsonschema
 
+from .adapters import AdapterError, LLMAdapter
+from .chunking import chunk_note, merge_extractions, split_transcript
+from .registry import EXTRACTION_SCHEMA, OUTPUT_PROMPTS, OUTPUTS_SCHEMA, registry
 
-ROOT = Path(__file__).resolve().parents[1]
+
+class GenerationError(Exception):
+    """One or more outputs failed. errors maps output name to a message."""
+
+    def __init__(self, errors: dict[str, str]) -> None:
+        super().__init__("; ".join(f"{k}: {v}" for k, v in errors.items()))
+        self.errors = errors
 
 
 def render_prompt(template_path: Path, replacements: dict[str, str]) -> str:
@@ -17,40 +26,91 @@ def render_prompt(template_path: Path, replacements: dict[str, str]) -> str:
     return text
 
 
-def extract(adapter: LLMAdapter, transcript: str) -> dict:
-    schema_path = ROOT / "schema" / "lesson_extraction.schema.json"
-    prompt_path = ROOT / "prompts" / "extraction.md"
-    schema_json = schema_path.read_text(encoding="utf-8")
-
-    prompt = render_prompt(
-        prompt_path,
-        {
-            "{{SCHEMA_JSON}}": schema_json,
-        },
-    ) + "\n\nTRANSCRIPT:\n" + transcript
-
-    raw = adapter.complete(prompt).text
-    data = json.loads(raw)
-
-    validate_json(data, load_schema(schema_path))
+def extract(adapter: LLMAdapter, transcript: str, max_chars: int | None = None, max_workers: int = 4) -> dict:
+    """
+    Extract the lesson facts. A transcript longer than max_chars is split on speaker and
+    sentence boundaries, each chunk is extracted concurrently and the results are merged.
+    """
+    chunks = split_transcript(transcript, max_chars) if max_chars and len(transcript) > max_chars else []
+    if len(chunks) <= 1:
+        prompt = registry.extraction_prompt() + "\n\nTRANSCRIPT:\n" + transcript
+        data = json.loads(adapter.complete(prompt).text)
+    else:
+
+        def extract_one(index: int) -> dict:
+            prompt = (
+                registry.extraction_prompt()
+                + "\n\n"
+                + chunk_note(index, len(chunks))
+                + "\n\nTRANSCRIPT:\n"
+                + chunks[index]
+            )
+            return json.loads(adapter.complete(prompt).text)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+            data = merge_extractions(list(pool.map(extract_one, range(len(chunks)))))
+
+    registry.validator(EXTRACTION_SCHEMA).validate(data)
     return data
 
 
-def generate(adapter: LLMAdapter, extraction_json: dict) -> dict:
-    schema_path = ROOT / "schema" / "outputs.schema.json"
-    schema = load_schema(schema_path)
-    extraction_str = json.dumps(extraction_json, ensure_ascii=False)
-
-    def gen_one(prompt_file: str) -> str:
-        p = ROOT / "prompts" / prompt_file
-        prompt = render_prompt(p, {"{{EXTRACTION_JSON}}": extraction_str})
-        return adapter.complete(prompt).text
-
-    outputs = {
-        "student_recap": gen_one("student_recap.md"),
-        "practice_plan": gen_one("practice_plan.md"),
-        "parent_email": gen_one("parent_email.md"),
+def _generate_each(
+    adapter: LLMAdapter, extraction_json: dict, names: list[str], max_workers: int
+) -> tuple[dict[str, str], dict[str, str]]:
+    def gen_one(name: str) -> str:
+        return adapter.complete(registry.output_prompt(name, extraction_json)).text
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as pool:
+        futures = {name: pool.submit(gen_one, name) for name in names}
+
+    outputs: dict[str, str] = {}
+    errors: dict[str, str] = {}
+    for name, future in futures.items():
+        try:
+            outputs[name] = future.result()
+            registry.validator(OUTPUTS_SCHEMA, name).validate(outputs[name])
+        except jsonschema.ValidationError as e:
+            errors[name] = e.message
+        except AdapterError as e:
+            errors[name] = str(e)
+    return outputs, errors
+
+
+def _generate_combined(adapter: LLMAdapter, extraction_json: dict) -> dict[str, str]:
+    """One completion for all outputs. Returns only the fields that pass their schema."""
+    try:
+        data = json.loads(adapter.complete(registry.combined_prompt(extraction_json)).text)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    return {
+        name: data[name]
+        for name in OUTPUT_PROMPTS
+        if registry.validator(OUTPUTS_SCHEMA, name).is_valid(data.get(name))
     }
 
-    validate_json(outputs, schema)
+
+def generate(adapter: LLMAdapter, extraction_json: dict, max_workers: int = 3, mode: str = "per_output") -> dict:
+    """
+    Generate all outputs from the extraction.
+    - per_output: one prompt per output, up to max_workers at once (1 runs them in sequence)
+    - combined: one JSON completion for all outputs; only fields that fail validation
+      fall back to their per-output prompt
+    """
+    outputs: dict[str, str] = {}
+    if mode == "combined":
+        outputs = _generate_combined(adapter, extraction_json)
+
+    missing = [name for name in OUTPUT_PROMPTS if name not in outputs]
+    errors: dict[str, str] = {}
+    if missing:
+        generated, errors = _generate_each(adapter, extraction_json, missing, max_workers)
+        outputs.update(generated)
+    if errors:
+        raise GenerationError(errors)
+
+    outputs = {name: outputs[name] for name in OUTPUT_PROMPTS}
+    registry.validator(OUTPUTS_SCHEMA).validate(outputs)
     return outputs
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import jsonschema
+import pytest
+from ai_contract.src.adapters import AdapterResult
+from ai_contract.src.chunking import merge_extractions, split_transcript
+from ai_contract.src.runner import extract
+
+ROOT = Path(__file__).resolve().parents[1]
+FIXTURE = ROOT / "fixtures" / "golden" / "fixture_0002_long"
+MAX_CHARS = 2500
+
+
+class ChunkReadingAdapter:
+    """Stands in for the model: extracts from whatever transcript part it is given, using fixed phrasings."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.chunks: list[str] = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt: str) -> AdapterResult:
+        chunk = prompt.split("TRANSCRIPT:\n", 1)[1]
+        with self._lock:
+            self.chunks.append(chunk)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+
+        data: dict = {
+            "student": "Maya" if "Hi Maya" in chunk else "Unknown",
+            "instrument": "Piano" if "piano" in chunk else "Unknown",
+            "highlights": [],
+            "focus_areas": [],
+            "assignments": [],
+            "evidence": [],
+        }
+        for line in chunk.splitlines():
+            quote = line.removeprefix("Teacher: ")
+            if m := re.search(r"Great work on the (.+?), that", line):
+                data["highlights"].append(m.group(1))
+            elif m := re.search(r"Watch the (.+)\.$", line):
+                data["focus_areas"].append(m.group(1)[0].upper() + m.group(1)[1:])
+            elif m := re.search(r"This week: (.+?), (.+)\.$", line):
+                task, target = m.groups()
+                data["assignments"].append(
+                    {"task": task, "target": target, "confidence": 0.9 if "metronome" in target else 0.7}
+                )
+                data["evidence"].append({"claim": f"Assigned: {task}", "quote": quote})
+        return AdapterResult(text=json.dumps(data))
+
+
+def test_split_keeps_speaker_turns_whole() -> None:
+    transcript = (FIXTURE / "transcript.txt").read_text(encoding="utf-8")
+    chunks = split_transcript(transcript, MAX_CHARS)
+
+    assert len(chunks) > 4
+    assert all(len(c) <= MAX_CHARS for c in chunks)
+    assert [line for c in chunks for line in c.splitlines()] == transcript.strip().splitlines()
+
+
+def test_split_long_turn_on_sentences() -> None:
+    turn = "Teacher: " + " ".join(f"Sentence number {i} is here." for i in range(40))
+    chunks = split_transcript(turn, 200)
+
+    assert all(len(c) <= 200 for c in chunks)
+    assert all(c.rstrip().endswith(".") for c in chunks)
+    assert " ".join(" ".join(c.splitlines()) for c in chunks) == turn
+
+
+def test_merge_dedupes_and_tags_evidence() -> None:
+    parts = [
+        {
+            "student": "Unknown",
+            "instrument": "Piano",
+            "highlights": ["C major scale"],
+            "focus_areas": ["Left hand rushing"],
+            "assignments": [{"task": "G major arpeggio", "target": "two octaves", "confidence": 0.6}],
+            "evidence": [{"claim": "Arpeggio assigned", "quote": "practice the G major arpeggio"}],
+        },
+        {
+            "student": "Maya",
+            "instrument": "piano",
+            "highlights": ["C Major scale.", "Even tone"],
+            "focus_areas": [],
+            "assignments": [{"task": "G major arpeggio", "target": "two octaves daily", "confidence": 0.8}],
+            "evidence": [
+                {"claim": "Arpeggio assigned", "quote": "practice the G major arpeggio"},
+                {"claim": "Tone praised", "quote": "nice even tone"},
+            ],
+        },
+    ]
+
+    merged = merge_extractions(parts)
+
+    assert merged["student"] == "Maya"
+    assert merged["instrument"] == "Piano"
+    assert merged["highlights"] == ["C major scale", "Even tone"]
+    assert merged["assignments"] == [{"task": "G major arpeggio", "target": "two octaves daily", "confidence": 0.8}]
+    assert [e["chunk"] for e in merged["evidence"]] == [0, 1]
+
+
+def test_malformed_part_fails_schema_validation_before_merging() -> None:
+    good = {
+        "student": "Maya",
+        "instrument": "Piano",
+        "highlights": [],
+        "focus_areas": [],
+        "assignments": [],
+        "evidence": [],
+    }
+    bad = {**good, "assignments": [{"target": "two octaves", "confidence": 0.6}]}
+
+    assert merge_extractions([good, good])["student"] == "Maya"
+    with pytest.raises(jsonschema.ValidationError) as exc:
+        merge_extractions([good, bad])
+    assert exc.value.message.startswith("part 2 of 2: ")
+    assert "'task' is a required property" in exc.value.message
+
+
+def test_fixture_0002_long_chunked_extraction() -> None:
+    transcript = (FIXTURE / "transcript.txt").read_text(encoding="utf-8")
+    expected = json.loads((FIXTURE / "expected_extraction.json").read_text(encoding="utf-8"))
+    adapter = ChunkReadingAdapter(delay=0.02)
+
+    got = extract(adapter, transcript, max_chars=MAX_CHARS, max_workers=4)
+
+    assert got == expected
+    assert len(adapter.chunks) == len(split_transcript(transcript, MAX_CHARS))
+    assert 1 < adapter.max_active <= 4
+    for item in got["evidence"]:
+        assert item["quote"] in split_transcript(transcript, MAX_CHARS)[item["chunk"]]
+
+
+def test_short_transcript_uses_single_prompt() -> None:
+    adapter = ChunkReadingAdapter()
+    transcript = (
+        "Teacher: Hi Maya, piano today.\n"
+        "Teacher: Great work on the C major scale, that was even.\n"
+        "Teacher: Watch the left hand.\n"
+        "Teacher: This week: G major arpeggio, two octaves daily."
+    )
+
+    got = extract(adapter, transcript, max_chars=MAX_CHARS)
+
+    assert len(adapter.chunks) == 1
+    assert "chunk" not in got["evidence"][0]
@@ -3,19 +3,32 @@ from __future__ import annotations
 import json
 from pathlib import Path
 
-from ai_contract.src.adapters import DeterministicAdapter
+from ai_contract.src.adapters import AdapterResult, DeterministicAdapter
 from ai_contract.src.runner import extract, generate
 
-
 ROOT = Path(__file__).resolve().parents[1]
 
 
-def test_fixture_0001_shapes() -> None:
-    fixture = ROOT / "fixtures" / "golden" / "fixture_0001"
-    transcript = (fixture / "transcript.txt").read_text(encoding="utf-8")
+class RecordingAdapter(DeterministicAdapter):
+    def __init__(self, mapping: dict[str, str]) -> None:
+        super().__init__(mapping)
+        self.prompts: list[str] = []
+
+    def complete(self, prompt: str) -> AdapterResult:
+        self.prompts.append(prompt)
+        return super().complete(prompt)
 
+
+def load_fixture(name: str) -> tuple[str, dict, dict]:
+    fixture = ROOT / "fixtures" / "golden" / name
+    transcript = (fixture / "transcript.txt").read_text(encoding="utf-8")
     expected_extraction = json.loads((fixture / "expected_extraction.json").read_text(encoding="utf-8"))
     expected_outputs = json.loads((fixture / "expected_outputs.json").read_text(encoding="utf-8"))
+    return transcript, expected_extraction, expected_outputs
+
+
+def test_fixture_0001_shapes() -> None:
+    transcript, expected_extraction, expected_outputs = load_fixture("fixture_0001")
 
     adapter = DeterministicAdapter(
         mapping={
@@ -31,3 +44,39 @@ def test_fixture_0001_shapes() -> None:
 
     assert set(got_extraction.keys()) == set(expected_extraction.keys())
     assert set(got_outputs.keys()) == set(expected_outputs.keys())
+
+
+def test_fixture_0001_combined_mode_single_call() -> None:
+    transcript, expected_extraction, expected_outputs = load_fixture("fixture_0001")
+
+    adapter = RecordingAdapter(
+        mapping={
+            "TRANSCRIPT:": json.dumps(expected_extraction),
+            "Write all three lesson outputs": json.dumps(expected_outputs),
+        }
+    )
+
+    got_outputs = generate(adapter, extract(adapter, transcript), mode="combined")
+
+    assert got_outputs == expected_outputs
+    assert len(adapter.prompts) == 2
+
+
+def test_fixture_0001_combined_mode_falls_back_per_field() -> None:
+    transcript, expected_extraction, expected_outputs = load_fixture("fixture_0001")
+    broken = {**expected_outputs, "practice_plan": "Day 1: scales"}
+
+    adapter = RecordingAdapter(
+        mapping={
+            "TRANSCRIPT:": json.dumps(expected_extraction),
+            "Write all three lesson outputs": json.dumps(broken),
+            "Write a 7 day practice plan": expected_outputs["practice_plan"],
+        }
+    )
+
+    got_outputs = generate(adapter, extract(adapter, transcript), mode="combined")
+
+    assert got_outputs == expected_outputs
+    fallback_prompts = adapter.prompts[2:]
+    assert len(fallback_prompts) == 1
+    assert "Write a 7 day practice plan" in fallback_prompts[0]
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from pathlib import Path
+
+import jsonschema
+import pytest
+from ai_contract.src.registry import (
+    EXTRACTION_SCHEMA,
+    OUTPUT_PROMPTS,
+    ContractRegistry,
+    registry,
+)
+from ai_contract.src.validate import load_schema, validate_json
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def load_extraction() -> dict:
+    path = ROOT / "fixtures" / "golden" / "fixture_0001" / "expected_extraction.json"
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def test_extraction_prompt_is_prerendered() -> None:
+    prompt = registry.extraction_prompt()
+    assert "{{SCHEMA_JSON}}" not in prompt
+    assert '"title": "LessonExtraction"' in prompt
+    assert registry.extraction_prompt() is prompt
+
+
+def test_validator_rejects_invalid() -> None:
+    with pytest.raises(jsonschema.ValidationError):
+        registry.validator(EXTRACTION_SCHEMA).validate({"student": "Sam"})
+
+
+def test_reload_picks_up_edited_files(tmp_path) -> None:
+    shutil.copytree(ROOT / "prompts", tmp_path / "prompts")
+    shutil.copytree(ROOT / "schema", tmp_path / "schema")
+    local = ContractRegistry(tmp_path)
+    assert local.prompt("student_recap.md").startswith("Write a student recap")
+
+    (tmp_path / "prompts" / "student_recap.md").write_text("Edited {{EXTRACTION_JSON}}", encoding="utf-8")
+    assert local.prompt("student_recap.md").startswith("Write a student recap")
+
+    local.reload()
+    assert local.prompt("student_recap.md") == "Edited {{EXTRACTION_JSON}}"
+
+
+def test_dependencies_map_fields_to_outputs() -> None:
+    deps = registry.dependencies()
+    assert set(deps) == set(OUTPUT_PROMPTS)
+    assert "assignments" in deps["practice_plan"]
+    assert "highlights" not in deps["practice_plan"]
+
+    before = load_extraction()
+    assert registry.affected_outputs(before, dict(before)) == []
+    edited = {**before, "highlights": ["Clean shifts"]}
+    assert registry.affected_outputs(before, edited) == ["student_recap", "parent_email"]
+    edited["assignments"] = [{"task": "Scales", "target": "60 bpm", "confidence": 0.9}]
+    assert registry.affected_outputs(before, edited) == list(OUTPUT_PROMPTS)
+    # Evidence is provenance for the teacher; no prompt reads it.
+    assert registry.affected_outputs(before, {**before, "evidence": []}) == []
+
+
+def test_prompts_see_only_their_declared_fields() -> None:
+    extraction = load_extraction()
+
+    for name, fields in registry.dependencies().items():
+        prompt = registry.output_prompt(name, extraction)
+        assert "{{EXTRACTION_JSON}}" not in prompt
+        given = json.loads(prompt.split("Input:\n", 1)[1])
+        assert set(given) == fields & set(extraction)
+
+    # An edit to a field practice_plan does not declare leaves its prompt unchanged.
+    renamed = {**extraction, "student": "Someone Else", "highlights": ["Clean shifts"]}
+    assert registry.affected_outputs(extraction, renamed) == ["student_recap", "parent_email"]
+    assert registry.output_prompt("practice_plan", renamed) == registry.output_prompt(
+        "practice_plan", extraction
+    )
+    # The combined prompt sends each field any output reads, once.
+    combined = json.loads(registry.combined_prompt(renamed).split("Input:\n", 1)[1])
+    merged: dict = {}
+    for name in OUTPUT_PROMPTS:
+        merged.update(registry.output_input(name, renamed))
+    assert combined == merged
+    per_output = sum(len(json.dumps(registry.output_input(n, renamed))) for n in OUTPUT_PROMPTS)
+    assert len(json.dumps(combined)) < per_output
+
+
+def test_dependencies_reject_unknown_fields(tmp_path) -> None:
+    shutil.copytree(ROOT / "prompts", tmp_path / "prompts")
+    shutil.copytree(ROOT / "schema", tmp_path / "schema")
+    deps = json.loads((tmp_path / "prompts" / "dependencies.json").read_text(encoding="utf-8"))
+    deps["practice_plan"].append("tempo")
+    (tmp_path / "prompts" / "dependencies.json").write_text(json.dumps(deps), encoding="utf-8")
+
+    with pytest.raises(ValueError, match="tempo"):
+        ContractRegistry(tmp_path).dependencies()
+
+
+def test_benchmark_per_call_overhead_drops() -> None:
+    """Micro-benchmark: disk reads plus jsonschema.validate versus the cached registry path."""
+    data = load_extraction()
+    schema_path = ROOT / "schema" / EXTRACTION_SCHEMA
+    prompt_path = ROOT / "prompts" / "extraction.md"
+    n = 200
+
+    started = time.perf_counter()
+    for _ in range(n):
+        prompt = prompt_path.read_text(encoding="utf-8").replace(
+            "{{SCHEMA_JSON}}", schema_path.read_text(encoding="utf-8")
+        )
+        validate_json(data, load_schema(schema_path))
+    uncached = (time.perf_counter() - started) / n
+
+    registry.extraction_prompt()
+    registry.validator(EXTRACTION_SCHEMA)
+    started = time.perf_counter()
+    for _ in range(n):
+        prompt = registry.extraction_prompt()
+        registry.validator(EXTRACTION_SCHEMA).validate(data)
+    cached = (time.perf_counter() - started) / n
+
+    assert prompt
+    print(f"per-call overhead: uncached {uncached * 1e6:.0f}us, registry {cached * 1e6:.0f}us")
+    assert cached * 3 < uncached
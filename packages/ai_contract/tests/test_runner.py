@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+from ai_contract.src.adapters import AdapterResult, DeterministicAdapter
+from ai_contract.src.runner import GenerationError, generate
+
+ROOT = Path(__file__).resolve().parents[1]
+
+OUTPUTS = {
+    "Write a student recap": "R" * 80,
+    "Write a 7 day practice plan": "P" * 160,
+    "Write a parent email": "E" * 80,
+}
+
+
+class SleepingAdapter(DeterministicAdapter):
+    def __init__(self, mapping: dict[str, str], delay: float) -> None:
+        super().__init__(mapping)
+        self.delay = delay
+
+    def complete(self, prompt: str) -> AdapterResult:
+        time.sleep(self.delay)
+        return super().complete(prompt)
+
+
+def load_extraction() -> dict:
+    path = ROOT / "fixtures" / "golden" / "fixture_0001" / "expected_extraction.json"
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def test_generate_concurrent_is_about_one_third_of_sequential() -> None:
+    delay = 0.2
+    extraction = load_extraction()
+
+    started = time.perf_counter()
+    sequential_out = generate(SleepingAdapter(OUTPUTS, delay), extraction, max_workers=1)
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    concurrent_out = generate(SleepingAdapter(OUTPUTS, delay), extraction, max_workers=3)
+    concurrent = time.perf_counter() - started
+
+    assert concurrent_out == sequential_out
+    assert sequential >= 3 * delay
+    assert concurrent < 2 * delay
+
+
+def test_generate_reports_errors_per_output() -> None:
+    adapter = DeterministicAdapter({**OUTPUTS, "Write a parent email": "short"})
+    with pytest.raises(GenerationError) as exc:
+        generate(adapter, load_extraction())
+    assert set(exc.value.errors) == {"parent_email"}
@@ -1,23 +1,226 @@
 from __future__ import annotations
 
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import jwt
 import requests
+from starlette.concurrency import run_in_threadpool
 
 from .errors import AppError
 from .settings import settings
 
+_ASYMMETRIC_ALGS = {"RS256", "ES256"}
+
+
+class UnknownSigningKey(Exception):
+    """Local verification cannot decide; the token may still be valid remotely."""
+
+
+class TokenCache:
+    """
+    Bounded TTL cache of already verified tokens.
+    Keys are token digests so raw bearer tokens are never held in memory longer than needed.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> str | None:
+        key = self._key(token)
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            user_id, expires_at = item
+            if expires_at <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return user_id
+
+    def put(self, token: str, user_id: str, token_exp: float | None = None) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        key = self._key(token)
+        with self._lock:
+            self._items[key] = (user_id, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
 
-def verify_supabase_token(access_token: str) -> str:
+
+def _fetch_jwks(url: str) -> dict:
+    resp = requests.get(url, timeout=10)
+    resp.raise_for_status()
+    return resp.json()
+
+
+class JWKSCache:
     """
-    Minimal MVP verification:
-    - Call Supabase auth user endpoint with the bearer token
-    - Return user id
+    Signing keys from the Supabase JWKS endpoint, keyed by kid.
+    Refreshed periodically in a daemon thread, and on demand when an unknown kid shows up
+    (key rotation), subject to a cooldown so bad tokens cannot hammer the endpoint.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        refresh_seconds: float = 300,
+        cooldown_seconds: float = 30,
+        fetch: Callable[[str], dict] = _fetch_jwks,
+    ) -> None:
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._fetch = fetch
+        self._keys: dict[str, Any] = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> None:
+        jwks = self._fetch(self.url)
+        keys: dict[str, Any] = {}
+        for jwk in jwks.get("keys", []):
+            kid = jwk.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk).key
+            except jwt.PyJWKError:
+                continue
+        with self._lock:
+            self._keys = keys
+            self._last_refresh = time.monotonic()
+
+    def get_key(self, kid: str, refresh: bool = True) -> Any | None:
+        """Look up a key; an unknown kid triggers a blocking refresh unless refresh is False."""
+        self._ensure_background_refresh()
+        with self._lock:
+            key = self._keys.get(kid)
+            stale = time.monotonic() - self._last_refresh >= self.cooldown_seconds
+        if key is not None or not stale or not refresh:
+            return key
+        try:
+            self.refresh()
+        except requests.RequestException:
+            return None
+        with self._lock:
+            return self._keys.get(kid)
+
+    def _ensure_background_refresh(self) -> None:
+        if self._thread is not None or self.refresh_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._refresh_loop, name="jwks-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(self.refresh_seconds)
+            try:
+                self.refresh()
+            except requests.RequestException:
+                # Keep serving the previous key set until the endpoint recovers.
+                continue
+
+
+token_cache = TokenCache(settings.auth_cache_max_entries, settings.auth_cache_ttl_seconds)
+jwks_cache = JWKSCache(
+    f"{settings.supabase_url}/auth/v1/.well-known/jwks.json",
+    refresh_seconds=settings.auth_jwks_refresh_seconds,
+)
+
+
+def verify_local(access_token: str, refresh_keys: bool = True) -> tuple[str, float]:
+    """
+    Check signature, expiry and audience without leaving the process.
+    Returns (user id, token expiry). Raises UnknownSigningKey if no local key applies.
+    With refresh_keys False an unknown kid never blocks on a JWKS download.
+    """
+    try:
+        header = jwt.get_unverified_header(access_token)
+    except jwt.PyJWTError:
+        raise AppError(code="AUTH_INVALID", message="Invalid or expired token")
+
+    alg = header.get("alg")
+    if alg == "HS256":
+        if not settings.supabase_jwt_secret:
+            raise UnknownSigningKey("No JWT secret configured")
+        key: Any = settings.supabase_jwt_secret
+    elif alg in _ASYMMETRIC_ALGS:
+        key = jwks_cache.get_key(header.get("kid") or "", refresh=refresh_keys)
+        if key is None:
+            raise UnknownSigningKey("Signing key not in JWKS")
+    else:
+        raise AppError(code="AUTH_INVALID", message="Unsupported token algorithm")
+
+    try:
+        claims = jwt.decode(
+            access_token,
+            key,
+            algorithms=[alg],
+            audience=settings.auth_audience,
+            options={"require": ["exp", "sub"]},
+        )
+    except jwt.PyJWTError:
+        raise AppError(code="AUTH_INVALID", message="Invalid or expired token")
+    return claims["sub"], float(claims["exp"])
+
+
+_http: httpx.AsyncClient | None = None
+
+
+def _auth_http() -> httpx.AsyncClient:
+    global _http
+    if _http is None:
+        _http = httpx.AsyncClient(timeout=10)
+    return _http
+
+
+async def close_auth_http() -> None:
+    global _http
+    if _http is not None:
+        await _http.aclose()
+    _http = None
+
+
+async def verify_remote(access_token: str) -> str:
+    """
+    Ask Supabase Auth who the token belongs to.
+    One network round-trip; only used in remote mode or as a fallback.
     """
     url = f"{settings.supabase_url}/auth/v1/user"
     headers = {
         "Authorization": f"Bearer {access_token}",
         "apikey": settings.supabase_anon_key,
     }
-    resp = requests.get(url, headers=headers, timeout=10)
+    try:
+        resp = await _auth_http().get(url, headers=headers)
+    except httpx.HTTPError:
+        raise AppError(code="AUTH_INVALID", message="Could not verify token")
     if resp.status_code != 200:
         raise AppError(code="AUTH_INVALID", message="Invalid or expired token")
     data = resp.json()
@@ -25,3 +228,34 @@ def verify_supabase_token(access_token: str) -> str:
     if not user_id:
         raise AppError(code="AUTH_INVALID", message="Missing user id")
     return user_id
+
+
+async def verify_supabase_token(access_token: str) -> str:
+    """
+    Return the user id for a Supabase access token.
+    - Already verified tokens are served from a bounded TTL cache
+    - auth_mode "local" checks the JWT with the project secret or JWKS
+    - Remote verification is used in "remote" mode, or as a fallback when no local key applies
+    Nothing here blocks the event loop: a JWKS refresh for an unknown kid runs in the threadpool.
+    """
+    cached = token_cache.get(access_token)
+    if cached is not None:
+        return cached
+
+    token_exp: float | None = None
+    if settings.auth_mode == "remote":
+        user_id = await verify_remote(access_token)
+    else:
+        try:
+            try:
+                user_id, token_exp = verify_local(access_token, refresh_keys=False)
+            except UnknownSigningKey:
+                # The keys may have rotated; fetch them off the event loop and try once more.
+                user_id, token_exp = await run_in_threadpool(verify_local, access_token)
+        except UnknownSigningKey:
+            if not settings.auth_remote_fallback:
+                raise AppError(code="AUTH_INVALID", message="Unknown token signing key")
+            user_id = await verify_remote(access_token)
+
+    token_cache.put(access_token, user_id, token_exp)
+    return user_id
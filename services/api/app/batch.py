@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+from .errors import AppError
+from .settings import settings
+
+
+def batch_items(payload: dict, key: str) -> list:
+    """The item list of a batch request body ({key: [...]}), bounded by BATCH_MAX_ITEMS."""
+    items = payload.get(key)
+    if not isinstance(items, list) or not items:
+        raise AppError(code="VALIDATION", message=f"{key} must be a non-empty list")
+    if len(items) > settings.batch_max_items:
+        raise AppError(
+            code="VALIDATION", message=f"At most {settings.batch_max_items} items per batch"
+        )
+    return items
+
+
+def optional_text(item: dict, key: str) -> str | None:
+    value = item.get(key)
+    if value is not None and not isinstance(value, str):
+        raise AppError(code="VALIDATION", message=f"{key} must be a string")
+    return value
+
+
+def item_id(item: dict) -> str:
+    """A row id; checked here because one malformed uuid would fail the whole batch statement."""
+    value = item.get("id")
+    try:
+        return str(uuid.UUID(value))
+    except (TypeError, ValueError, AttributeError):
+        raise AppError(code="VALIDATION", message="id must be a uuid") from None
+
+
+def validate_items(
+    items: list, check: Callable[[Any], dict]
+) -> tuple[list[tuple[int, dict]], dict[int, dict]]:
+    """
+    Run check on every item before anything is written.
+    check returns the row to write or raises AppError; failures become per-item errors.
+    """
+    valid: list[tuple[int, dict]] = []
+    errors: dict[int, dict] = {}
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise AppError(code="VALIDATION", message="Item must be an object")
+            valid.append((index, check(item)))
+        except AppError as e:
+            errors[index] = {"code": e.code, "message": e.message}
+    return valid, errors
+
+
+def unique_ids(valid: list[tuple[int, dict]], errors: dict[int, dict]) -> list[tuple[int, dict]]:
+    """Drop repeated ids (the first occurrence wins) so one batch never writes a row twice."""
+    seen: set[str] = set()
+    kept = []
+    for index, row in valid:
+        if row["id"] in seen:
+            errors[index] = {"code": "VALIDATION", "message": "Duplicate id in batch"}
+        else:
+            seen.add(row["id"])
+            kept.append((index, row))
+    return kept
+
+
+def item_results(count: int, written: dict[int, dict], errors: dict[int, dict], name: str) -> dict:
+    """Per-item results in request order, plus counts."""
+    results = []
+    for index in range(count):
+        if index in written:
+            results.append({"index": index, "success": True, name: written[index]})
+        else:
+            error = errors.get(index, {"code": "NOT_FOUND", "message": "Not found"})
+            results.append({"index": index, "success": False, "error": error})
+    return {
+        "results": results,
+        "succeeded": len(written),
+        "failed": count - len(written),
+    }
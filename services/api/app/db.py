@@ -1,9 +1,111 @@
 from __future__ import annotations
 
-from supabase import create_client, Client
+import asyncio
+import threading
+
+import httpx
+from postgrest.exceptions import APIError
+from supabase import (
+    AsyncClient,
+    AsyncClientOptions,
+    Client,
+    ClientOptions,
+    acreate_client,
+    create_client,
+)
 
 from .settings import settings
 
+# What a Supabase call raises when PostgREST rejects it or the database cannot be reached.
+DB_ERRORS = (APIError, httpx.HTTPError)
+
+# Sync client for the worker threads; async client for the request path.
+_client: Client | None = None
+_http: httpx.Client | None = None
+_lock = threading.Lock()
+_async_client: AsyncClient | None = None
+_async_http: httpx.AsyncClient | None = None
+_async_lock = asyncio.Lock()
+
+
+def _pool_options() -> dict:
+    return {
+        "http2": True,
+        "timeout": httpx.Timeout(settings.supabase_timeout_seconds),
+        "limits": httpx.Limits(
+            max_connections=settings.supabase_pool_size,
+            max_keepalive_connections=settings.supabase_pool_size,
+            keepalive_expiry=settings.supabase_keepalive_seconds,
+        ),
+        "follow_redirects": True,
+    }
+
+
+def _http_client() -> httpx.Client:
+    """Keep-alive pool shared by PostgREST, Storage and Functions calls."""
+    return httpx.Client(**_pool_options())
+
+
+def init_supabase() -> Client:
+    """Create the process-wide service client. Called from the app lifespan; safe to call twice."""
+    global _client, _http
+    with _lock:
+        if _client is None:
+            _http = _http_client()
+            _client = create_client(
+                settings.supabase_url,
+                settings.supabase_service_role_key,
+                options=ClientOptions(httpx_client=_http),
+            )
+        return _client
+
+
+def close_supabase() -> None:
+    global _client, _http
+    with _lock:
+        if _http is not None:
+            _http.close()
+        _client = None
+        _http = None
+
 
 def supabase_service() -> Client:
-    return create_client(settings.supabase_url, settings.supabase_service_role_key)
+    """
+    Return the application-scoped service client.
+    Routes call this per request; the client and its connection pool are created once.
+    """
+    client = _client
+    if client is None:
+        client = init_supabase()
+    return client
+
+
+async def init_supabase_async() -> AsyncClient:
+    """Create the process-wide async service client used by routes. Called from the app lifespan."""
+    global _async_client, _async_http
+    async with _async_lock:
+        if _async_client is None:
+            _async_http = httpx.AsyncClient(**_pool_options())
+            _async_client = await acreate_client(
+                settings.supabase_url,
+                settings.supabase_service_role_key,
+                options=AsyncClientOptions(httpx_client=_async_http),
+            )
+        return _async_client
+
+
+async def close_supabase_async() -> None:
+    global _async_client, _async_http
+    async with _async_lock:
+        if _async_http is not None:
+            await _async_http.aclose()
+        _async_client = None
+        _async_http = None
+
+
+async def supabase_async() -> AsyncClient:
+    """Async counterpart of supabase_service(): one client and pool for all requests."""
+    client = _async_client
+    if client is None:
+        client = await init_supabase_async()
+    return client
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from supabase import AsyncClient
+
+from .errors import AppError
+from .settings import settings
+
+MAX_KEY_LENGTH = 255
+
+
+def request_hash(scope: str, body: Any) -> str:
+    """Fingerprint of a request, so a key reused for a different request is rejected."""
+    text = json.dumps(body, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(f"{scope}\0{text}".encode()).hexdigest()
+
+
+async def _claim(sb: AsyncClient, user_id: str, key: str, scope: str, fingerprint: str) -> dict:
+    res = await sb.rpc(
+        "idempotency_claim",
+        {
+            "p_owner": user_id,
+            "p_key": key,
+            "p_scope": scope,
+            "p_request_hash": fingerprint,
+            "p_lock_seconds": settings.idempotency_lock_seconds,
+        },
+    ).execute()
+    return res.data or {}
+
+
+async def idempotent(
+    sb: AsyncClient,
+    user_id: str,
+    key: str | None,
+    scope: str,
+    body: Any,
+    run: Callable[[], Awaitable[dict]],
+) -> dict:
+    """
+    Run a mutation at most once per (user, Idempotency-Key) within IDEMPOTENCY_TTL_SECONDS.
+    The first request claims the key in public.idempotency_keys (migration 013) and stores its
+    response; replays get the stored response without running anything. A duplicate that
+    arrives while the first is still running waits for its response. A failed request releases
+    the key so the client can retry with it. Without a key, run() is called as usual.
+    """
+    if key is None:
+        return await run()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise AppError(
+            code="VALIDATION", message=f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"
+        )
+
+    fingerprint = request_hash(scope, body)
+    while True:
+        row = await _claim(sb, user_id, key, scope, fingerprint)
+        if row.get("claimed"):
+            break
+        if row.get("scope") != scope or row.get("request_hash") != fingerprint:
+            raise AppError(
+                code="IDEMPOTENCY_MISMATCH",
+                message="Idempotency-Key was already used for a different request",
+            )
+        if row.get("status") == "done":
+            return row["response"]
+        # The first request is still running: wait for its response, or for its lock to lapse.
+        await asyncio.sleep(settings.idempotency_poll_seconds)
+
+    try:
+        response = await run()
+    except BaseException:
+        await sb.table("idempotency_keys").delete().eq("owner_id", user_id).eq("key", key).execute()
+        raise
+    await sb.rpc(
+        "idempotency_complete",
+        {
+            "p_owner": user_id,
+            "p_key": key,
+            "p_response": response,
+            "p_ttl_seconds": settings.idempotency_ttl_seconds,
+        },
+    ).execute()
+    return response
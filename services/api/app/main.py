@@ -1,15 +1,38 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
 
+from .auth import close_auth_http
+from .db import close_supabase, close_supabase_async, init_supabase_async
 from .errors import AppError
 from .routes.health import router as health_router
-from .routes.students import router as students_router
 from .routes.lessons import router as lessons_router
 from .routes.outputs import router as outputs_router
+from .routes.students import router as students_router
+from .settings import settings
+from .worker import start_workers
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await init_supabase_async()
+    # In-process workers are optional; production runs `python -m app.worker` separately.
+    pool = start_workers(settings.worker_concurrency) if settings.worker_concurrency > 0 else None
+    try:
+        yield
+    finally:
+        if pool is not None:
+            pool.stop(timeout=5)
+        close_supabase()
+        await close_supabase_async()
+        await close_auth_http()
+
 
-app = FastAPI(title="Note^2 API", version="0.1.0")
+app = FastAPI(title="Note^2 API", version="0.1.0", lifespan=lifespan)
 
 app.include_router(health_router)
 app.include_router(students_router)
@@ -19,4 +42,7 @@ app.include_router(outputs_router)
 
 @app.exception_handler(AppError)
 def app_error_handler(_, exc: AppError) -> JSONResponse:
-    return JSONResponse(status_code=400, content={"success": False, "error": {"code": exc.code, "message": exc.message}})
+    return JSONResponse(
+        status_code=400,
+        content={"success": False, "error": {"code": exc.code, "message": exc.message}},
+    )
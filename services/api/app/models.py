@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
@@ -17,6 +19,8 @@ class CreateLessonRequest(BaseModel):
     studentId: str
     title: str | None = None
     audioStoragePath: str = Field(min_length=1)
+    # bulk: backfill and multi-lesson uploads, claimed only when no interactive job is waiting.
+    lane: Literal["interactive", "bulk"] = "interactive"
 
 
 class LessonStatusResponse(BaseModel):
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import base64
+import json
+from typing import Any
+
+from .errors import AppError
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Every page is ordered newest first on (created_at, id); both columns are always selected
+# so the last row of a page can become the next cursor.
+KEYSET_COLUMNS = ("created_at", "id")
+
+
+def encode_cursor(row: dict) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id_ = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, TypeError, UnicodeError):
+        raise AppError(code="VALIDATION", message="Invalid cursor") from None
+    if not isinstance(created_at, str) or not isinstance(id_, str):
+        raise AppError(code="VALIDATION", message="Invalid cursor")
+    return created_at, id_
+
+
+def page_size(limit: int | None) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise AppError(code="VALIDATION", message=f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+def select_columns(fields: str | None, allowed: tuple[str, ...], default: tuple[str, ...]) -> str:
+    """
+    Column list for a ?fields=a,b projection. Only names in allowed are accepted;
+    the keyset columns are always included.
+    """
+    requested = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(default)
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise AppError(code="VALIDATION", message=f"Unknown fields: {', '.join(unknown)}")
+    columns = list(KEYSET_COLUMNS) + [f for f in requested if f not in KEYSET_COLUMNS]
+    return ", ".join(dict.fromkeys(columns))
+
+
+def after_cursor(query: Any, cursor: str | None) -> Any:
+    """Restrict a newest-first query to rows strictly after the cursor row."""
+    if not cursor:
+        return query
+    created_at, id_ = decode_cursor(cursor)
+    # Values are quoted: timestamps contain characters PostgREST reserves inside or=(...).
+    return query.or_(
+        f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{id_}")'
+    )
+
+
+async def fetch_page(query: Any, cursor: str | None, limit: int) -> tuple[list[dict], str | None]:
+    """
+    Run a keyset-paginated query. One extra row is fetched to tell whether another page exists,
+    so the last page never returns a cursor to an empty page.
+    """
+    query = after_cursor(query, cursor)
+    res = await (
+        query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute()
+    )
+    rows = res.data or []
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
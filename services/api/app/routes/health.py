@@ -2,9 +2,26 @@ from __future__ import annotations
 
 from fastapi import APIRouter
 
+from ..services import rate_governor, result_cache, single_flight
+
 router = APIRouter()
 
 
 @router.get("/health")
-def health() -> dict:
+async def health() -> dict:
     return {"success": True, "data": {"status": "ok"}}
+
+
+@router.get("/metrics")
+async def metrics() -> dict:
+    return {
+        "success": True,
+        "data": {
+            "aiCache": result_cache.stats.snapshot(),
+            "openai": rate_governor.governor.snapshot(),
+            "singleFlight": {
+                "inFlight": single_flight.flights.in_flight(),
+                "shared": single_flight.flights.shared,
+            },
+        },
+    }
@@ -1,82 +1,169 @@
 from __future__ import annotations
 
-import tempfile
-from fastapi import APIRouter, Header
+from typing import Annotated
+
+from fastapi import APIRouter, Header, Request, Response
+from fastapi.responses import StreamingResponse
 
 from ..auth import verify_supabase_token
-from ..db import supabase_service
+from ..db import supabase_async
 from ..errors import AppError
+from ..idempotency import idempotent
 from ..models import CreateLessonRequest
-from ..services.openai_client import client as openai_client
-from ..services.ai_pipeline import transcribe, extract, generate
+from ..services import events
+from ..services.extraction_edits import apply_extraction_patch
+from ..services.openai_client import async_client as openai_client
+from ..services.output_stream import output_events
+from ..settings import settings
 
 router = APIRouter(prefix="/v1/lessons", tags=["lessons"])
 
 
 @router.post("")
-def create_lesson(req: CreateLessonRequest, authorization: str = Header(...)) -> dict:
+async def create_lesson(
+    req: CreateLessonRequest,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
+    """
+    Enqueue a lesson for processing and return immediately.
+    Transcription, extraction and generation run in the worker (app/worker.py).
+    With an Idempotency-Key, a retried request returns the first lesson instead of a new one.
+    """
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
-
-    sb = supabase_service()
-
-    lesson = sb.table("lessons").insert(
-        {
-            "owner_id": user_id,
-            "student_id": req.studentId,
-            "title": req.title,
-            "status": "TRANSCRIBING",
-            "audio_path": req.audioStoragePath,
-        }
-    ).execute().data[0]
-
-    job = sb.table("jobs").insert(
-        {"owner_id": user_id, "lesson_id": lesson["id"], "step": "TRANSCRIBING", "progress": 5}
-    ).execute().data[0]
-
-    # MVP pipeline runs inline for simplicity.
-    # For longer audio, migrate this to a worker without changing API contract.
-
-    try:
-        oai = openai_client()
-
-        # Downloading audio from storage is environment specific.
-        # In MVP, expect the client to also upload a short proxy file to the API in a later iteration.
-        # For now, we fail fast if we cannot access the file.
-        raise AppError(code="NOT_IMPLEMENTED", message="Audio fetch from storage not wired yet")
-
-    except AppError as e:
-        sb.table("lessons").update({"status": "FAILED", "error_code": e.code, "error_message": e.message}).eq(
-            "id", lesson["id"]
+    user_id = await verify_supabase_token(token)
+
+    sb = await supabase_async()
+
+    async def enqueue() -> dict:
+        # Lesson and job are inserted in one transaction (migration 016): a lesson is never
+        # left QUEUED without a job to process it.
+        res = await sb.rpc(
+            "create_lesson",
+            {
+                "p_owner": user_id,
+                "p_student_id": req.studentId,
+                "p_title": req.title,
+                "p_audio_path": req.audioStoragePath,
+                "p_lane": req.lane,
+            },
         ).execute()
-        sb.table("jobs").update({"step": "FAILED", "progress": 100, "last_error": e.message}).eq("id", job["id"]).execute()
-        return {"success": False, "error": {"code": e.code, "message": e.message}}
+        return {"success": True, "data": {"lessonId": res.data, "status": "QUEUED"}}
+
+    return await idempotent(
+        sb, user_id, idempotency_key, "POST /v1/lessons", req.model_dump(), enqueue
+    )
+
+
+@router.get("/{lesson_id}/status", response_model=None)
+async def lesson_status(
+    lesson_id: str,
+    response: Response,
+    authorization: str = Header(...),
+    if_none_match: str | None = Header(None),
+) -> dict | Response:
+    """
+    Polled by clients while a lesson is processing. Sends an ETag; a poll whose
+    If-None-Match still matches gets 304 with no body.
+    """
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
+
+    sb = await supabase_async()
+    row = await events.read_status_row(sb, lesson_id, user_id)
+
+    etag = events.status_etag(row)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if events.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return {"success": True, "data": events.to_state(lesson_id, row)}
+
+
+@router.get("/{lesson_id}/events")
+async def lesson_events(
+    lesson_id: str,
+    request: Request,
+    authorization: str | None = Header(None),
+    last_event_id: str | None = Header(None),
+    access_token: str | None = None,
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of lesson status, closed once the lesson is READY or FAILED.
+    Browsers' EventSource cannot send headers, so the token may also be passed as ?access_token=.
+    """
+    token = authorization.replace("Bearer ", "") if authorization else access_token
+    if not token:
+        raise AppError(code="AUTH_INVALID", message="Missing token")
+    user_id = await verify_supabase_token(token)
+
+    sb = await supabase_async()
+
+    # Fails with NOT_FOUND before the stream starts; the stream reads the state again once subscribed.
+    await events.read_state(sb, lesson_id, user_id)
+
+    stream = events.stream_lesson(
+        lesson_id,
+        poll=lambda: events.read_state(sb, lesson_id, user_id),
+        last_event_id=last_event_id,
+        heartbeat_seconds=settings.events_heartbeat_seconds,
+        poll_seconds=settings.events_poll_seconds,
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _lesson_with_extraction(sb, lesson_id: str, user_id: str) -> dict:
+    res = await (
+        sb.table("lessons")
+        .select("id, owner_id, extraction")
+        .eq("id", lesson_id)
+        .eq("owner_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    rows = res.data
+    if not rows:
+        raise AppError(code="NOT_FOUND", message="Lesson not found")
+    if not rows[0].get("extraction"):
+        raise AppError(code="NOT_READY", message="Lesson has no extraction yet")
+    return rows[0]
+
+
+@router.post("/{lesson_id}/generate")
+async def generate_outputs(lesson_id: str, authorization: str = Header(...)) -> StreamingResponse:
+    """
+    Regenerate the lesson outputs from its stored extraction, streaming text as it is produced
+    (text/event-stream: delta, then done or error). Outputs are saved only once all three validate.
+    """
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
 
-    except Exception as e:
-        msg = str(e)
-        sb.table("lessons").update({"status": "FAILED", "error_code": "UNKNOWN", "error_message": msg}).eq(
-            "id", lesson["id"]
-        ).execute()
-        sb.table("jobs").update({"step": "FAILED", "progress": 100, "last_error": msg}).eq("id", job["id"]).execute()
-        return {"success": False, "error": {"code": "UNKNOWN", "message": msg}}
+    sb = await supabase_async()
+    lesson = await _lesson_with_extraction(sb, lesson_id, user_id)
+
+    return StreamingResponse(
+        output_events(sb, openai_client(), lesson),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@router.get("/{lesson_id}/status")
-def lesson_status(lesson_id: str, authorization: str = Header(...)) -> dict:
+@router.patch("/{lesson_id}/extraction")
+async def edit_extraction(lesson_id: str, payload: dict, authorization: str = Header(...)) -> dict:
+    """
+    Body: {"extraction": {field: value, ...}} replaces those top-level fields of the extraction.
+    Only the outputs that depend on a changed field are regenerated; the response lists them.
+    """
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
-
-    sb = supabase_service()
-    lesson = sb.table("lessons").select("*").eq("id", lesson_id).eq("owner_id", user_id).single().execute().data
-    job = sb.table("jobs").select("*").eq("lesson_id", lesson_id).eq("owner_id", user_id).single().execute().data
-
-    return {
-        "success": True,
-        "data": {
-            "lessonId": lesson_id,
-            "status": lesson["status"],
-            "step": job["step"],
-            "progress": job["progress"],
-            "lastError": job.get("last_error"),
-        },
-    }
+    user_id = await verify_supabase_token(token)
+
+    sb = await supabase_async()
+    lesson = await _lesson_with_extraction(sb, lesson_id, user_id)
+    data = await apply_extraction_patch(sb, openai_client(), lesson, payload.get("extraction"))
+    return {"success": True, "data": data}
@@ -1,55 +1,183 @@
 from __future__ import annotations
 
+from typing import Annotated
+
 from fastapi import APIRouter, Header
 
 from ..auth import verify_supabase_token
-from ..db import supabase_service
-from ..services.emailer import can_send, build_mailto
+from ..batch import (
+    batch_items,
+    item_id,
+    item_results,
+    optional_text,
+    unique_ids,
+    validate_items,
+)
+from ..db import supabase_async
+from ..idempotency import idempotent
+from ..services.emailer import build_mailto, can_send
 
 router = APIRouter(prefix="/v1/outputs", tags=["outputs"])
 
 
+async def _write_batch(
+    rpc: str, user_id: str, items: list, check, idempotency_key: str | None, scope: str
+) -> dict:
+    """
+    Validate every item, then write the valid ones with one owner-scoped RPC
+    (jsonb_to_recordset update, migration 008). Ids that are not the caller's come back NOT_FOUND.
+    """
+    valid, errors = validate_items(items, check)
+    valid = unique_ids(valid, errors)
+    sb = await supabase_async()
+
+    async def write() -> dict:
+        written: dict[int, dict] = {}
+        if valid:
+            res = await sb.rpc(
+                rpc, {"p_owner": user_id, "p_items": [row for _, row in valid]}
+            ).execute()
+            by_id = {row["id"]: row for row in res.data or []}
+            written = {index: by_id[row["id"]] for index, row in valid if row["id"] in by_id}
+        return {"success": True, "data": item_results(len(items), written, errors, "output")}
+
+    return await idempotent(sb, user_id, idempotency_key, scope, items, write)
+
+
+@router.patch(":batch")
+async def update_outputs_batch(
+    payload: dict,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
+    """Body: {"outputs": [{"id", "editedContent"}, ...]}; edits many outputs in one statement."""
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
+    items = batch_items(payload, "outputs")
+
+    def check(item: dict) -> dict:
+        return {"id": item_id(item), "edited_content": optional_text(item, "editedContent")}
+
+    return await _write_batch(
+        "update_outputs_batch", user_id, items, check, idempotency_key, "PATCH /v1/outputs:batch"
+    )
+
+
+@router.post("/sent:batch")
+async def mark_sent_batch(
+    payload: dict,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
+    """Body: {"outputs": [{"id", "sentTo", "sentVia"}, ...]}; marks many outputs sent at once."""
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
+    items = batch_items(payload, "outputs")
+
+    def check(item: dict) -> dict:
+        return {
+            "id": item_id(item),
+            "sent_to": optional_text(item, "sentTo"),
+            "sent_via": optional_text(item, "sentVia"),
+        }
+
+    return await _write_batch(
+        "mark_outputs_sent", user_id, items, check, idempotency_key, "POST /v1/outputs/sent:batch"
+    )
+
+
 @router.patch("/{output_id}")
-def update_output(output_id: str, payload: dict, authorization: str = Header(...)) -> dict:
+async def update_output(
+    output_id: str,
+    payload: dict,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
+    user_id = await verify_supabase_token(token)
 
     edited = payload.get("editedContent")
-    sb = supabase_service()
-    res = sb.table("outputs").update({"edited_content": edited}).eq("id", output_id).eq("owner_id", user_id).execute()
-    return {"success": True, "data": {"output": res.data[0]}}
+    sb = await supabase_async()
+
+    async def update() -> dict:
+        res = await (
+            sb.table("outputs")
+            .update({"edited_content": edited})
+            .eq("id", output_id)
+            .eq("owner_id", user_id)
+            .execute()
+        )
+        return {"success": True, "data": {"output": res.data[0]}}
+
+    scope = f"PATCH /v1/outputs/{output_id}"
+    return await idempotent(sb, user_id, idempotency_key, scope, payload, update)
 
 
 @router.post("/{output_id}/sent")
-def mark_sent(output_id: str, payload: dict, authorization: str = Header(...)) -> dict:
+async def mark_sent(
+    output_id: str,
+    payload: dict,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
+    """With an Idempotency-Key, a retry returns the first response and keeps the first sent_at."""
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
+    user_id = await verify_supabase_token(token)
+
+    sb = await supabase_async()
+
+    async def mark() -> dict:
+        res = (
+            await sb.table("outputs")
+            .update(
+                {
+                    "sent_to": payload.get("sentTo"),
+                    "sent_via": payload.get("sentVia"),
+                    "sent_at": "now()",
+                }
+            )
+            .eq("id", output_id)
+            .eq("owner_id", user_id)
+            .execute()
+        )
+        return {"success": True, "data": {"output": res.data[0]}}
 
-    sb = supabase_service()
-    res = sb.table("outputs").update(
-        {"sent_to": payload.get("sentTo"), "sent_via": payload.get("sentVia"), "sent_at": "now()"}
-    ).eq("id", output_id).eq("owner_id", user_id).execute()
-    return {"success": True, "data": {"output": res.data[0]}}
+    scope = f"POST /v1/outputs/{output_id}/sent"
+    return await idempotent(sb, user_id, idempotency_key, scope, payload, mark)
 
 
 @router.post("/{output_id}/send-email")
-def send_email(output_id: str, payload: dict, authorization: str = Header(...)) -> dict:
+async def send_email(output_id: str, payload: dict, authorization: str = Header(...)) -> dict:
     """
     MVP behavior:
     - If Resend configured, later implement real send.
     - Otherwise return a mailto link the app can open.
     """
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
+    user_id = await verify_supabase_token(token)
 
-    sb = supabase_service()
-    out = sb.table("outputs").select("*").eq("id", output_id).eq("owner_id", user_id).single().execute().data
+    sb = await supabase_async()
+    res = (
+        await sb.table("outputs")
+        .select("*")
+        .eq("id", output_id)
+        .eq("owner_id", user_id)
+        .single()
+        .execute()
+    )
+    out = res.data
 
     to = payload.get("to") or out.get("sent_to")
     subject = "Lesson summary"
     body = (out.get("edited_content") or out.get("content") or "").strip()
 
     if not can_send():
-        return {"success": True, "data": {"method": "mailto", "mailto": build_mailto(to, subject, body)}}
+        return {
+            "success": True,
+            "data": {"method": "mailto", "mailto": build_mailto(to, subject, body)},
+        }
 
-    return {"success": False, "error": {"code": "NOT_IMPLEMENTED", "message": "Resend integration stub"}}
+    return {
+        "success": False,
+        "error": {"code": "NOT_IMPLEMENTED", "message": "Resend integration stub"},
+    }
@@ -1,40 +1,141 @@
 from __future__ import annotations
 
+from typing import Annotated
+
 from fastapi import APIRouter, Header
 
 from ..auth import verify_supabase_token
-from ..db import supabase_service
+from ..batch import batch_items, item_results, optional_text, validate_items
+from ..db import supabase_async
 from ..errors import AppError
+from ..idempotency import idempotent
+from ..pagination import fetch_page, page_size, select_columns
 
 router = APIRouter(prefix="/v1/students", tags=["students"])
 
 
+STUDENT_FIELDS = ("id", "created_at", "name", "instrument", "parent_email")
+LESSON_FIELDS = (
+    "id",
+    "created_at",
+    "student_id",
+    "title",
+    "status",
+    "audio_path",
+    "error_code",
+    "error_message",
+    "extraction",
+    "transcript",
+)
+# Transcripts and extractions can be tens of kilobytes each; list them only when asked for.
+LESSON_DEFAULT_FIELDS = ("student_id", "title", "status", "error_code", "error_message")
+
+
+@router.post(":batch")
+async def create_students_batch(
+    payload: dict,
+    authorization: str = Header(...),
+    idempotency_key: Annotated[str | None, Header()] = None,
+) -> dict:
+    """
+    Create many students in one insert. Body: {"students": [{"name", "instrument",
+    "parent_email"}, ...]}. Every item is validated first; invalid items get a per-item error
+    and the rest are written together.
+    """
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
+    items = batch_items(payload, "students")
+
+    def check(item: dict) -> dict:
+        name = item.get("name")
+        if not isinstance(name, str) or not name.strip():
+            raise AppError(code="VALIDATION", message="Student name required")
+        return {
+            "owner_id": user_id,
+            "name": name.strip(),
+            "instrument": optional_text(item, "instrument"),
+            "parent_email": optional_text(item, "parent_email"),
+        }
+
+    valid, errors = validate_items(items, check)
+    sb = await supabase_async()
+
+    async def insert() -> dict:
+        written: dict[int, dict] = {}
+        if valid:
+            res = await sb.table("students").insert([row for _, row in valid]).execute()
+            # PostgREST returns inserted rows in the order they were sent.
+            written = {index: row for (index, _), row in zip(valid, res.data, strict=True)}
+        return {"success": True, "data": item_results(len(items), written, errors, "student")}
+
+    return await idempotent(sb, user_id, idempotency_key, "POST /v1/students:batch", items, insert)
+
+
 @router.get("")
-def list_students(authorization: str = Header(...)) -> dict:
+async def list_students(
+    authorization: str = Header(...),
+    limit: int | None = None,
+    cursor: str | None = None,
+    fields: str | None = None,
+) -> dict:
+    """
+    Newest first, one page at a time. Pass data.nextCursor back as ?cursor= for the next page;
+    it is null on the last page. ?fields=name,instrument limits the returned columns.
+    """
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
+    user_id = await verify_supabase_token(token)
+    columns = select_columns(fields, STUDENT_FIELDS, STUDENT_FIELDS)
+    size = page_size(limit)
 
-    sb = supabase_service()
-    res = sb.table("students").select("*").eq("owner_id", user_id).order("created_at", desc=True).execute()
-    return {"success": True, "data": {"students": res.data}}
+    sb = await supabase_async()
+    query = sb.table("students").select(columns).eq("owner_id", user_id)
+    students, next_cursor = await fetch_page(query, cursor, size)
+    return {"success": True, "data": {"students": students, "nextCursor": next_cursor}}
+
+
+@router.get("/{student_id}/lessons")
+async def list_student_lessons(
+    student_id: str,
+    authorization: str = Header(...),
+    limit: int | None = None,
+    cursor: str | None = None,
+    fields: str | None = None,
+) -> dict:
+    """
+    A student's lessons, paginated like GET /v1/students.
+    Transcript and extraction bodies are only returned when named in ?fields=.
+    """
+    token = authorization.replace("Bearer ", "")
+    user_id = await verify_supabase_token(token)
+    columns = select_columns(fields, LESSON_FIELDS, LESSON_DEFAULT_FIELDS)
+    size = page_size(limit)
+
+    sb = await supabase_async()
+    query = sb.table("lessons").select(columns).eq("owner_id", user_id).eq("student_id", student_id)
+    lessons, next_cursor = await fetch_page(query, cursor, size)
+    return {"success": True, "data": {"lessons": lessons, "nextCursor": next_cursor}}
 
 
 @router.post("")
-def create_student(payload: dict, authorization: str = Header(...)) -> dict:
+async def create_student(payload: dict, authorization: str = Header(...)) -> dict:
     token = authorization.replace("Bearer ", "")
-    user_id = verify_supabase_token(token)
+    user_id = await verify_supabase_token(token)
 
     name = (payload.get("name") or "").strip()
     if not name:
         raise AppError(code="VALIDATION", message="Student name required")
 
-    sb = supabase_service()
-    res = sb.table("students").insert(
-        {
-            "owner_id": user_id,
-            "name": name,
-            "instrument": payload.get("instrument"),
-            "parent_email": payload.get("parent_email"),
-        }
-    ).execute()
+    sb = await supabase_async()
+    res = (
+        await sb.table("students")
+        .insert(
+            {
+                "owner_id": user_id,
+                "name": name,
+                "instrument": payload.get("instrument"),
+                "parent_email": payload.get("parent_email"),
+            }
+        )
+        .execute()
+    )
     return {"success": True, "data": {"student": res.data[0]}}
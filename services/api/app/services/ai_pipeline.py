@@ -1,64 +1,339 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from pathlib import Path
+from collections.abc import AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import BinaryIO
 
-from openai import OpenAI
+import httpx
+import jsonschema
+import openai
+from packages.ai_contract.src.chunking import chunk_note, merge_extractions, split_transcript
+from packages.ai_contract.src.registry import (
+    EXTRACTION_SCHEMA,
+    OUTPUT_PROMPTS,
+    OUTPUTS_SCHEMA,
+    registry,
+)
 
-from packages.ai_contract.src.validate import validate_json, load_schema
+from ..errors import AppError
+from ..settings import settings
+from .audio_chunks import WavSlicer, audio_size, is_wav, stitch, wav_duration
+from .openai_client import AsyncOpenAIClient, OpenAIClient
 
-AI_ROOT = Path(__file__).resolve().parents[4] / "packages" / "ai_contract"
+# What a completion raises when the API rejects it or the connection drops mid-stream.
+OPENAI_ERRORS = (openai.OpenAIError, httpx.HTTPError)
 
 
-def _load_prompt(name: str) -> str:
-    return (AI_ROOT / "prompts" / name).read_text(encoding="utf-8")
+def transcribe(
+    oai: OpenAIClient,
+    audio: str | BinaryIO,
+    chunk_seconds: float | None = None,
+    on_progress: Callable[[int, int], None] | None = None,
+    filename: str = "audio.m4a",
+) -> str:
+    """
+    Transcribe a recording, given as a path or an open binary file (uploaded as filename).
+    WAV input longer than chunk_seconds (transcribe_chunk_seconds by default, 0 disables) or
+    larger than transcribe_max_upload_bytes is split into overlapping segments, each within
+    both limits, and transcribed concurrently. on_progress(done, total) is called as segments
+    finish.
+    """
+    chunk_seconds = settings.transcribe_chunk_seconds if chunk_seconds is None else chunk_seconds
+    if is_wav(audio) and (
+        (chunk_seconds > 0 and wav_duration(audio) > chunk_seconds)
+        or audio_size(audio) > settings.transcribe_max_upload_bytes
+    ):
+        return _transcribe_chunked(oai, audio, chunk_seconds, on_progress)
 
-
-def transcribe(oai: OpenAI, audio_file_path: str) -> str:
-    with open(audio_file_path, "rb") as f:
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            result = oai.audio.transcriptions.create(
+                model=settings.openai_transcribe_model,
+                file=f,
+            )
+    else:
+        audio.seek(0)
         result = oai.audio.transcriptions.create(
-            model="whisper-1",
-            file=f,
+            model=settings.openai_transcribe_model,
+            file=(filename, audio),
         )
+    if on_progress is not None:
+        on_progress(1, 1)
     return result.text
 
 
-def extract(oai: OpenAI, transcript: str) -> dict:
-    schema_path = AI_ROOT / "schema" / "lesson_extraction.schema.json"
-    prompt = _load_prompt("extraction.md").replace(
-        "{{SCHEMA_JSON}}", schema_path.read_text(encoding="utf-8")
-    )
-    prompt = prompt + "\n\nTRANSCRIPT:\n" + transcript
+def _transcribe_chunked(
+    oai: OpenAIClient,
+    audio: str | BinaryIO,
+    chunk_seconds: float,
+    on_progress: Callable[[int, int], None] | None,
+) -> str:
+    slicer = WavSlicer(audio, spool_max_bytes=settings.audio_spool_max_bytes)
+    try:
+        segments = slicer.segments(
+            chunk_seconds,
+            settings.transcribe_overlap_seconds,
+            settings.transcribe_max_upload_bytes,
+        )
+
+        def run_one(index: int) -> str:
+            with slicer.read(segments[index]) as chunk:
+                result = oai.audio.transcriptions.create(
+                    model=settings.openai_transcribe_model,
+                    file=(f"chunk-{index:04d}.wav", chunk),
+                )
+            return result.text
+
+        texts: list[str] = [""] * len(segments)
+        workers = max(1, min(settings.transcribe_concurrency, len(segments)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_one, seg.index): seg.index for seg in segments}
+            for done, future in enumerate(as_completed(futures), start=1):
+                texts[futures[future]] = future.result()
+                if on_progress is not None:
+                    on_progress(done, len(segments))
+    finally:
+        slicer.close()
+    return stitch(texts)
 
+
+def _extract_json(oai: OpenAIClient, prompt: str) -> dict:
     res = oai.chat.completions.create(
-        model="gpt-4o-mini",
+        model=settings.openai_llm_model,
         response_format={"type": "json_object"},
         messages=[{"role": "user", "content": prompt}],
     )
-    raw = res.choices[0].message.content or "{}"
-    data = json.loads(raw)
+    return json.loads(res.choices[0].message.content or "{}")
 
-    validate_json(data, load_schema(schema_path))
-    return data
 
+def extract(oai: OpenAIClient, transcript: str, max_chars: int | None = None) -> dict:
+    """
+    Extract the lesson facts. A transcript longer than max_chars (extraction_chunk_chars by default,
+    0 disables) is split on speaker and sentence boundaries, extracted per chunk concurrently and merged.
+    """
+    max_chars = settings.extraction_chunk_chars if max_chars is None else max_chars
+    chunks = (
+        split_transcript(transcript, max_chars)
+        if max_chars > 0 and len(transcript) > max_chars
+        else []
+    )
+    if len(chunks) <= 1:
+        data = _extract_json(oai, registry.extraction_prompt() + "\n\nTRANSCRIPT:\n" + transcript)
+    else:
 
-def generate(oai: OpenAI, extraction_json: dict) -> dict:
-    schema_path = AI_ROOT / "schema" / "outputs.schema.json"
-    schema = load_schema(schema_path)
-    extraction_str = json.dumps(extraction_json, ensure_ascii=False)
+        def extract_one(index: int) -> dict:
+            note = chunk_note(index, len(chunks))
+            return _extract_json(
+                oai, f"{registry.extraction_prompt()}\n\n{note}\n\nTRANSCRIPT:\n{chunks[index]}"
+            )
 
-    def run_one(prompt_name: str) -> str:
-        prompt = _load_prompt(prompt_name).replace("{{EXTRACTION_JSON}}", extraction_str)
+        workers = max(1, min(settings.extraction_concurrency, len(chunks)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            data = merge_extractions(list(pool.map(extract_one, range(len(chunks)))))
+
+    registry.validator(EXTRACTION_SCHEMA).validate(data)
+    return data
+
+
+def _generate_each(
+    oai: OpenAIClient, extraction_json: dict, names: list[str], max_workers: int
+) -> tuple[dict[str, str], list[str]]:
+    def run_one(name: str) -> str:
+        prompt = registry.output_prompt(name, extraction_json)
         res = oai.chat.completions.create(
-            model="gpt-4o-mini",
+            model=settings.openai_llm_model,
             messages=[{"role": "user", "content": prompt}],
         )
         return (res.choices[0].message.content or "").strip()
 
-    outputs = {
-        "student_recap": run_one("student_recap.md"),
-        "practice_plan": run_one("practice_plan.md"),
-        "parent_email": run_one("parent_email.md"),
-    }
-    validate_json(outputs, schema)
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(names)))) as pool:
+        futures = {name: pool.submit(run_one, name) for name in names}
+
+    outputs: dict[str, str] = {}
+    errors: list[str] = []
+    for name, future in futures.items():
+        try:
+            outputs[name] = future.result()
+            registry.validator(OUTPUTS_SCHEMA, name).validate(outputs[name])
+        except jsonschema.ValidationError as e:
+            errors.append(f"{name}: {e.message}")
+        except OPENAI_ERRORS as e:
+            errors.append(f"{name}: {e}")
+    return outputs, errors
+
+
+def _generate_combined(oai: OpenAIClient, extraction_json: dict) -> dict[str, str]:
+    """All outputs in one json_object completion. Returns only the fields that pass their schema."""
+    prompt = registry.combined_prompt(extraction_json)
+    res = oai.chat.completions.create(
+        model=settings.openai_llm_model,
+        response_format={"type": "json_object"},
+        messages=[{"role": "user", "content": prompt}],
+    )
+    try:
+        data = json.loads(res.choices[0].message.content or "{}")
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    valid: dict[str, str] = {}
+    for name in OUTPUT_PROMPTS:
+        value = data.get(name)
+        if isinstance(value, str):
+            value = value.strip()
+        if registry.validator(OUTPUTS_SCHEMA, name).is_valid(value):
+            valid[name] = value
+    return valid
+
+
+def generate(
+    oai: OpenAIClient,
+    extraction_json: dict,
+    max_workers: int | None = None,
+    mode: str | None = None,
+    names: list[str] | None = None,
+    on_output: Callable[[str, str], None] | None = None,
+) -> dict:
+    """
+    Generate the three outputs, or only the outputs in names. generation_mode selects the strategy:
+    - per_output: one completion per output, run concurrently (capped by generation_concurrency)
+    - combined: one completion for all outputs; only fields that fail validation are
+      regenerated with their own prompt. Not used for a subset, which goes per output.
+    Each output is validated on its own so a failure names the output that caused it.
+    on_output(name, text) is called for every output that passed, even if another one failed.
+    """
+    workers = max_workers or settings.generation_concurrency
+    wanted = [name for name in OUTPUT_PROMPTS if names is None or name in names]
+
+    outputs: dict[str, str] = {}
+    if (mode or settings.generation_mode) == "combined" and len(wanted) == len(OUTPUT_PROMPTS):
+        outputs = _generate_combined(oai, extraction_json)
+
+    missing = [name for name in wanted if name not in outputs]
+    errors: list[str] = []
+    if missing:
+        generated, errors = _generate_each(oai, extraction_json, missing, workers)
+        outputs.update(generated)
+    if on_output is not None:
+        for name in wanted:
+            if name in outputs and not any(e.startswith(f"{name}: ") for e in errors):
+                on_output(name, outputs[name])
+    if errors:
+        raise AppError(code="GENERATION_FAILED", message="; ".join(errors))
+
+    outputs = {name: outputs[name] for name in wanted}
+    if names is None:
+        registry.validator(OUTPUTS_SCHEMA).validate(outputs)
+    return outputs
+
+
+def validate_outputs(outputs: dict[str, str]) -> dict[str, str]:
+    """Strip and validate assembled outputs, naming every output that fails its schema."""
+    outputs = {name: (outputs.get(name) or "").strip() for name in OUTPUT_PROMPTS}
+    errors = [
+        f"{name}: {error.message}"
+        for name in OUTPUT_PROMPTS
+        for error in registry.validator(OUTPUTS_SCHEMA, name).iter_errors(outputs[name])
+    ]
+    if errors:
+        raise AppError(code="GENERATION_FAILED", message="; ".join(errors))
     return outputs
+
+
+async def generate_async(
+    oai: AsyncOpenAIClient, extraction_json: dict, names: list[str], max_workers: int | None = None
+) -> dict[str, str]:
+    """
+    Async per-output generation of the outputs in names (request path, e.g. after an
+    extraction edit). Each output is validated on its own; GENERATION_FAILED names every
+    output that failed, and nothing is returned unless all of them passed.
+    """
+    wanted = [name for name in OUTPUT_PROMPTS if name in names]
+    limit = asyncio.Semaphore(max(1, max_workers or settings.generation_concurrency))
+
+    async def run_one(name: str) -> str:
+        async with limit:
+            prompt = registry.output_prompt(name, extraction_json)
+            res = await oai.chat.completions.create(
+                model=settings.openai_llm_model,
+                messages=[{"role": "user", "content": prompt}],
+            )
+        text = (res.choices[0].message.content or "").strip()
+        registry.validator(OUTPUTS_SCHEMA, name).validate(text)
+        return text
+
+    tasks = {name: asyncio.create_task(run_one(name)) for name in wanted}
+    outputs: dict[str, str] = {}
+    errors: list[str] = []
+    try:
+        for name, task in tasks.items():
+            try:
+                outputs[name] = await task
+            except jsonschema.ValidationError as e:
+                errors.append(f"{name}: {e.message}")
+            except OPENAI_ERRORS as e:
+                errors.append(f"{name}: {e}")
+    finally:
+        # Anything else (a bug, or cancellation) propagates; stop the remaining calls.
+        for task in tasks.values():
+            task.cancel()
+    if errors:
+        raise AppError(code="GENERATION_FAILED", message="; ".join(errors))
+    return outputs
+
+
+async def stream_outputs(
+    oai: AsyncOpenAIClient, extraction_json: dict, max_workers: int | None = None
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    Yield (output name, text delta) pairs as the per-output completions stream in, interleaved.
+    Raises AppError GENERATION_FAILED after the other streams finish if any of them failed
+    with an API or connection error; any other exception is re-raised as soon as its stream
+    ends. Closing the iterator early, or an exception, cancels the remaining streams.
+    """
+    names = list(OUTPUT_PROMPTS)
+    deltas: asyncio.Queue = asyncio.Queue()
+    limit = asyncio.Semaphore(max(1, max_workers or settings.generation_concurrency))
+    done = object()
+
+    async def run_one(name: str) -> None:
+        try:
+            async with limit:
+                prompt = registry.output_prompt(name, extraction_json)
+                stream = await oai.chat.completions.create(
+                    model=settings.openai_llm_model,
+                    messages=[{"role": "user", "content": prompt}],
+                    stream=True,
+                )
+                async for chunk in stream:
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        deltas.put_nowait((name, text))
+        except OPENAI_ERRORS as e:
+            deltas.put_nowait((name, e))
+        finally:
+            deltas.put_nowait((name, done))
+
+    tasks = {name: asyncio.create_task(run_one(name)) for name in names}
+    try:
+        errors: list[str] = []
+        remaining = len(names)
+        while remaining:
+            name, item = await deltas.get()
+            if item is done:
+                remaining -= 1
+                # Re-raises anything run_one let through: a bug must not pass for a
+                # stream that simply ended.
+                await tasks[name]
+            elif isinstance(item, Exception):
+                errors.append(f"{name}: {item}")
+            else:
+                yield name, item
+        if errors:
+            raise AppError(code="GENERATION_FAILED", message="; ".join(errors))
+    finally:
+        for task in tasks.values():
+            task.cancel()
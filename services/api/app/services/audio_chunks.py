@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import threading
+import wave
+from dataclasses import dataclass
+from typing import BinaryIO
+
+MIN_OVERLAP_WORDS = 2
+MAX_OVERLAP_WORDS = 60
+# Canonical PCM header written by the wave module in front of each segment's frames.
+WAV_HEADER_BYTES = 44
+
+
+@dataclass(frozen=True)
+class Segment:
+    index: int
+    start_frame: int
+    n_frames: int
+
+
+def is_wav(audio: str | BinaryIO) -> bool:
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            header = f.read(12)
+    else:
+        start = audio.tell()
+        header = audio.read(12)
+        audio.seek(start)
+    return header[:4] == b"RIFF" and header[8:12] == b"WAVE"
+
+
+def audio_size(audio: str | BinaryIO) -> int:
+    if isinstance(audio, str):
+        return os.path.getsize(audio)
+    start = audio.tell()
+    size = audio.seek(0, os.SEEK_END)
+    audio.seek(start)
+    return size
+
+
+def wav_duration(audio: str | BinaryIO) -> float:
+    start = None if isinstance(audio, str) else audio.tell()
+    with wave.open(audio, "rb") as w:
+        duration = w.getnframes() / w.getframerate()
+    if start is not None and not isinstance(audio, str):
+        audio.seek(start)
+    return duration
+
+
+def plan_segments(
+    n_frames: int,
+    rate: int,
+    chunk_seconds: float,
+    overlap_seconds: float,
+    max_frames: int | None = None,
+) -> list[Segment]:
+    """
+    Fixed-length windows where each one starts overlap_seconds before the previous one ends.
+    A window is chunk_seconds long (0: no duration limit) and at most max_frames frames.
+    """
+    chunk = max(1, int(chunk_seconds * rate)) if chunk_seconds > 0 else max(1, n_frames)
+    if max_frames is not None:
+        chunk = max(1, min(chunk, max_frames))
+    overlap = min(int(overlap_seconds * rate), chunk - 1)
+    step = chunk - overlap
+    segments: list[Segment] = []
+    start = 0
+    while True:
+        segments.append(Segment(len(segments), start, min(chunk, n_frames - start)))
+        if start + chunk >= n_frames:
+            return segments
+        start += step
+
+
+class WavSlicer:
+    """
+    Reads segments of one WAV source into standalone WAV files, spooled to disk past
+    spool_max_bytes. Safe to share between threads; reads are serialized, uploads are not.
+    """
+
+    def __init__(self, audio: str | BinaryIO, spool_max_bytes: int = 8 * 1024 * 1024) -> None:
+        # Held open across segments; closed by close().
+        self._reader = wave.open(audio, "rb")  # noqa: SIM115
+        self._lock = threading.Lock()
+        self.params = self._reader.getparams()
+        self.spool_max_bytes = spool_max_bytes
+
+    def close(self) -> None:
+        self._reader.close()
+
+    def segments(self, chunk_seconds: float, overlap_seconds: float, max_bytes: int) -> list[Segment]:
+        """Segments of at most chunk_seconds whose WAV files are at most max_bytes each."""
+        frame_bytes = self.params.nchannels * self.params.sampwidth
+        max_frames = (max_bytes - WAV_HEADER_BYTES) // frame_bytes
+        return plan_segments(
+            self.params.nframes, self.params.framerate, chunk_seconds, overlap_seconds, max_frames
+        )
+
+    def read(self, segment: Segment) -> BinaryIO:
+        """The segment as a WAV file positioned at 0; the caller closes it."""
+        with self._lock:
+            self._reader.setpos(segment.start_frame)
+            frames = self._reader.readframes(segment.n_frames)
+        buf = tempfile.SpooledTemporaryFile(max_size=self.spool_max_bytes)  # noqa: SIM115
+        with wave.open(buf, "wb") as out:
+            out.setnchannels(self.params.nchannels)
+            out.setsampwidth(self.params.sampwidth)
+            out.setframerate(self.params.framerate)
+            out.writeframes(frames)
+        buf.seek(0)
+        return buf
+
+
+def _norm(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+
+def _merge(left: list[str], right: list[str]) -> list[str]:
+    """
+    Drop the words at the start of right that repeat the end of left.
+    The boundary word of either side may be cut mid-word, so one word may be skipped on each side.
+    """
+    tail = [_norm(w) for w in left[-MAX_OVERLAP_WORDS:]]
+    head = [_norm(w) for w in right[:MAX_OVERLAP_WORDS]]
+    for k in range(min(len(tail), len(head)), MIN_OVERLAP_WORDS - 1, -1):
+        for skip_left in (0, 1):
+            for skip_right in (0, 1):
+                end = len(tail) - skip_left
+                if end - k < 0 or skip_right + k > len(head):
+                    continue
+                if tail[end - k : end] == head[skip_right : skip_right + k]:
+                    return left[: len(left) - skip_left] + right[skip_right + k :]
+    return left + right
+
+
+def stitch(texts: list[str]) -> str:
+    """Join chunk transcripts in order, removing text duplicated by the overlap."""
+    words: list[str] = []
+    for text in texts:
+        words = _merge(words, text.split())
+    return " ".join(words)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import json
+import logging
+from typing import Any
+
+from packages.ai_contract.src.registry import OUTPUT_PROMPTS, OUTPUTS_SCHEMA, registry
+from supabase import Client
+
+from ..db import DB_ERRORS
+from ..settings import settings
+from .result_cache import content_key, extract_key
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT = "transcript"
+EXTRACTION = "extraction"
+
+
+def output_stage(name: str) -> str:
+    return f"output:{name}"
+
+
+def transcript_hash(audio_path: str) -> str:
+    return content_key(
+        TRANSCRIPT,
+        settings.openai_transcribe_model,
+        str(settings.transcribe_chunk_seconds),
+        str(settings.transcribe_max_upload_bytes),
+        audio_path,
+    )
+
+
+def extraction_hash(transcript: str) -> str:
+    # Same inputs as the extraction result cache: model, chunk size, prompt and transcript.
+    return extract_key(transcript)
+
+
+def output_hash(name: str, extraction_json: dict) -> str:
+    return content_key(
+        output_stage(name),
+        settings.openai_llm_model,
+        registry.prompt(OUTPUT_PROMPTS[name]),
+        registry.schema_text(OUTPUTS_SCHEMA),
+        json.dumps(extraction_json, sort_keys=True, ensure_ascii=False),
+    )
+
+
+class Checkpoints:
+    """
+    Stage results of one lesson in public.pipeline_checkpoints, so a retried job resumes
+    from the first incomplete stage. A checkpoint only counts when its input_hash matches
+    the stage's current inputs; a new prompt, model or upstream result recomputes it.
+    All rows are read once per attempt; complete_lesson deletes them.
+    """
+
+    def __init__(self, sb: Client, lesson_id: str) -> None:
+        self.sb = sb
+        self.lesson_id = lesson_id
+        rows = (
+            sb.table("pipeline_checkpoints")
+            .select("stage, input_hash, payload")
+            .eq("lesson_id", lesson_id)
+            .execute()
+            .data
+        )
+        self._rows = {row["stage"]: row for row in rows or []}
+
+    def get(self, stage: str, input_hash: str) -> Any | None:
+        row = self._rows.get(stage)
+        if row is None or row["input_hash"] != input_hash:
+            return None
+        return row["payload"]
+
+    def put(self, stage: str, input_hash: str, payload: Any) -> None:
+        row = {
+            "lesson_id": self.lesson_id,
+            "stage": stage,
+            "input_hash": input_hash,
+            "payload": payload,
+        }
+        self._rows[stage] = row
+        try:
+            self.sb.table("pipeline_checkpoints").upsert(
+                row, on_conflict="lesson_id,stage"
+            ).execute()
+        except DB_ERRORS:
+            # Losing a checkpoint only costs redoing the stage on a retry; never fail the run.
+            logger.warning(
+                "checkpoint %s not saved for lesson %s", stage, self.lesson_id, exc_info=True
+            )
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+from supabase import AsyncClient
+
+from ..errors import AppError
+
+TERMINAL_STATUSES = ("READY", "FAILED")
+
+
+class EventBus:
+    """
+    In-process fan-out of lesson progress from worker threads to SSE streams.
+    Subscribers are asyncio queues; publish() is safe to call from any thread.
+    Workers in another process never reach this bus, so streams also poll the database.
+    """
+
+    def __init__(self) -> None:
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, lesson_id: str) -> asyncio.Queue:
+        """Must be called from the event loop that will read the queue."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(lesson_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, lesson_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(lesson_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(lesson_id, None)
+
+    def publish(self, lesson_id: str, changes: dict) -> None:
+        """changes holds the status fields that changed (status, step, progress, lastError)."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(lesson_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, dict(changes))
+            except RuntimeError:
+                pass  # loop already closed; the stream is gone
+
+    def subscriber_count(self, lesson_id: str) -> int:
+        with self._lock:
+            return len(self._subscribers.get(lesson_id, ()))
+
+
+bus = EventBus()
+
+
+async def read_status_row(sb: AsyncClient, lesson_id: str, user_id: str) -> dict:
+    """
+    The lesson joined with its latest job in one query (lesson_status_v, migration 005),
+    projected to the columns the status endpoint and the stream send.
+    """
+    res = await (
+        sb.table("lesson_status_v")
+        .select("status, step, progress, last_error, job_updated_at")
+        .eq("lesson_id", lesson_id)
+        .eq("owner_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    if not res.data:
+        raise AppError(code="NOT_FOUND", message="Lesson not found")
+    return res.data[0]
+
+
+def to_state(lesson_id: str, row: dict) -> dict:
+    return {
+        "lessonId": lesson_id,
+        "status": row["status"],
+        "step": row.get("step"),
+        "progress": row.get("progress") or 0,
+        "lastError": row.get("last_error"),
+    }
+
+
+def status_etag(row: dict) -> str:
+    """
+    Changes whenever the latest job row is written (jobs.updated_at) or the lesson status moves.
+    The status is included because the lesson row is updated after the job on completion.
+    """
+    raw = f"{row.get('job_updated_at')}|{row['status']}"
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 requires for GET); accepts a list or "*"."""
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+async def read_state(sb: AsyncClient, lesson_id: str, user_id: str) -> dict:
+    """Current status of one lesson, reading only the columns the stream sends."""
+    return to_state(lesson_id, await read_status_row(sb, lesson_id, user_id))
+
+
+def event_id(state: dict) -> str:
+    return f"{state['status']}.{state['step']}.{state['progress']}"
+
+
+def sse(event: str, data: dict, id: str | None = None) -> str:
+    """One Server-Sent Events frame."""
+    head = f"id: {id}\n" if id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def format_event(state: dict) -> str:
+    return sse("status", state, id=event_id(state))
+
+
+async def stream_lesson(
+    lesson_id: str,
+    poll: Callable[[], Awaitable[dict]],
+    last_event_id: str | None = None,
+    heartbeat_seconds: float = 15.0,
+    poll_seconds: float = 10.0,
+    retry_ms: int = 3000,
+    is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Yield SSE frames for one lesson until it reaches READY or FAILED.
+    - poll() reads the current state from the database: once after subscribing to the bus,
+      then again whenever poll_seconds pass without a bus event
+    - bus events carry only the changed fields and are merged into the last known state
+    - a comment frame is sent after heartbeat_seconds of silence to keep proxies from closing the stream
+    - a state whose id equals last_event_id is not sent again after a reconnect
+    """
+    loop = asyncio.get_running_loop()
+    queue = bus.subscribe(lesson_id)
+    try:
+        # Read after subscribing so a change published in between is not lost.
+        state = await poll()
+        sent = last_event_id
+        last_write = last_change = loop.time()
+        yield f"retry: {retry_ms}\n\n"
+        while True:
+            if event_id(state) != sent:
+                sent = event_id(state)
+                last_write = loop.time()
+                yield format_event(state)
+            if state["status"] in TERMINAL_STATUSES:
+                return
+
+            now = loop.time()
+            timeout = max(
+                0.0, min(last_write + heartbeat_seconds, last_change + poll_seconds) - now
+            )
+            try:
+                changes = await asyncio.wait_for(queue.get(), timeout=timeout)
+                state = {**state, **changes}
+                last_change = loop.time()
+                continue
+            except TimeoutError:
+                pass
+
+            now = loop.time()
+            if now >= last_change + poll_seconds:
+                state = await poll()
+                last_change = now
+            if event_id(state) == sent and now >= last_write + heartbeat_seconds:
+                last_write = now
+                yield ": keepalive\n\n"
+            if is_disconnected is not None and await is_disconnected():
+                return
+    finally:
+        bus.unsubscribe(lesson_id, queue)
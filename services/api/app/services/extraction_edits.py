@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import jsonschema
+from packages.ai_contract.src.registry import EXTRACTION_SCHEMA, registry
+from supabase import AsyncClient
+
+from ..errors import AppError
+from . import ai_pipeline
+from .openai_client import AsyncOpenAIClient
+
+
+def patched_extraction(extraction: dict, patch: object) -> dict:
+    """Replace top-level fields of the stored extraction; the result must still match the schema."""
+    if not isinstance(patch, dict) or not patch:
+        raise AppError(code="VALIDATION", message="extraction must be a non-empty object")
+    merged = {**extraction, **patch}
+    try:
+        registry.validator(EXTRACTION_SCHEMA).validate(merged)
+    except jsonschema.ValidationError as e:
+        raise AppError(code="VALIDATION", message=f"extraction: {e.message}") from None
+    return merged
+
+
+async def apply_extraction_patch(
+    sb: AsyncClient, oai: AsyncOpenAIClient, lesson: dict, patch: object
+) -> dict:
+    """
+    Save a teacher's correction to the extraction and regenerate only the outputs whose
+    prompts read a changed field (prompts/dependencies.json in ai_contract). Other outputs,
+    and edited_content on every output, are left as they are. Nothing is written unless all
+    regenerated outputs validate; extraction and outputs are then saved in one transaction.
+    """
+    before = lesson["extraction"]
+    after = patched_extraction(before, patch)
+    if after == before:
+        return {"extraction": after, "regenerated": [], "outputs": []}
+
+    names = registry.affected_outputs(before, after)
+    outputs = await ai_pipeline.generate_async(oai, after, names) if names else {}
+    res = await sb.rpc(
+        "apply_extraction_edit",
+        {
+            "p_owner": lesson["owner_id"],
+            "p_lesson_id": lesson["id"],
+            "p_extraction": after,
+            "p_outputs": outputs,
+        },
+    ).execute()
+    return {"extraction": after, "regenerated": names, "outputs": res.data or []}
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+from supabase import Client
+
+from .checkpoints import (
+    EXTRACTION,
+    TRANSCRIPT,
+    Checkpoints,
+    extraction_hash,
+    output_hash,
+    output_stage,
+    transcript_hash,
+)
+from .events import bus
+from .openai_client import OpenAIClient
+from .result_cache import cached_extract, cached_generate
+from .storage import fetch_audio
+from .transcripts import cached_transcribe
+
+OUTPUT_TYPES = ("student_recap", "practice_plan", "parent_email")
+
+
+def _now() -> str:
+    return datetime.now(UTC).isoformat()
+
+
+def set_step(sb: Client, job: dict, step: str, progress: int) -> None:
+    """Record pipeline progress. Also refreshes the worker lease on the job."""
+    sb.table("jobs").update({"step": step, "progress": progress, "locked_at": _now()}).eq(
+        "id", job["id"]
+    ).execute()
+    sb.table("lessons").update({"status": step}).eq("id", job["lesson_id"]).execute()
+    bus.publish(job["lesson_id"], {"status": step, "step": step, "progress": progress})
+
+
+def report_progress(sb: Client, job: dict, start: int, end: int) -> Callable[[int, int], None]:
+    """Map done/total of a stage onto the job progress range [start, end]."""
+
+    def update(done: int, total: int) -> None:
+        progress = start + (end - start) * done // max(total, 1)
+        sb.table("jobs").update({"progress": progress, "locked_at": _now()}).eq("id", job["id"]).execute()
+        bus.publish(job["lesson_id"], {"progress": progress})
+
+    return update
+
+
+def process_job(sb: Client, oai: OpenAIClient, job: dict) -> None:
+    """
+    Run transcription, extraction and generation for a claimed job and store the results.
+    Each stage checkpoints its result, so a retry resumes at the first incomplete stage
+    (one output at a time for generation). Raises on failure; the worker decides whether to retry.
+    """
+    lesson = sb.table("lessons").select("id, owner_id, audio_path").eq("id", job["lesson_id"]).single().execute().data
+
+    cp = Checkpoints(sb, lesson["id"])
+
+    set_step(sb, job, "TRANSCRIBING", 10)
+    transcript_key = transcript_hash(lesson["audio_path"])
+    done = cp.get(TRANSCRIPT, transcript_key)
+    if done is not None:
+        transcript, audio_sha256 = done["transcript"], done["audio_sha256"]
+    else:
+        with fetch_audio(lesson["audio_path"]) as audio:
+            transcript, audio_sha256 = cached_transcribe(
+                sb,
+                oai,
+                audio,
+                on_progress=report_progress(sb, job, 10, 50),
+                filename=os.path.basename(lesson["audio_path"]),
+            )
+        cp.put(TRANSCRIPT, transcript_key, {"transcript": transcript, "audio_sha256": audio_sha256})
+
+    set_step(sb, job, "EXTRACTING", 50)
+    extraction_key = extraction_hash(transcript)
+    extraction = cp.get(EXTRACTION, extraction_key)
+    if extraction is None:
+        extraction = cached_extract(oai, transcript)
+        cp.put(EXTRACTION, extraction_key, extraction)
+
+    set_step(sb, job, "GENERATING", 70)
+    output_keys = {kind: output_hash(kind, extraction) for kind in OUTPUT_TYPES}
+    outputs = {}
+    for kind in OUTPUT_TYPES:
+        done = cp.get(output_stage(kind), output_keys[kind])
+        if done is not None:
+            outputs[kind] = done["text"]
+    missing = [kind for kind in OUTPUT_TYPES if kind not in outputs]
+    if missing:
+        outputs.update(
+            cached_generate(
+                oai,
+                extraction,
+                names=missing,
+                on_output=lambda kind, text: cp.put(
+                    output_stage(kind), output_keys[kind], {"text": text}
+                ),
+            )
+        )
+
+    # One transaction: outputs, transcript, extraction, READY and DONE (migration 009).
+    sb.rpc(
+        "complete_lesson",
+        {
+            "p_job_id": job["id"],
+            "p_lesson_id": lesson["id"],
+            "p_transcript": transcript,
+            "p_audio_sha256": audio_sha256,
+            "p_extraction": extraction,
+            "p_outputs": {kind: outputs[kind] for kind in OUTPUT_TYPES},
+        },
+    ).execute()
+    bus.publish(job["lesson_id"], {"status": "READY", "step": "DONE", "progress": 100, "lastError": None})
@@ -1,9 +1,115 @@
 from __future__ import annotations
 
-from openai import OpenAI
+from collections.abc import Callable
+from types import SimpleNamespace
+from typing import Any, Protocol
+
+from openai import AsyncOpenAI, OpenAI
 
 from ..settings import settings
+from .rate_governor import RateGovernor, governor
+
+_async_client: AsyncGovernedOpenAI | None = None
+
+
+class _Endpoint(Protocol):
+    @property
+    def create(self) -> Callable[..., Any]: ...
+
+
+class _Chat(Protocol):
+    @property
+    def completions(self) -> _Endpoint: ...
+
+
+class _Audio(Protocol):
+    @property
+    def transcriptions(self) -> _Endpoint: ...
+
+
+class OpenAIClient(Protocol):
+    """What the pipeline calls: OpenAI itself, GovernedOpenAI, or a test stand-in."""
+
+    @property
+    def chat(self) -> _Chat: ...
+
+    @property
+    def audio(self) -> _Audio: ...
+
+
+class AsyncOpenAIClient(Protocol):
+    """What the request path calls: AsyncOpenAI, AsyncGovernedOpenAI, or a test stand-in."""
+
+    @property
+    def chat(self) -> _Chat: ...
+
+
+def estimate_tokens(request: dict[str, Any]) -> int:
+    """Rough prompt size (4 characters per token) plus the expected completion."""
+    chars = sum(len(str(m.get("content") or "")) for m in request.get("messages", []))
+    completion = request.get("max_tokens") or settings.openai_completion_token_estimate
+    return chars // 4 + completion
+
+
+def _rewind(request: dict[str, Any]) -> None:
+    """Uploads are read by each attempt, so a retried transcription starts from the beginning."""
+    file: Any = request.get("file")
+    if isinstance(file, tuple):
+        file = file[1]
+    if hasattr(file, "seek"):
+        file.seek(0)
+
+
+class GovernedOpenAI:
+    """
+    The parts of OpenAI the pipeline uses (chat completions, transcriptions), with every
+    call going through the rate governor. The SDK's own retries are off; the governor retries.
+    """
+
+    def __init__(self, raw: OpenAI, limiter: RateGovernor) -> None:
+        self.raw = raw
+        self.governor = limiter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+
+    def _chat(self, **request: Any) -> Any:
+        return self.governor.call(
+            lambda: self.raw.chat.completions.with_raw_response.create(**request),
+            tokens=estimate_tokens(request),
+        )
+
+    def _transcribe(self, **request: Any) -> Any:
+        def send() -> Any:
+            _rewind(request)
+            return self.raw.audio.transcriptions.with_raw_response.create(**request)
+
+        return self.governor.call(send)
+
+
+class AsyncGovernedOpenAI:
+    """AsyncOpenAI counterpart of GovernedOpenAI, sharing the same governor."""
+
+    def __init__(self, raw: AsyncOpenAI, limiter: RateGovernor) -> None:
+        self.raw = raw
+        self.governor = limiter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    async def _chat(self, **request: Any) -> Any:
+        return await self.governor.call_async(
+            lambda: self.raw.chat.completions.with_raw_response.create(**request),
+            tokens=estimate_tokens(request),
+        )
+
+
+def client() -> GovernedOpenAI:
+    return GovernedOpenAI(OpenAI(api_key=settings.openai_api_key, max_retries=0), governor)
 
 
-def client() -> OpenAI:
-    return OpenAI(api_key=settings.openai_api_key)
+def async_client() -> AsyncGovernedOpenAI:
+    """Shared AsyncOpenAI client for the request path, so its connection pool is reused."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncGovernedOpenAI(
+            AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0), governor
+        )
+    return _async_client
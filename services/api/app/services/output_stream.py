@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import logging
+import time
+from collections.abc import AsyncIterator
+
+from supabase import AsyncClient
+
+from ..db import DB_ERRORS
+from ..errors import AppError
+from . import ai_pipeline
+from .events import sse
+from .lesson_pipeline import OUTPUT_TYPES
+from .openai_client import AsyncOpenAIClient
+
+logger = logging.getLogger(__name__)
+
+
+async def save_outputs(sb: AsyncClient, lesson: dict, outputs: dict[str, str]) -> None:
+    """
+    Replace the generated content of the lesson's outputs, inserting any that do not exist
+    yet, in one transaction (save_outputs RPC, migration 018): all outputs are saved or none.
+    """
+    await sb.rpc(
+        "save_outputs",
+        {"p_owner": lesson["owner_id"], "p_lesson_id": lesson["id"], "p_outputs": outputs},
+    ).execute()
+
+
+async def output_events(
+    sb: AsyncClient, oai: AsyncOpenAIClient, lesson: dict
+) -> AsyncIterator[str]:
+    """
+    SSE frames for streamed generation from the lesson's stored extraction:
+    - delta: {"output", "text"} for every chunk of text as it arrives
+    - done: the validated outputs, after they are saved, with ttftMs and totalMs
+    - error: {"code", "message"} if a stream, the final validation or the save fails;
+      nothing is saved
+    """
+    started = time.perf_counter()
+    ttft_ms: float | None = None
+    texts = {kind: "" for kind in OUTPUT_TYPES}
+    try:
+        async for kind, text in ai_pipeline.stream_outputs(oai, lesson["extraction"]):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - started) * 1000
+            texts[kind] += text
+            yield sse("delta", {"output": kind, "text": text})
+        outputs = ai_pipeline.validate_outputs(texts)
+        await save_outputs(sb, lesson, outputs)
+    except AppError as e:
+        yield sse("error", {"code": e.code, "message": e.message})
+        return
+    except DB_ERRORS:
+        logger.warning("could not save outputs for lesson %s", lesson["id"], exc_info=True)
+        yield sse("error", {"code": "SAVE_FAILED", "message": "Could not save the outputs"})
+        return
+
+    total_ms = (time.perf_counter() - started) * 1000
+    yield sse(
+        "done",
+        {
+            "outputs": outputs,
+            "ttftMs": round(ttft_ms or total_ms, 1),
+            "totalMs": round(total_ms, 1),
+        },
+    )
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections.abc import Awaitable, Callable, Mapping
+from typing import Any, Protocol
+
+import openai
+from starlette.concurrency import run_in_threadpool
+from supabase import Client
+
+from ..db import DB_ERRORS, supabase_service
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Retried with jittered backoff. Only 429s pause the whole governor.
+TRANSIENT_ERRORS = (openai.APIConnectionError, openai.InternalServerError)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Rate-limit reset values: "20ms", "1.5s", "6m0s", or bare seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNIT_SECONDS[unit] for n, unit in parts)
+
+
+def retry_after(headers: Mapping[str, str] | None) -> float | None:
+    if not headers:
+        return None
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return max(0.0, float(ms) / 1000)
+        except ValueError:
+            pass
+    return parse_duration(headers.get("retry-after"))
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> int | None:
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Budget of per_minute units, refilled continuously, with one minute of burst.
+    reserve() always succeeds and returns how long the caller must wait for its units,
+    so callers are served in the order they reserved (FIFO) without a separate queue.
+    Not thread-safe on its own; RateGovernor holds its lock around every call.
+    """
+
+    def __init__(self, per_minute: float, now: float) -> None:
+        self.per_minute = float(per_minute)
+        self.level = self.per_minute
+        self.updated = now
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def _refill(self, now: float) -> None:
+        rate = self.per_minute / 60
+        self.level = min(self.per_minute, self.level + max(0.0, now - self.updated) * rate)
+        self.updated = max(self.updated, now)
+
+    def reserve(self, amount: float, now: float) -> float:
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        self.level -= min(amount, self.per_minute)
+        debt = 0.0 if self.level >= 0 else -self.level / (self.per_minute / 60)
+        return (self.updated - now) + debt
+
+    def give_back(self, amount: float, now: float) -> None:
+        if self.enabled:
+            self._refill(now)
+            self.level = min(self.per_minute, self.level + amount)
+
+    def cap(self, remaining: float, now: float) -> None:
+        """Trust the provider when it reports less budget left than we think we have."""
+        if self.enabled:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+    def hold(self, until: float, now: float) -> None:
+        """Empty the bucket and refill nothing before until: callers queue up behind a pause."""
+        if self.enabled:
+            self._refill(now)
+            self.level = min(self.level, 0.0)
+            self.updated = max(self.updated, until)
+
+    def adopt_limit(self, per_minute: float) -> None:
+        if self.enabled and 0 < per_minute < self.per_minute:
+            self.per_minute = float(per_minute)
+            self.level = min(self.level, self.per_minute)
+
+
+class SharedStore(Protocol):
+    """Cross-process budget: reserve() returns the wait in seconds, like TokenBucket.reserve."""
+
+    def reserve(self, key: str, amount: float, per_minute: float) -> float: ...
+    def pause(self, key: str, seconds: float) -> None: ...
+
+
+class TableStore:
+    """Buckets in public.rate_limits shared by every API and worker process (migration 011)."""
+
+    def __init__(self, sb: Client | None = None) -> None:
+        self._sb = sb
+
+    @property
+    def sb(self) -> Client:
+        return self._sb or supabase_service()
+
+    def reserve(self, key: str, amount: float, per_minute: float) -> float:
+        res = self.sb.rpc(
+            "rate_reserve", {"p_key": key, "p_amount": amount, "p_per_minute": per_minute}
+        ).execute()
+        return float(res.data or 0.0)
+
+    def pause(self, key: str, seconds: float) -> None:
+        self.sb.rpc("rate_pause", {"p_key": key, "p_seconds": seconds}).execute()
+
+
+class RateGovernor:
+    """
+    Process-wide limiter for OpenAI calls, with requests-per-minute and tokens-per-minute budgets.
+    - every call reserves one request and its estimated tokens, then waits its turn
+    - usage reported by the response replaces the estimate
+    - x-ratelimit-* headers lower the local budget when the provider reports less left
+    - a 429 pauses every caller for Retry-After, drains the buckets so the callers that were
+      waiting are spread out again afterwards, and retries with jittered exponential backoff
+    With a shared store the budgets and pauses are shared across processes as well.
+    """
+
+    def __init__(
+        self,
+        rpm: float,
+        tpm: float,
+        store: SharedStore | None = None,
+        key: str = "openai",
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        now = clock()
+        self.requests = TokenBucket(rpm, now)
+        self.tokens = TokenBucket(tpm, now)
+        self.store = store
+        self.key = key
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._pauses = 0
+        self._waiting = 0
+        self._calls = 0
+        self._rate_limited = 0
+        self._retries = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # Budget
+
+    def _reserve_shared(self, tokens: float) -> float | None:
+        assert self.store is not None
+        try:
+            waits = [0.0]
+            if self.requests.enabled:
+                waits.append(
+                    self.store.reserve(f"{self.key}:requests", 1, self.requests.per_minute)
+                )
+            if self.tokens.enabled:
+                waits.append(
+                    self.store.reserve(f"{self.key}:tokens", tokens, self.tokens.per_minute)
+                )
+            return max(waits)
+        except DB_ERRORS:
+            # Shared store unavailable: fall back to this process's budget.
+            logger.warning("rate limit store unavailable for %s", self.key, exc_info=True)
+            return None
+
+    def _reserve(self, tokens: float) -> float:
+        shared = self._reserve_shared(tokens) if self.store is not None else None
+        with self._lock:
+            now = self.clock()
+            pause = self._paused_until - now
+            if shared is not None:
+                return max(shared, pause)
+            return max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now), pause)
+
+    async def _reserve_async(self, tokens: float) -> float:
+        if self.store is None:
+            return self._reserve(tokens)
+        # The shared store is a blocking Supabase RPC: keep it off the event loop.
+        return await run_in_threadpool(self._reserve, tokens)
+
+    def _begin_wait(self) -> None:
+        with self._lock:
+            self._waiting += 1
+
+    def _end_wait(self, waited: float) -> None:
+        with self._lock:
+            self._waiting -= 1
+            self._calls += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def _pause_count(self) -> int:
+        with self._lock:
+            return self._pauses
+
+    def acquire(self, tokens: float) -> float:
+        """Block until the call may go out. Returns the seconds waited."""
+        started = self.clock()
+        self._begin_wait()
+        try:
+            pauses = self._pause_count()
+            wait = self._reserve(tokens)
+            while wait > 0:
+                self.sleep(wait)
+                # A 429 elsewhere may have paused everyone while this caller slept: queue again
+                # behind the pause, so the waiting callers do not all resume at the same moment.
+                seen, pauses = pauses, self._pause_count()
+                wait = self._reserve(tokens) if pauses != seen else 0.0
+        finally:
+            waited = self.clock() - started
+            self._end_wait(waited)
+        return waited
+
+    async def acquire_async(self, tokens: float) -> float:
+        started = self.clock()
+        self._begin_wait()
+        try:
+            pauses = self._pause_count()
+            wait = await self._reserve_async(tokens)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                seen, pauses = pauses, self._pause_count()
+                wait = await self._reserve_async(tokens) if pauses != seen else 0.0
+        finally:
+            waited = self.clock() - started
+            self._end_wait(waited)
+        return waited
+
+    def settle(self, estimated: float, actual: float | None) -> None:
+        """Correct the token reservation once the response reports real usage."""
+        if actual is None or self.store is not None:
+            return
+        with self._lock:
+            now = self.clock()
+            if actual < estimated:
+                self.tokens.give_back(estimated - actual, now)
+            else:
+                self.tokens.reserve(actual - estimated, now)
+
+    # Feedback from the provider
+
+    def observe(self, headers: Mapping[str, str] | None) -> None:
+        if not headers:
+            return
+        with self._lock:
+            now = self.clock()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = _int_header(headers, f"x-ratelimit-limit-{kind}")
+                if limit is not None:
+                    bucket.adopt_limit(limit)
+                remaining = _int_header(headers, f"x-ratelimit-remaining-{kind}")
+                if remaining is not None:
+                    bucket.cap(remaining, now)
+                    if remaining == 0:
+                        reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                        if reset:
+                            bucket.hold(now + reset, now)
+
+    def rate_limited(self, headers: Mapping[str, str] | None) -> float:
+        """Pause every caller after a 429. Returns the pause length."""
+        pause = retry_after(headers) or self.backoff_base
+        with self._lock:
+            now = self.clock()
+            self._rate_limited += 1
+            self._pauses += 1
+            self._paused_until = max(self._paused_until, now + pause)
+            self.requests.hold(self._paused_until, now)
+            self.tokens.hold(self._paused_until, now)
+        if self.store is not None:
+            try:
+                self.store.pause(self.key, pause)
+            except DB_ERRORS:
+                logger.warning("could not share the 429 pause for %s", self.key, exc_info=True)
+        self.observe(headers)
+        return pause
+
+    def backoff(self, attempt: int, floor: float = 0.0) -> float:
+        """Full jitter over the exponential step, never below floor (the Retry-After)."""
+        step = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return max(floor, random.uniform(step / 2, step))
+
+    # Calls
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float | None:
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, openai.RateLimitError):
+            pause = self.rate_limited(error.response.headers)
+            return self.backoff(attempt, floor=pause)
+        if isinstance(error, TRANSIENT_ERRORS):
+            return self.backoff(attempt)
+        return None
+
+    def call(self, send: Callable[[], Any], tokens: float = 0) -> Any:
+        """
+        Run send() inside the budget. send returns a raw response (with_raw_response), so
+        headers can be read; the parsed result is returned.
+        """
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            try:
+                raw = send()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                with self._lock:
+                    self._retries += 1
+                self.sleep(delay)
+                attempt += 1
+                continue
+            return self._finish(raw, tokens)
+
+    async def call_async(self, send: Callable[[], Awaitable[Any]], tokens: float = 0) -> Any:
+        attempt = 0
+        while True:
+            await self.acquire_async(tokens)
+            try:
+                raw = await send()
+            except Exception as e:
+                if self.store is not None:
+                    # A 429 shares its pause through the store, which blocks.
+                    delay = await run_in_threadpool(self._retry_delay, e, attempt)
+                else:
+                    delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                with self._lock:
+                    self._retries += 1
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            return self._finish(raw, tokens)
+
+    def _finish(self, raw: Any, tokens: float) -> Any:
+        self.observe(getattr(raw, "headers", None))
+        result = raw.parse() if hasattr(raw, "parse") else raw
+        usage = getattr(result, "usage", None)
+        self.settle(tokens, getattr(usage, "total_tokens", None))
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = self.clock()
+            return {
+                "queueDepth": self._waiting,
+                "calls": self._calls,
+                "rateLimited": self._rate_limited,
+                "retries": self._retries,
+                "waitSecondsTotal": round(self._wait_total, 3),
+                "waitSecondsMax": round(self._wait_max, 3),
+                "pausedForSeconds": round(max(0.0, self._paused_until - now), 3),
+            }
+
+
+def build_governor() -> RateGovernor:
+    return RateGovernor(
+        rpm=settings.openai_rpm_limit,
+        tpm=settings.openai_tpm_limit,
+        store=TableStore() if settings.openai_rate_store == "table" else None,
+        max_retries=settings.openai_max_retries,
+        backoff_base=settings.openai_backoff_base_seconds,
+        backoff_max=settings.openai_backoff_max_seconds,
+    )
+
+
+governor = build_governor()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any, Protocol
+
+from packages.ai_contract.src.registry import OUTPUT_PROMPTS, OUTPUTS_SCHEMA, registry
+from supabase import Client
+
+from ..db import DB_ERRORS, supabase_service
+from ..settings import settings
+from . import ai_pipeline
+from .openai_client import OpenAIClient
+from .single_flight import flights
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Any | None: ...
+    def put(self, key: str, value: Any) -> None: ...
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: dict[str, dict[str, int]] = {}
+
+    def record(self, kind: str, hit: bool) -> None:
+        with self._lock:
+            bucket = self.counts.setdefault(kind, {"hits": 0, "misses": 0})
+            bucket["hits" if hit else "misses"] += 1
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {kind: dict(c) for kind, c in self.counts.items()}
+
+
+class LRUCache:
+    """In-process cache bounded by entry count, with a TTL per entry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class TableCache:
+    """Persistent cache in public.ai_result_cache, shared by every API and worker process."""
+
+    def __init__(self, sb: Client | None, ttl_seconds: float) -> None:
+        self._sb = sb
+        self.ttl_seconds = ttl_seconds
+
+    @property
+    def sb(self) -> Client:
+        return self._sb or supabase_service()
+
+    def get(self, key: str) -> Any | None:
+        rows = (
+            self.sb.table("ai_result_cache")
+            .select("value")
+            .eq("key", key)
+            .gt("expires_at", datetime.now(UTC).isoformat())
+            .limit(1)
+            .execute()
+            .data
+        )
+        return rows[0]["value"] if rows else None
+
+    def put(self, key: str, value: Any) -> None:
+        """Upsert the entry; the same call deletes entries that have expired (migration 017)."""
+        self.sb.rpc(
+            "ai_cache_put",
+            {
+                "p_key": key,
+                "p_kind": key.split(":", 1)[0],
+                "p_value": value,
+                "p_ttl_seconds": int(self.ttl_seconds),
+            },
+        ).execute()
+
+
+class TieredCache:
+    """LRU in front of a persistent backend; persistent hits are promoted into the LRU."""
+
+    def __init__(self, near: CacheBackend, far: CacheBackend) -> None:
+        self.near = near
+        self.far = far
+
+    def get(self, key: str) -> Any | None:
+        value = self.near.get(key)
+        if value is None:
+            value = self.far.get(key)
+            if value is not None:
+                self.near.put(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self.near.put(key, value)
+        self.far.put(key, value)
+
+
+def content_key(kind: str, *parts: str) -> str:
+    """
+    Hash of everything that determines a result. Prompt and schema text are part of the key,
+    so editing either one changes the key and old entries are simply never read again.
+    """
+    h = hashlib.sha256(kind.encode("utf-8"))
+    for part in parts:
+        h.update(b"\0")
+        h.update(part.encode("utf-8"))
+    return f"{kind}:{h.hexdigest()}"
+
+
+def build_cache(backend: str) -> CacheBackend | None:
+    if backend == "none":
+        return None
+    memory = LRUCache(settings.ai_cache_max_entries, settings.ai_cache_ttl_seconds)
+    if backend == "memory":
+        return memory
+    table = TableCache(None, settings.ai_cache_ttl_seconds)
+    if backend == "table":
+        return table
+    return TieredCache(memory, table)
+
+
+cache = build_cache(settings.ai_cache_backend)
+stats = CacheStats()
+
+
+def cached(kind: str, key: str, compute: Callable[[], Any], backend: CacheBackend | None = None) -> Any:
+    """
+    Cache lookup, then compute on a miss. Concurrent misses for the same key share one
+    compute (single_flight), so a double submit pays for one LLM call.
+    """
+    backend = backend if backend is not None else cache
+    if backend is None:
+        return flights.do(key, compute)
+    try:
+        value = backend.get(key)
+    except DB_ERRORS:
+        # A cache outage must never fail the pipeline.
+        logger.warning("result cache read failed for %s", kind, exc_info=True)
+        value = None
+    stats.record(kind, value is not None)
+    if value is not None:
+        return value
+
+    def compute_and_store() -> Any:
+        value = compute()
+        try:
+            backend.put(key, value)
+        except DB_ERRORS:
+            logger.warning("result cache write failed for %s", kind, exc_info=True)
+        return value
+
+    return flights.do(key, compute_and_store)
+
+
+def extract_key(transcript: str) -> str:
+    return content_key(
+        "extract",
+        settings.openai_llm_model,
+        str(settings.extraction_chunk_chars),
+        registry.extraction_prompt(),
+        transcript,
+    )
+
+
+def generate_key(extraction_json: dict, mode: str) -> str:
+    prompts = [registry.prompt(name) for name in OUTPUT_PROMPTS.values()]
+    if mode == "combined":
+        prompts.append(registry.combined_outputs_prompt())
+    return content_key(
+        "generate",
+        settings.openai_llm_model,
+        mode,
+        registry.schema_text(OUTPUTS_SCHEMA),
+        *prompts,
+        json.dumps(extraction_json, sort_keys=True, ensure_ascii=False),
+    )
+
+
+def cached_extract(oai: OpenAIClient, transcript: str) -> dict:
+    return cached("extract", extract_key(transcript), lambda: ai_pipeline.extract(oai, transcript))
+
+
+def cached_generate(
+    oai: OpenAIClient,
+    extraction_json: dict,
+    names: list[str] | None = None,
+    on_output: Callable[[str, str], None] | None = None,
+) -> dict:
+    """
+    The full output set is cached; a subset (resuming a partly generated lesson) is
+    generated directly since it is only ever needed once.
+    """
+    mode = settings.generation_mode
+    if names is not None and set(names) != set(OUTPUT_PROMPTS):
+        return ai_pipeline.generate(oai, extraction_json, mode=mode, names=names, on_output=on_output)
+    return cached(
+        "generate",
+        generate_key(extraction_json, mode),
+        lambda: ai_pipeline.generate(oai, extraction_json, mode=mode, on_output=on_output),
+    )
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from supabase import Client
+
+from ..db import DB_ERRORS
+from ..errors import AppError
+from ..settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Lease(Protocol):
+    def run(self, key: str, fn: Callable[[], Any]) -> Any: ...
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs fn, callers that
+    arrive while it is running wait and get its result, or its exception raised again.
+    The key is forgotten once the call finishes, so results are not cached here; callers put
+    a cache in front (result_cache, audio_transcripts). With a lease, the leader of this
+    process also coordinates with the other processes before running fn.
+    """
+
+    def __init__(self, lease: Lease | None = None) -> None:
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self.lease.run(key, fn) if self.lease is not None else fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class TableLease:
+    """
+    Cross-process coalescing through public.inflight_calls (migration 012). The process that
+    claims the key runs fn and publishes the result (JSON) or error on the row; the others poll
+    the row until it finishes, or take over once the leader's lease expires. If the table is
+    unreachable, fn simply runs: coalescing saves money but never blocks the pipeline.
+    """
+
+    def __init__(
+        self,
+        sb: Client | None = None,
+        lease_seconds: int = 900,
+        poll_seconds: float = 1.0,
+        keep_seconds: int = 10,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self._sb = sb
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.keep_seconds = keep_seconds
+        self.sleep = sleep
+
+    @property
+    def sb(self) -> Client:
+        from ..db import supabase_service
+
+        return self._sb or supabase_service()
+
+    def _claim(self, key: str, holder: str) -> dict | None:
+        try:
+            res = self.sb.rpc(
+                "inflight_claim",
+                {"p_key": key, "p_holder": holder, "p_lease_seconds": self.lease_seconds},
+            ).execute()
+        except DB_ERRORS:
+            logger.warning("inflight_calls unavailable; running %s uncoalesced", key, exc_info=True)
+            return None
+        return res.data or None
+
+    def _finish(self, key: str, holder: str, result: Any = None, error: dict | None = None) -> None:
+        try:
+            self.sb.rpc(
+                "inflight_finish",
+                {
+                    "p_key": key,
+                    "p_holder": holder,
+                    "p_result": result,
+                    "p_error": error,
+                    "p_keep_seconds": self.keep_seconds,
+                },
+            ).execute()
+        except DB_ERRORS:
+            # Waiters take over when the lease expires.
+            logger.warning("could not publish the result of %s", key, exc_info=True)
+
+    def run(self, key: str, fn: Callable[[], Any]) -> Any:
+        holder = uuid.uuid4().hex
+        while True:
+            row = self._claim(key, holder)
+            if row is None:
+                return fn()
+            if row.get("claimed"):
+                try:
+                    value = fn()
+                except AppError as e:
+                    self._finish(key, holder, error={"code": e.code, "message": e.message})
+                    raise
+                except Exception as e:
+                    self._finish(key, holder, error={"code": "UNKNOWN", "message": str(e)})
+                    raise
+                self._finish(key, holder, result=value)
+                return value
+            if row.get("state") == "done":
+                return row.get("result")
+            if row.get("state") == "failed":
+                error = row.get("error") or {}
+                raise AppError(
+                    code=error.get("code", "UNKNOWN"),
+                    message=error.get("message", "Shared call failed"),
+                )
+            self.sleep(self.poll_seconds)
+
+
+def build_flights(backend: str) -> SingleFlight:
+    if backend == "table":
+        return SingleFlight(
+            TableLease(
+                lease_seconds=settings.single_flight_lease_seconds,
+                poll_seconds=settings.single_flight_poll_seconds,
+            )
+        )
+    return SingleFlight()
+
+
+flights = build_flights(settings.single_flight_backend)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import tempfile
+import urllib.parse
+from typing import IO
+
+import requests
+
+from ..errors import AppError
+from ..settings import settings
+
+_session = requests.Session()
+
+_DROPPED = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+
+def object_url(bucket: str, path: str) -> str:
+    return f"{settings.supabase_url}/storage/v1/object/{bucket}/{urllib.parse.quote(path)}"
+
+
+def _total_size(resp: requests.Response, offset: int) -> int | None:
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        return int(content_range.rsplit("/", 1)[1])
+    length = resp.headers.get("Content-Length")
+    return offset + int(length) if length is not None else None
+
+
+def fetch_audio(audio_path: str, bucket: str | None = None) -> IO[bytes]:
+    """
+    Stream a Storage object into a spooled temp file and return it rewound.
+    Memory use is capped at audio_spool_max_bytes; larger files spill to disk.
+    A dropped connection resumes with an HTTP Range request from the last byte received.
+    """
+    url = object_url(bucket or settings.audio_bucket, audio_path)
+    auth = {
+        "Authorization": f"Bearer {settings.supabase_service_role_key}",
+        "apikey": settings.supabase_service_role_key,
+    }
+    # Not a context manager: the spool is returned to the caller, which closes it.
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.audio_spool_max_bytes)  # noqa: SIM115
+    received = 0
+    total: int | None = None
+    retries = 0
+
+    while True:
+        headers = dict(auth)
+        if received:
+            headers["Range"] = f"bytes={received}-"
+        try:
+            with _session.get(url, headers=headers, stream=True, timeout=settings.audio_fetch_timeout_seconds) as resp:
+                if resp.status_code in (400, 404):
+                    raise AppError(code="AUDIO_NOT_FOUND", message=f"Audio not found: {audio_path}")
+                if resp.status_code == 200 and received:
+                    # Server ignored the range; start over rather than duplicate bytes.
+                    spool.seek(0)
+                    spool.truncate()
+                    received = 0
+                elif resp.status_code not in (200, 206):
+                    raise AppError(code="AUDIO_FETCH_FAILED", message=f"Storage returned {resp.status_code}")
+                total = _total_size(resp, received)
+                for chunk in resp.iter_content(chunk_size=settings.audio_fetch_chunk_bytes):
+                    spool.write(chunk)
+                    received += len(chunk)
+            if total is None or received >= total:
+                break
+            raise requests.exceptions.ChunkedEncodingError(f"Response ended at byte {received} of {total}")
+        except _DROPPED as e:
+            retries += 1
+            if retries > settings.audio_fetch_retries:
+                spool.close()
+                raise AppError(code="AUDIO_FETCH_FAILED", message=f"Audio download interrupted: {e}")
+        except AppError:
+            spool.close()
+            raise
+
+    spool.seek(0)
+    return spool
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Callable
+from typing import BinaryIO
+
+from supabase import Client
+
+from ..settings import settings
+from .ai_pipeline import transcribe
+from .openai_client import OpenAIClient
+from .single_flight import flights
+
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def audio_digest(audio: str | BinaryIO) -> str:
+    """sha256 of the audio content, read in fixed-size chunks so memory stays flat."""
+    h = hashlib.sha256()
+    if isinstance(audio, str):
+        with open(audio, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                h.update(chunk)
+    else:
+        start = audio.tell()
+        while chunk := audio.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+        audio.seek(start)
+    return h.hexdigest()
+
+
+def cached_transcribe(
+    sb: Client,
+    oai: OpenAIClient,
+    audio: str | BinaryIO,
+    on_progress: Callable[[int, int], None] | None = None,
+    filename: str = "audio.m4a",
+) -> tuple[str, str]:
+    """
+    Transcribe audio once per (content hash, model). Re-submitted or retried recordings
+    reuse the stored transcript instead of uploading to Whisper again; the same recording
+    submitted twice at once is uploaded once (single_flight).
+    Returns (transcript, audio sha256).
+    """
+    digest = audio_digest(audio)
+    model = settings.openai_transcribe_model
+    rows = (
+        sb.table("audio_transcripts")
+        .select("transcript")
+        .eq("audio_sha256", digest)
+        .eq("model", model)
+        .limit(1)
+        .execute()
+        .data
+    )
+    if rows:
+        return rows[0]["transcript"], digest
+
+    def transcribe_and_store() -> str:
+        transcript = transcribe(oai, audio, on_progress=on_progress, filename=filename)
+        sb.table("audio_transcripts").upsert(
+            {"audio_sha256": digest, "model": model, "transcript": transcript}
+        ).execute()
+        return transcript
+
+    return flights.do(f"transcribe:{model}:{digest}", transcribe_and_store), digest
@@ -7,10 +7,72 @@ class Settings(BaseSettings):
     supabase_url: str
     supabase_anon_key: str
     supabase_service_role_key: str
+    supabase_jwt_secret: str | None = None
+
+    auth_mode: str = "local"
+    auth_remote_fallback: bool = True
+    auth_audience: str = "authenticated"
+    auth_cache_ttl_seconds: int = 60
+    auth_cache_max_entries: int = 10000
+    auth_jwks_refresh_seconds: int = 300
+
+    supabase_pool_size: int = 20
+    supabase_keepalive_seconds: float = 30.0
+    supabase_timeout_seconds: float = 30.0
 
     openai_api_key: str
     openai_transcribe_model: str = "whisper-1"
     openai_llm_model: str = "gpt-4o-mini"
+    transcribe_chunk_seconds: float = 600.0
+    # The transcription API rejects files over 25 MB; WAV segments are cut to fit under this.
+    transcribe_max_upload_bytes: int = 24 * 1024 * 1024
+    transcribe_overlap_seconds: float = 3.0
+    transcribe_concurrency: int = 4
+    extraction_chunk_chars: int = 24000
+    extraction_concurrency: int = 4
+    generation_mode: str = "per_output"
+    generation_concurrency: int = 3
+
+    # Shared OpenAI budget (0 disables a limit). memory = per process, table = all processes.
+    openai_rpm_limit: int = 500
+    openai_tpm_limit: int = 200000
+    openai_rate_store: str = "memory"
+    openai_max_retries: int = 5
+    openai_backoff_base_seconds: float = 1.0
+    openai_backoff_max_seconds: float = 60.0
+    openai_completion_token_estimate: int = 1000
+
+    # memory | table | tiered | none
+    ai_cache_backend: str = "memory"
+    ai_cache_max_entries: int = 512
+    ai_cache_ttl_seconds: int = 7 * 24 * 3600
+
+    # Identical concurrent extract/generate/transcribe calls run once.
+    # memory = per process, table = across processes (public.inflight_calls)
+    single_flight_backend: str = "memory"
+    single_flight_lease_seconds: int = 900
+    single_flight_poll_seconds: float = 1.0
+
+    audio_bucket: str = "lesson-audio"
+    audio_spool_max_bytes: int = 8 * 1024 * 1024
+    audio_fetch_chunk_bytes: int = 256 * 1024
+    audio_fetch_retries: int = 3
+    audio_fetch_timeout_seconds: float = 30.0
+
+    worker_concurrency: int = 0
+    worker_poll_seconds: float = 2.0
+    job_max_attempts: int = 3
+    job_lease_seconds: int = 900
+    job_retry_base_seconds: float = 30.0
+    job_retry_max_seconds: float = 900.0
+    events_heartbeat_seconds: float = 15.0
+    events_poll_seconds: float = 10.0
+    batch_max_items: int = 500
+    # Idempotency-Key: responses are replayed for ttl; a running first request holds the key
+    # for at most lock seconds, and duplicates re-check every poll seconds meanwhile.
+    idempotency_ttl_seconds: int = 24 * 3600
+    idempotency_lock_seconds: int = 60
+    idempotency_poll_seconds: float = 0.1
 
     resend_api_key: str | None = None
     email_from: str | None = None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import logging
+import os
+import random
+import socket
+import threading
+from datetime import UTC, datetime, timedelta
+
+from supabase import Client
+
+from .db import supabase_service
+from .errors import AppError
+from .services.events import bus
+from .services.lesson_pipeline import process_job
+from .services.openai_client import OpenAIClient
+from .services.openai_client import client as openai_client
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with full jitter, capped."""
+    ceiling = min(settings.job_retry_max_seconds, settings.job_retry_base_seconds * 2 ** max(attempts - 1, 0))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+class Worker:
+    """
+    Claims jobs from public.jobs through the claim_job RPC and runs the lesson pipeline.
+    Any number of workers can run per process and across processes; the RPC uses
+    FOR UPDATE SKIP LOCKED so each job is claimed by exactly one of them.
+    """
+
+    def __init__(self, sb: Client, oai: OpenAIClient, worker_id: str) -> None:
+        self.sb = sb
+        self.oai = oai
+        self.worker_id = worker_id
+
+    def claim(self) -> dict | None:
+        res = self.sb.rpc(
+            "claim_job", {"p_worker": self.worker_id, "p_lease_seconds": settings.job_lease_seconds}
+        ).execute()
+        rows = res.data or []
+        return rows[0] if rows else None
+
+    def run_once(self) -> bool:
+        """Process at most one job. Returns False when the queue had nothing runnable."""
+        job = self.claim()
+        if job is None:
+            return False
+        try:
+            process_job(self.sb, self.oai, job)
+        except AppError as e:
+            self.fail(job, e.code, e.message)
+        except Exception as e:
+            # Anything else is a bug or an outage; record it on the job instead of losing it.
+            logger.exception("job %s failed", job["id"])
+            self.fail(job, "UNKNOWN", str(e))
+        return True
+
+    def fail(self, job: dict, code: str, message: str) -> None:
+        """Requeue with backoff, or mark FAILED after job_max_attempts, in one fail_lesson call."""
+        attempts = int(job.get("attempts") or 0)
+        retry = attempts < settings.job_max_attempts
+        run_after = datetime.now(UTC) + timedelta(seconds=retry_delay(attempts)) if retry else None
+        self.sb.rpc(
+            "fail_lesson",
+            {
+                "p_job_id": job["id"],
+                "p_lesson_id": job["lesson_id"],
+                "p_code": code,
+                "p_message": message,
+                "p_retry_at": run_after.isoformat() if run_after else None,
+            },
+        ).execute()
+        if retry:
+            bus.publish(job["lesson_id"], {"status": "QUEUED", "step": "QUEUED", "lastError": message})
+        else:
+            bus.publish(job["lesson_id"], {"status": "FAILED", "step": "FAILED", "progress": 100, "lastError": message})
+
+    def run_forever(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                busy = self.run_once()
+            except Exception:
+                # Claim failures (database unavailable) must not kill the worker thread.
+                logger.exception("worker %s could not claim or record a job", self.worker_id)
+                busy = False
+            if not busy:
+                stop.wait(settings.worker_poll_seconds)
+
+
+class WorkerPool:
+    def __init__(self, workers: list[Worker]) -> None:
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self.threads = [
+            threading.Thread(target=w.run_forever, args=(self.stop_event,), name=w.worker_id, daemon=True)
+            for w in workers
+        ]
+
+    def start(self) -> WorkerPool:
+        for t in self.threads:
+            t.start()
+        return self
+
+    def stop(self, timeout: float | None = None) -> None:
+        self.stop_event.set()
+        for t in self.threads:
+            t.join(timeout)
+
+
+def start_workers(
+    concurrency: int, sb: Client | None = None, oai: OpenAIClient | None = None
+) -> WorkerPool:
+    sb = sb or supabase_service()
+    oai = oai or openai_client()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    return WorkerPool([Worker(sb, oai, f"{prefix}:{i}") for i in range(concurrency)]).start()
+
+
+def main() -> None:
+    pool = start_workers(max(settings.worker_concurrency, 1))
+    try:
+        pool.stop_event.wait()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
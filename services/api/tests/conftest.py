@@ -4,7 +4,6 @@ import os
 import sys
 from pathlib import Path
 
-
 ROOT = Path(__file__).resolve().parents[3]
 
 if str(ROOT) not in sys.path:
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+
 
 class FakeResult:
     def __init__(self, data):
@@ -7,15 +9,19 @@ class FakeResult:
 
 
 class FakeTable:
-    def __init__(self, name: str, store: dict[str, object]):
+    def __init__(self, name: str, store: dict[str, object], calls: list | None = None):
         self.name = name
         self.store = store
+        self.calls = calls if calls is not None else []
         self._single = False
         self._op = None
         self._data = None
+        self._filters: list[tuple] = []
+        self._limit: int | None = None
 
-    def select(self, *_args, **_kwargs):
+    def select(self, *args, **_kwargs):
         self._op = "select"
+        self._data = args[0] if args else "*"
         return self
 
     def insert(self, data):
@@ -28,19 +34,51 @@ class FakeTable:
         self._data = data
         return self
 
-    def eq(self, *_args, **_kwargs):
+    def upsert(self, data, **_kwargs):
+        self._op = "upsert"
+        self._data = data
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def eq(self, *args, **_kwargs):
+        self._filters.append(("eq", *args))
+        return self
+
+    def gt(self, *args, **_kwargs):
+        self._filters.append(("gt", *args))
+        return self
+
+    def lt(self, *args, **_kwargs):
+        self._filters.append(("lt", *args))
+        return self
+
+    def or_(self, *args, **_kwargs):
+        self._filters.append(("or", *args))
         return self
 
     def order(self, *_args, **_kwargs):
         return self
 
+    def limit(self, count, *_args, **_kwargs):
+        self._limit = count
+        return self
+
     def single(self):
         self._single = True
         return self
 
     def execute(self):
+        self.calls.append((self.name, self._op, self._data, tuple(self._filters)))
         if self._op == "select":
             data = self.store.get(self.name)
+            if callable(data):
+                # A callable table receives the filters and returns the matching rows.
+                data = data(self._filters)
+            if isinstance(data, list) and self._limit is not None:
+                data = data[: self._limit]
         elif self._op == "insert":
             if isinstance(self._data, dict):
                 item = dict(self._data)
@@ -48,7 +86,7 @@ class FakeTable:
                 data = [item]
             else:
                 data = self._data
-        elif self._op == "update":
+        elif self._op in ("update", "upsert"):
             data = [self._data] if isinstance(self._data, dict) else self._data
         else:
             data = self.store.get(self.name)
@@ -58,9 +96,84 @@ class FakeTable:
         return FakeResult(data)
 
 
+class FakeRPC:
+    def __init__(self, name: str, params: dict, store: dict[str, object], calls: list):
+        self.name = name
+        self.params = params
+        self.store = store
+        self.calls = calls
+
+    def execute(self):
+        self.calls.append((self.name, "rpc", self.params, ()))
+        handler = self.store.get(f"rpc:{self.name}")
+        data = handler(self.params) if callable(handler) else handler
+        return FakeResult(data)
+
+
 class FakeClient:
     def __init__(self, store: dict[str, object]):
         self.store = store
+        self.calls: list[tuple] = []
 
     def table(self, name: str) -> FakeTable:
-        return FakeTable(name, self.store)
+        return FakeTable(name, self.store, self.calls)
+
+    def rpc(self, name: str, params: dict | None = None) -> FakeRPC:
+        return FakeRPC(name, params or {}, self.store, self.calls)
+
+    def updates(self, table: str) -> list[dict]:
+        return [data for name, op, data, _ in self.calls if name == table and op == "update"]
+
+    def upserts(self, table: str) -> list:
+        return [data for name, op, data, _ in self.calls if name == table and op == "upsert"]
+
+    def inserts(self, table: str) -> list:
+        return [data for name, op, data, _ in self.calls if name == table and op == "insert"]
+
+    def rpcs(self, fn: str) -> list[dict]:
+        return [data for name, op, data, _ in self.calls if name == fn and op == "rpc"]
+
+
+class FakeAsyncTable(FakeTable):
+    def __init__(self, *args, latency: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+
+    async def execute(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().execute()
+
+
+class FakeAsyncRPC(FakeRPC):
+    def __init__(self, *args, latency: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = latency
+
+    async def execute(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return super().execute()
+
+
+class FakeAsyncClient(FakeClient):
+    """FakeClient for the async Supabase client: execute() is awaited, optionally after latency seconds."""
+
+    def __init__(self, store: dict[str, object], latency: float = 0.0):
+        super().__init__(store)
+        self.latency = latency
+
+    def table(self, name: str) -> FakeAsyncTable:
+        return FakeAsyncTable(name, self.store, self.calls, latency=self.latency)
+
+    def rpc(self, name: str, params: dict | None = None) -> FakeAsyncRPC:
+        return FakeAsyncRPC(name, params or {}, self.store, self.calls, latency=self.latency)
+
+
+def returns(value):
+    """An async function that ignores its arguments and returns value (for patching coroutines)."""
+
+    async def fake(*_args, **_kwargs):
+        return value
+
+    return fake
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import json
+import time
 from types import SimpleNamespace
 
+import pytest
+
+from app.errors import AppError
 from app.services import ai_pipeline
 
 
@@ -16,23 +21,53 @@ class FakeAudio:
 
 
 class FakeChatCompletions:
-    def __init__(self, contents: list[str]):
+    """
+    contents is either a list consumed in call order, or a mapping of prompt marker to content
+    (needed once calls run concurrently and their order is no longer fixed).
+    """
+
+    def __init__(self, contents: list[str] | dict[str, str], delay: float = 0.0):
         self._contents = contents
+        self._delay = delay
+        self.calls = 0
 
     def create(self, *args, **kwargs):
-        content = self._contents.pop(0)
+        self.calls += 1
+        if self._delay:
+            time.sleep(self._delay)
+        if isinstance(self._contents, dict):
+            prompt = kwargs["messages"][0]["content"]
+            content = next(v for k, v in self._contents.items() if k in prompt)
+        else:
+            content = self._contents.pop(0)
         return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
 
 
 class FakeChat:
-    def __init__(self, contents: list[str]):
-        self.completions = FakeChatCompletions(contents)
+    def __init__(self, contents: list[str] | dict[str, str], delay: float = 0.0):
+        self.completions = FakeChatCompletions(contents, delay)
 
 
 class FakeOpenAI:
-    def __init__(self, chat_contents: list[str] | None = None):
+    def __init__(self, chat_contents: list[str] | dict[str, str] | None = None, delay: float = 0.0):
         self.audio = FakeAudio()
-        self.chat = FakeChat(chat_contents or [])
+        self.chat = FakeChat(chat_contents or [], delay)
+
+
+EXTRACTION = {
+    "student": "Sam",
+    "instrument": "Piano",
+    "highlights": ["Great rhythm"],
+    "focus_areas": ["Scales"],
+    "assignments": [{"task": "Practice scales", "target": "10 min", "confidence": 0.8}],
+    "evidence": [{"claim": "Great rhythm", "quote": "Nice rhythm today"}],
+}
+
+GENERATED = {
+    "student recap": "A" * 60,
+    "practice plan": "B" * 120,
+    "parent email": "C" * 60,
+}
 
 
 def test_transcribe(tmp_path) -> None:
@@ -52,27 +87,83 @@ def test_extract_validates_schema() -> None:
         "assignments": [{"task": "Practice scales", "target": "10 min", "confidence": 0.8}],
         "evidence": [{"claim": "Great rhythm", "quote": "Nice rhythm today"}],
     }
-    oai = FakeOpenAI([__import__("json").dumps(extraction)])
+    oai = FakeOpenAI([json.dumps(extraction)])
     result = ai_pipeline.extract(oai, "Transcript")
     assert result["student"] == "Sam"
 
 
+def test_extract_long_transcript_in_chunks() -> None:
+    def part(student: str, highlight: str) -> str:
+        return json.dumps({**EXTRACTION, "student": student, "highlights": [highlight]})
+
+    oai = FakeOpenAI(
+        {
+            "part 1 of 3": part("Sam", "Great rhythm"),
+            "part 2 of 3": part("Unknown", "great rhythm!"),
+            "part 3 of 3": part("Sam", "Clean shifts"),
+        }
+    )
+    transcript = "\n".join(f"Teacher: line {i} of a long lesson." for i in range(30))
+
+    result = ai_pipeline.extract(oai, transcript, max_chars=400)
+
+    assert oai.chat.completions.calls == 3
+    assert result["student"] == "Sam"
+    assert result["highlights"] == ["Great rhythm", "Clean shifts"]
+    assert result["assignments"] == EXTRACTION["assignments"]
+    assert result["evidence"] == [{**EXTRACTION["evidence"][0], "chunk": 0}]
+
+
 def test_generate_outputs() -> None:
-    extraction = {
-        "student": "Sam",
-        "instrument": "Piano",
-        "highlights": ["Great rhythm"],
-        "focus_areas": ["Scales"],
-        "assignments": [{"task": "Practice scales", "target": "10 min", "confidence": 0.8}],
-        "evidence": [{"claim": "Great rhythm", "quote": "Nice rhythm today"}],
-    }
-    outputs = [
-        "A" * 60,
-        "B" * 120,
-        "C" * 60,
-    ]
-    oai = FakeOpenAI(outputs.copy())
-    result = ai_pipeline.generate(oai, extraction)
+    oai = FakeOpenAI(dict(GENERATED))
+    result = ai_pipeline.generate(oai, EXTRACTION)
     assert len(result["student_recap"]) >= 50
     assert len(result["practice_plan"]) >= 100
     assert len(result["parent_email"]) >= 50
+
+
+def test_generate_runs_outputs_concurrently() -> None:
+    delay = 0.2
+
+    started = time.perf_counter()
+    ai_pipeline.generate(FakeOpenAI(dict(GENERATED), delay=delay), EXTRACTION, max_workers=1)
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ai_pipeline.generate(FakeOpenAI(dict(GENERATED), delay=delay), EXTRACTION, max_workers=3)
+    concurrent = time.perf_counter() - started
+
+    assert sequential >= 3 * delay
+    assert concurrent < 2 * delay
+    assert concurrent < sequential / 2
+
+
+def test_generate_reports_failing_output() -> None:
+    oai = FakeOpenAI({**GENERATED, "practice plan": "too short"})
+    with pytest.raises(AppError) as exc:
+        ai_pipeline.generate(oai, EXTRACTION)
+    assert exc.value.code == "GENERATION_FAILED"
+    assert exc.value.message.startswith("practice_plan:")
+    assert "student_recap" not in exc.value.message
+
+
+def test_generate_combined_mode_single_call() -> None:
+    combined = {"student_recap": "A" * 60, "practice_plan": "B" * 120, "parent_email": "C" * 60}
+    oai = FakeOpenAI({"Write all three lesson outputs": json.dumps(combined)})
+    result = ai_pipeline.generate(oai, EXTRACTION, mode="combined")
+    assert result == combined
+    assert oai.chat.completions.calls == 1
+
+
+def test_generate_combined_mode_falls_back_for_invalid_fields() -> None:
+    combined = {"student_recap": "A" * 60, "practice_plan": "too short", "parent_email": "C" * 60}
+    oai = FakeOpenAI(
+        {
+            "Write all three lesson outputs": json.dumps(combined),
+            "practice plan": "B" * 120,
+        }
+    )
+    result = ai_pipeline.generate(oai, EXTRACTION, mode="combined")
+    assert result["practice_plan"] == "B" * 120
+    assert result["student_recap"] == "A" * 60
+    assert oai.chat.completions.calls == 2
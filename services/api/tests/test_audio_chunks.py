@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import struct
+import threading
+import time
+import wave
+from types import SimpleNamespace
+
+from app.services import ai_pipeline
+from app.services.audio_chunks import plan_segments, stitch
+
+RATE = 8000
+WORD_SECONDS = 0.5
+WORDS = [f"w{i}" for i in range(120)]  # one minute of "speech"
+
+
+def write_lesson_wav(path) -> None:
+    """Each sample stores the index of the word being spoken at that moment."""
+    frames_per_word = int(RATE * WORD_SECONDS)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        for i in range(len(WORDS)):
+            w.writeframes(struct.pack("<h", i) * frames_per_word)
+
+
+class FakeChunkTranscriptions:
+    """Returns the words covered by the uploaded chunk, like a perfect speech model."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.names: list[str] = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def create(self, model: str, file):
+        name, buf = file
+        with self._lock:
+            self.names.append(name)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with wave.open(buf, "rb") as w:
+            frames = w.readframes(w.getnframes())
+        samples = struct.unpack(f"<{len(frames) // 2}h", frames)
+        with self._lock:
+            self.active -= 1
+        return SimpleNamespace(text=" ".join(WORDS[samples[0] : samples[-1] + 1]))
+
+
+def fake_openai(delay: float = 0.0) -> SimpleNamespace:
+    return SimpleNamespace(audio=SimpleNamespace(transcriptions=FakeChunkTranscriptions(delay)))
+
+
+def test_plan_segments_overlap_and_cover() -> None:
+    segments = plan_segments(n_frames=100, rate=1, chunk_seconds=30, overlap_seconds=5)
+    assert [(s.start_frame, s.n_frames) for s in segments] == [(0, 30), (25, 30), (50, 30), (75, 25)]
+
+    capped = plan_segments(n_frames=100, rate=1, chunk_seconds=600, overlap_seconds=5, max_frames=40)
+    assert [(s.start_frame, s.n_frames) for s in capped] == [(0, 40), (35, 40), (70, 30)]
+
+
+def test_stitch_removes_overlap() -> None:
+    texts = ["the quick brown fox jumps", "fox jumps over the lazy", "the lazy dog sleeps."]
+    assert stitch(texts) == "the quick brown fox jumps over the lazy dog sleeps."
+
+
+def test_stitch_tolerates_cut_boundary_word_and_punctuation() -> None:
+    texts = ["Play the scale slowly, then the arpe", "Slowly then the arpeggio twice."]
+    assert stitch(texts) == "Play the scale slowly, then the arpeggio twice."
+
+
+def test_stitch_keeps_text_without_overlap() -> None:
+    assert stitch(["first part", "second part"]) == "first part second part"
+
+
+def test_chunked_transcription_matches_full_text(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(ai_pipeline.settings, "transcribe_overlap_seconds", 2.0)
+    monkeypatch.setattr(ai_pipeline.settings, "transcribe_concurrency", 3)
+    path = tmp_path / "lesson.wav"
+    write_lesson_wav(path)
+    oai = fake_openai(delay=0.05)
+    progress: list[tuple[int, int]] = []
+
+    text = ai_pipeline.transcribe(oai, str(path), chunk_seconds=9.7, on_progress=lambda d, t: progress.append((d, t)))
+
+    assert text == " ".join(WORDS)
+    calls = oai.audio.transcriptions
+    assert len(calls.names) == 8
+    assert 1 < calls.max_active <= 3
+    assert progress[-1] == (8, 8)
+    assert [d for d, _ in progress] == list(range(1, 9))
+
+
+def test_high_byterate_wav_is_cut_under_the_upload_limit(tmp_path, monkeypatch) -> None:
+    """44.1 kHz 16-bit stereo: well under chunk_seconds, but larger than the upload limit."""
+    monkeypatch.setattr(ai_pipeline.settings, "transcribe_max_upload_bytes", 100_000)
+    monkeypatch.setattr(ai_pipeline.settings, "transcribe_overlap_seconds", 0.1)
+    path = tmp_path / "studio.wav"
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(b"\0" * 4 * 44100 * 2)
+    uploads: list[tuple[int, int]] = []
+
+    def create(model: str, file):
+        _, buf = file
+        size = buf.seek(0, 2)
+        buf.seek(0)
+        with wave.open(buf, "rb") as chunk:
+            uploads.append((size, chunk.getnframes()))
+        return SimpleNamespace(text="x")
+
+    oai = SimpleNamespace(audio=SimpleNamespace(transcriptions=SimpleNamespace(create=create)))
+
+    ai_pipeline.transcribe(oai, str(path), chunk_seconds=600)
+
+    assert len(uploads) == 5
+    assert all(size <= 100_000 for size, _ in uploads)
+    overlap = int(0.1 * 44100)
+    assert sum(frames for _, frames in uploads) - overlap * (len(uploads) - 1) == 44100 * 2
+
+
+def test_short_or_non_wav_audio_uploads_once(tmp_path) -> None:
+    path = tmp_path / "lesson.m4a"
+    path.write_bytes(b"not a wav file")
+    oai = SimpleNamespace(
+        audio=SimpleNamespace(transcriptions=SimpleNamespace(create=lambda model, file: SimpleNamespace(text="x")))
+    )
+    assert ai_pipeline.transcribe(oai, str(path), chunk_seconds=1) == "x"
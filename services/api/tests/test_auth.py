@@ -1,47 +1,203 @@
 from __future__ import annotations
 
-from types import SimpleNamespace
+import asyncio
+import json
+import threading
+import time
 
+import httpx
+import jwt
 import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
 
-from app.auth import verify_supabase_token
+from app import auth
+from app.auth import JWKSCache
 from app.errors import AppError
 
+SECRET = "test-jwt-secret-with-enough-bytes-for-hs256"
 
-class FakeResponse:
-    def __init__(self, status_code: int, payload: dict):
-        self.status_code = status_code
-        self._payload = payload
 
-    def json(self) -> dict:
-        return self._payload
+def verify_supabase_token(token: str) -> str:
+    return asyncio.run(auth.verify_supabase_token(token))
+
+
+def fake_auth_server(monkeypatch, status_code: int, payload: dict) -> list[httpx.Request]:
+    """Route remote verification to an in-memory /auth/v1/user endpoint; returns the requests it saw."""
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(status_code, json=payload)
+
+    monkeypatch.setattr(auth, "_http", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return seen
+
+
+@pytest.fixture(autouse=True)
+def _clear_token_cache():
+    auth.token_cache.clear()
+    yield
+    auth.token_cache.clear()
+
+
+def mint(key, alg: str = "HS256", kid: str | None = None, exp_in: int = 3600, **claims) -> str:
+    payload = {
+        "sub": "user-123",
+        "aud": "authenticated",
+        "exp": int(time.time()) + exp_in,
+        **claims,
+    }
+    headers = {"kid": kid} if kid else None
+    return jwt.encode(payload, key, algorithm=alg, headers=headers)
+
+
+def ec_jwk(private_key, kid: str) -> dict:
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({"kid": kid, "alg": "ES256", "use": "sig"})
+    return jwk
 
 
 def test_verify_supabase_token_success(monkeypatch) -> None:
-    def fake_get(_url, headers=None, timeout: int = 0, **_kwargs):
-        assert headers is not None
-        assert timeout == 10
-        return FakeResponse(200, {"id": "user-123"})
+    monkeypatch.setattr(auth.settings, "auth_mode", "remote")
+    seen = fake_auth_server(monkeypatch, 200, {"id": "user-123"})
 
-    monkeypatch.setattr("app.auth.requests.get", fake_get)
     assert verify_supabase_token("token") == "user-123"
+    assert seen[0].url.path == "/auth/v1/user"
+    assert seen[0].headers["Authorization"] == "Bearer token"
 
 
 def test_verify_supabase_token_invalid(monkeypatch) -> None:
-    def fake_get(_url, headers=None, timeout: int = 0, **_kwargs):
-        return FakeResponse(401, {})
-
-    monkeypatch.setattr("app.auth.requests.get", fake_get)
+    monkeypatch.setattr(auth.settings, "auth_mode", "remote")
+    fake_auth_server(monkeypatch, 401, {})
     with pytest.raises(AppError) as exc:
         verify_supabase_token("bad")
     assert exc.value.code == "AUTH_INVALID"
 
 
 def test_verify_supabase_token_missing_user(monkeypatch) -> None:
-    def fake_get(_url, headers=None, timeout: int = 0, **_kwargs):
-        return FakeResponse(200, {})
-
-    monkeypatch.setattr("app.auth.requests.get", fake_get)
+    monkeypatch.setattr(auth.settings, "auth_mode", "remote")
+    fake_auth_server(monkeypatch, 200, {})
     with pytest.raises(AppError) as exc:
         verify_supabase_token("token")
     assert exc.value.code == "AUTH_INVALID"
+
+
+def test_local_hs256_does_not_call_remote(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    seen = fake_auth_server(monkeypatch, 200, {"id": "someone-else"})
+
+    assert verify_supabase_token(mint(SECRET)) == "user-123"
+    assert seen == []
+
+
+def test_local_rejects_expired_token(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    with pytest.raises(AppError) as exc:
+        verify_supabase_token(mint(SECRET, exp_in=-60))
+    assert exc.value.code == "AUTH_INVALID"
+
+
+def test_local_rejects_bad_signature(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    with pytest.raises(AppError) as exc:
+        verify_supabase_token(mint("another-secret-that-is-long-enough-too"))
+    assert exc.value.code == "AUTH_INVALID"
+
+
+def test_local_rejects_wrong_audience(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    with pytest.raises(AppError):
+        verify_supabase_token(mint(SECRET, aud="anon-something"))
+
+
+def test_local_falls_back_to_remote_without_key(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", None)
+    seen = fake_auth_server(monkeypatch, 200, {"id": "user-remote"})
+
+    token = mint(SECRET)
+    assert verify_supabase_token(token) == "user-remote"
+    assert verify_supabase_token(token) == "user-remote"
+    assert len(seen) == 1
+
+
+def test_fallback_disabled_rejects(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", None)
+    monkeypatch.setattr(auth.settings, "auth_remote_fallback", False)
+    with pytest.raises(AppError):
+        verify_supabase_token(mint(SECRET))
+
+
+def test_cache_skips_repeat_verification(monkeypatch) -> None:
+    monkeypatch.setattr(auth.settings, "supabase_jwt_secret", SECRET)
+    token = mint(SECRET)
+    assert verify_supabase_token(token) == "user-123"
+
+    def fail_decode(*_args, **_kwargs):
+        raise AssertionError("cached token should not be decoded again")
+
+    monkeypatch.setattr("app.auth.jwt.decode", fail_decode)
+    assert verify_supabase_token(token) == "user-123"
+
+
+def test_cache_entry_never_outlives_token() -> None:
+    cache = auth.TokenCache(max_entries=10, ttl_seconds=60)
+    cache.put("t", "user-1", token_exp=time.time() - 1)
+    assert cache.get("t") is None
+
+
+def test_cache_is_bounded() -> None:
+    cache = auth.TokenCache(max_entries=2, ttl_seconds=60)
+    for i in range(3):
+        cache.put(f"t{i}", f"user-{i}")
+    assert cache.get("t0") is None
+    assert cache.get("t2") == "user-2"
+
+
+def test_jwks_key_rotation(monkeypatch) -> None:
+    old_key = ec.generate_private_key(ec.SECP256R1())
+    new_key = ec.generate_private_key(ec.SECP256R1())
+    published = {"keys": [ec_jwk(old_key, "k1")]}
+    fetches = []
+
+    def fake_fetch(url: str) -> dict:
+        # Key downloads must never run on the event loop (the main thread under asyncio.run).
+        assert threading.current_thread() is not threading.main_thread()
+        fetches.append(url)
+        return published
+
+    cache = JWKSCache(
+        "http://localhost/jwks", refresh_seconds=0, cooldown_seconds=0, fetch=fake_fetch
+    )
+    monkeypatch.setattr(auth, "jwks_cache", cache)
+    monkeypatch.setattr(auth.settings, "auth_remote_fallback", False)
+
+    assert verify_supabase_token(mint(old_key, alg="ES256", kid="k1")) == "user-123"
+
+    # Supabase rotates: new key is published and the old one retired.
+    published = {"keys": [ec_jwk(new_key, "k2")]}
+    assert verify_supabase_token(mint(new_key, alg="ES256", kid="k2", sub="user-456")) == "user-456"
+    assert len(fetches) == 2
+
+    with pytest.raises(AppError):
+        verify_supabase_token(mint(old_key, alg="ES256", kid="k1", sub="user-789"))
+
+
+def test_jwks_rejects_token_signed_by_other_key(monkeypatch) -> None:
+    published_key = ec.generate_private_key(ec.SECP256R1())
+    attacker_key = ec.generate_private_key(ec.SECP256R1())
+    cache = JWKSCache(
+        "http://localhost/jwks",
+        refresh_seconds=0,
+        fetch=lambda _url: {"keys": [ec_jwk(published_key, "k1")]},
+    )
+    monkeypatch.setattr(auth, "jwks_cache", cache)
+
+    with pytest.raises(AppError) as exc:
+        verify_supabase_token(mint(attacker_key, alg="ES256", kid="k1"))
+    assert exc.value.code == "AUTH_INVALID"
+
+
+def test_rejects_unsigned_token() -> None:
+    token = jwt.encode({"sub": "user-123"}, None, algorithm="none")
+    with pytest.raises(AppError):
+        verify_supabase_token(token)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import contextlib
+import io
+
+import httpx
+from services.api.tests.fakes import FakeClient
+
+from app.errors import AppError
+from app.services import checkpoints, lesson_pipeline
+from app.worker import Worker
+
+EXTRACTION = {"student": "Sam"}
+OUTPUTS = {"student_recap": "recap", "practice_plan": "plan", "parent_email": "email"}
+JOB = {"id": "job-1", "lesson_id": "lesson-1", "attempts": 1}
+
+
+class Stages:
+    """Fake pipeline stages that count calls and can be told to fail once."""
+
+    def __init__(self, monkeypatch) -> None:
+        self.calls: list[str] = []
+        self.generated: list[list[str]] = []
+        self.fail: str | None = None
+        monkeypatch.setattr(lesson_pipeline, "fetch_audio", self.fetch_audio)
+        monkeypatch.setattr(lesson_pipeline, "cached_transcribe", self.transcribe)
+        monkeypatch.setattr(lesson_pipeline, "cached_extract", self.extract)
+        monkeypatch.setattr(lesson_pipeline, "cached_generate", self.generate)
+
+    def _maybe_fail(self, stage: str) -> None:
+        if self.fail == stage:
+            self.fail = None
+            raise RuntimeError(f"{stage} failed")
+
+    def fetch_audio(self, _path):
+        self.calls.append("fetch")
+        return io.BytesIO(b"audio")
+
+    def transcribe(self, _sb, _oai, _audio, on_progress=None, filename=""):
+        self.calls.append("transcribe")
+        self._maybe_fail("transcribe")
+        return "transcript text", "sha"
+
+    def extract(self, _oai, _transcript):
+        self.calls.append("extract")
+        self._maybe_fail("extract")
+        return EXTRACTION
+
+    def generate(self, _oai, _extraction, names=None, on_output=None):
+        self.calls.append("generate")
+        names = names or list(OUTPUTS)
+        self.generated.append(names)
+        # Like ai_pipeline.generate: every passing output is reported before the failure is raised.
+        failed = self.fail if self.fail in names else None
+        for name in names:
+            if name != failed:
+                on_output(name, OUTPUTS[name])
+        if failed:
+            self.fail = None
+            raise AppError(code="GENERATION_FAILED", message=f"{failed}: too short")
+        return {name: OUTPUTS[name] for name in names}
+
+
+class CheckpointStore(dict):
+    """Store whose pipeline_checkpoints table keeps what the pipeline upserts across attempts."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            {"lessons": [{"id": "lesson-1", "owner_id": "user-1", "audio_path": "a/b.wav"}]}
+        )
+        self.checkpoints: dict[str, dict] = {}
+        self["pipeline_checkpoints"] = lambda _filters: list(self.checkpoints.values())
+
+    def attempt(self, stages: Stages) -> FakeClient:
+        stages.calls.clear()
+        sb = FakeClient(self)
+        with contextlib.suppress(AppError, RuntimeError, httpx.HTTPError):
+            lesson_pipeline.process_job(sb, object(), JOB)
+        for row in sb.upserts("pipeline_checkpoints"):
+            self.checkpoints[row["stage"]] = row
+        return sb
+
+
+def test_failed_extraction_resumes_without_transcribing_again(monkeypatch) -> None:
+    stages, store = Stages(monkeypatch), CheckpointStore()
+    stages.fail = "extract"
+
+    store.attempt(stages)
+    assert stages.calls == ["fetch", "transcribe", "extract"]
+    assert set(store.checkpoints) == {"transcript"}
+
+    sb = store.attempt(stages)
+    assert stages.calls == ["extract", "generate"]
+    (done,) = sb.rpcs("complete_lesson")
+    assert done["p_transcript"] == "transcript text"
+    assert done["p_audio_sha256"] == "sha"
+
+
+def test_failed_output_regenerates_only_that_output(monkeypatch) -> None:
+    stages, store = Stages(monkeypatch), CheckpointStore()
+    stages.fail = "parent_email"
+
+    store.attempt(stages)
+    assert set(store.checkpoints) == {
+        "transcript",
+        "extraction",
+        "output:student_recap",
+        "output:practice_plan",
+    }
+
+    sb = store.attempt(stages)
+    assert stages.calls == ["generate"]
+    assert stages.generated[-1] == ["parent_email"]
+    assert sb.rpcs("complete_lesson")[0]["p_outputs"] == OUTPUTS
+
+
+def test_failed_save_repeats_no_stage(monkeypatch) -> None:
+    stages, store = Stages(monkeypatch), CheckpointStore()
+
+    def lost_connection(_params):
+        raise httpx.ConnectError("connection reset")
+
+    store["rpc:complete_lesson"] = lost_connection
+    store.attempt(stages)
+    assert stages.calls == ["fetch", "transcribe", "extract", "generate"]
+
+    store["rpc:complete_lesson"] = None
+    sb = store.attempt(stages)
+    assert stages.calls == []
+    assert sb.rpcs("complete_lesson")[0]["p_extraction"] == EXTRACTION
+
+
+def test_checkpoint_with_changed_inputs_is_recomputed(monkeypatch) -> None:
+    stages, store = Stages(monkeypatch), CheckpointStore()
+    stages.fail = "student_recap"
+    store.attempt(stages)
+
+    # A new model invalidates the extraction and output checkpoints but not the transcript.
+    monkeypatch.setattr(checkpoints.settings, "openai_llm_model", "another-model")
+    store.attempt(stages)
+
+    assert stages.calls == ["extract", "generate"]
+    assert stages.generated[-1] == list(OUTPUTS)
+
+
+def test_worker_retry_resumes_from_checkpoint(monkeypatch) -> None:
+    stages, store = Stages(monkeypatch), CheckpointStore()
+    stages.fail = "practice_plan"
+    store["rpc:claim_job"] = lambda _params: [dict(JOB)]
+
+    first = FakeClient(store)
+    Worker(first, object(), "w1").run_once()
+    assert first.rpcs("fail_lesson")[0]["p_message"] == "practice_plan: too short"
+    for row in first.upserts("pipeline_checkpoints"):
+        store.checkpoints[row["stage"]] = row
+
+    stages.calls.clear()
+    second = FakeClient(store)
+    Worker(second, object(), "w1").run_once()
+    assert stages.calls == ["generate"]
+    assert stages.generated[-1] == ["practice_plan"]
+    assert second.rpcs("complete_lesson")
+
+
+def test_checkpoint_write_failure_does_not_fail_the_stage() -> None:
+    sb = FakeClient({"pipeline_checkpoints": []})
+    cp = checkpoints.Checkpoints(sb, "lesson-1")
+
+    def unavailable(_name):
+        raise httpx.ConnectError("database unavailable")
+
+    sb.table = unavailable
+    cp.put("transcript", "h", {"transcript": "t", "audio_sha256": "s"})
+
+    assert cp.get("transcript", "h") == {"transcript": "t", "audio_sha256": "s"}
+    assert cp.get("transcript", "other") is None
@@ -1,15 +1,51 @@
 from __future__ import annotations
 
+from fastapi.testclient import TestClient
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app import db
 from app.db import supabase_service
+from app.main import app
+from app.routes import students as students_routes
 
 
 def test_supabase_service_uses_client(monkeypatch) -> None:
     sentinel = object()
 
-    def fake_create_client(url: str, key: str):
+    def fake_create_client(url: str, key: str, options=None):
         assert url
         assert key
+        assert options is not None and options.httpx_client is not None
         return sentinel
 
+    db.close_supabase()
     monkeypatch.setattr("app.db.create_client", fake_create_client)
-    assert supabase_service() is sentinel
+    try:
+        assert supabase_service() is sentinel
+        assert supabase_service() is sentinel
+    finally:
+        db.close_supabase()
+
+
+def test_single_client_reused_across_requests(monkeypatch) -> None:
+    created = []
+
+    async def fake_acreate_client(url: str, key: str, options=None):
+        assert options is not None and options.httpx_client is not None
+        client = FakeAsyncClient({"students": [{"id": "s1", "owner_id": "user-1", "name": "Sam"}]})
+        created.append(client)
+        return client
+
+    monkeypatch.setattr("app.db.acreate_client", fake_acreate_client)
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+
+    with TestClient(app) as client:
+        for _ in range(5):
+            resp = client.get("/v1/students", headers={"Authorization": "Bearer t"})
+            assert resp.status_code == 200
+        assert len(created) == 1
+        pool = db._async_http
+        assert pool is not None and not pool.is_closed
+
+    assert pool.is_closed
+    assert db._async_client is None
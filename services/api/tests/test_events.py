@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+
+import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.errors import AppError
+from app.routes import lessons as lessons_routes
+from app.services import events
+
+
+class ConnectedRequest:
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+def state(status: str, step: str, progress: int) -> dict:
+    return {
+        "lessonId": "lesson-1",
+        "status": status,
+        "step": step,
+        "progress": progress,
+        "lastError": None,
+    }
+
+
+def frames(chunks: list[str]) -> list[dict]:
+    return [json.loads(c.split("data: ", 1)[1]) for c in chunks if c.startswith("id: ")]
+
+
+async def collect(stream, limit: int = 50) -> list[str]:
+    out: list[str] = []
+    async for chunk in stream:
+        out.append(chunk)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def test_stream_pushes_published_changes_from_worker_thread() -> None:
+    async def run() -> list[str]:
+        polls = 0
+
+        async def poll() -> dict:
+            nonlocal polls
+            polls += 1
+            return state("QUEUED", "QUEUED", 0)
+
+        def worker() -> None:
+            for step, progress in (("TRANSCRIBING", 10), ("EXTRACTING", 50), ("GENERATING", 70)):
+                events.bus.publish("lesson-1", {"status": step, "step": step, "progress": progress})
+            events.bus.publish("lesson-1", {"progress": 85})
+            events.bus.publish("lesson-1", {"status": "READY", "step": "DONE", "progress": 100})
+
+        threading.Timer(0.05, worker).start()
+        stream = events.stream_lesson("lesson-1", poll, poll_seconds=30)
+        chunks = await collect(stream)
+        assert polls == 1  # the initial read only
+        return chunks
+
+    chunks = asyncio.run(run())
+
+    assert chunks[0] == "retry: 3000\n\n"
+    got = frames(chunks)
+    assert [(f["status"], f["progress"]) for f in got] == [
+        ("QUEUED", 0),
+        ("TRANSCRIBING", 10),
+        ("EXTRACTING", 50),
+        ("GENERATING", 70),
+        ("GENERATING", 85),
+        ("READY", 100),
+    ]
+    assert events.bus.subscriber_count("lesson-1") == 0
+
+
+def test_stream_falls_back_to_polling_and_sends_heartbeats() -> None:
+    states = [state("QUEUED", "QUEUED", 0)] + [state("TRANSCRIBING", "TRANSCRIBING", 10)] * 4
+    states.append(state("READY", "DONE", 100))
+
+    async def run() -> list[str]:
+        async def poll() -> dict:
+            return states.pop(0)
+
+        stream = events.stream_lesson("lesson-1", poll, heartbeat_seconds=0.03, poll_seconds=0.02)
+        return await collect(stream)
+
+    chunks = asyncio.run(run())
+
+    assert [f["status"] for f in frames(chunks)] == ["QUEUED", "TRANSCRIBING", "READY"]
+    assert ": keepalive\n\n" in chunks
+
+
+def test_reconnect_skips_state_already_seen() -> None:
+    current = state("EXTRACTING", "EXTRACTING", 50)
+
+    async def run() -> list[str]:
+        asyncio.get_running_loop().call_later(
+            0.02,
+            events.bus.publish,
+            "lesson-1",
+            {"status": "READY", "step": "DONE", "progress": 100},
+        )
+
+        async def poll() -> dict:
+            return current
+
+        stream = events.stream_lesson(
+            "lesson-1", poll, last_event_id=events.event_id(current), poll_seconds=30
+        )
+        return await collect(stream)
+
+    chunks = asyncio.run(run())
+
+    assert [f["status"] for f in frames(chunks)] == ["READY"]
+    assert "id: READY.DONE.100\n" in chunks[-1]
+
+
+def test_events_route_streams_lesson(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    store = {
+        "lesson_status_v": [
+            {"status": "READY", "step": "DONE", "progress": 100, "last_error": None}
+        ],
+    }
+    sb = FakeAsyncClient(store)
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+
+    async def run() -> tuple[str, list[str]]:
+        resp = await lessons_routes.lesson_events(
+            "lesson-1", ConnectedRequest(), authorization=None, last_event_id=None, access_token="t"
+        )
+        return resp.media_type, await collect(resp.body_iterator)
+
+    media_type, chunks = asyncio.run(run())
+
+    assert media_type == "text/event-stream"
+    assert frames(chunks) == [state("READY", "DONE", 100)]
+    assert [(name, columns) for name, _, columns, _ in sb.calls] == [
+        ("lesson_status_v", "status, step, progress, last_error, job_updated_at")
+    ] * 2
+
+
+def test_events_route_rejects_unknown_lesson(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(
+        lessons_routes, "supabase_async", returns(FakeAsyncClient({"lesson_status_v": []}))
+    )
+
+    async def run() -> None:
+        await lessons_routes.lesson_events(
+            "lesson-1",
+            ConnectedRequest(),
+            authorization="Bearer t",
+            last_event_id=None,
+            access_token=None,
+        )
+
+    with pytest.raises(AppError) as exc:
+        asyncio.run(run())
+    assert exc.value.code == "NOT_FOUND"
+    assert events.bus.subscriber_count("lesson-1") == 0
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.errors import AppError
+from app.routes import lessons as lessons_routes
+
+EXTRACTION = {
+    "student": "Sam",
+    "instrument": "Piano",
+    "highlights": ["Even scales"],
+    "focus_areas": ["Left hand rhythm"],
+    "assignments": [{"task": "C major scale", "target": "80 bpm", "confidence": 0.8}],
+    "evidence": [{"claim": "Even scales", "quote": "Those scales were really even"}],
+}
+# Prompt marker -> generated text, long enough for each output's schema.
+TEXTS = {
+    "student recap": "R" * 60,
+    "practice plan": "P" * 120,
+    "parent email": "E" * 60,
+}
+OUTPUT_NAMES = {
+    "student recap": "student_recap",
+    "practice plan": "practice_plan",
+    "parent email": "parent_email",
+}
+
+
+class CountingCompletions:
+    """AsyncOpenAI chat.completions stand-in that records which output each call generated."""
+
+    def __init__(self, fail: str | None = None, error: Exception | None = None) -> None:
+        self.fail = fail
+        self.error = error
+        self.generated: list[str] = []
+
+    async def create(self, *, model: str, messages: list[dict]):
+        marker = next(k for k in TEXTS if k in messages[0]["content"])
+        self.generated.append(OUTPUT_NAMES[marker])
+        if self.error is not None and OUTPUT_NAMES[marker] == self.fail:
+            raise self.error
+        text = "too short" if OUTPUT_NAMES[marker] == self.fail else TEXTS[marker]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def setup(
+    monkeypatch, fail: str | None = None, error: Exception | None = None
+) -> tuple[FakeAsyncClient, CountingCompletions]:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    store = {
+        "lessons": [{"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}],
+        "rpc:apply_extraction_edit": lambda p: [
+            {"type": kind, "content": text, "edited_content": None}
+            for kind, text in p["p_outputs"].items()
+        ],
+    }
+    sb = FakeAsyncClient(store)
+    completions = CountingCompletions(fail, error)
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+    monkeypatch.setattr(
+        lessons_routes,
+        "openai_client",
+        lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)),
+    )
+    return sb, completions
+
+
+def edit(patch: dict) -> dict:
+    return asyncio.run(
+        lessons_routes.edit_extraction("lesson-1", {"extraction": patch}, "Bearer t")
+    )
+
+
+def test_highlight_edit_regenerates_recap_and_email_only(monkeypatch) -> None:
+    sb, completions = setup(monkeypatch)
+
+    resp = edit({"highlights": ["Even scales", "Steady tempo"]})
+
+    assert sorted(completions.generated) == ["parent_email", "student_recap"]
+    assert resp["data"]["regenerated"] == ["student_recap", "parent_email"]
+    saved = sb.rpcs("apply_extraction_edit")[0]
+    assert set(saved["p_outputs"]) == {"student_recap", "parent_email"}
+    assert saved["p_extraction"]["highlights"] == ["Even scales", "Steady tempo"]
+    assert saved["p_extraction"]["assignments"] == EXTRACTION["assignments"]
+    # The practice plan, and edited_content everywhere, are not part of the write.
+    assert [row["type"] for row in resp["data"]["outputs"]] == ["student_recap", "parent_email"]
+
+
+def test_assignment_edit_regenerates_all_three(monkeypatch) -> None:
+    _, completions = setup(monkeypatch)
+
+    edit({"assignments": [{"task": "G major scale", "target": "70 bpm", "confidence": 0.9}]})
+
+    assert len(completions.generated) == 3
+
+
+def test_evidence_edit_saves_without_llm_calls(monkeypatch) -> None:
+    sb, completions = setup(monkeypatch)
+
+    resp = edit({"evidence": []})
+
+    assert completions.generated == []
+    assert resp["data"]["regenerated"] == []
+    assert sb.rpcs("apply_extraction_edit")[0]["p_outputs"] == {}
+
+
+def test_unchanged_patch_writes_nothing(monkeypatch) -> None:
+    sb, completions = setup(monkeypatch)
+
+    resp = edit({"student": "Sam"})
+
+    assert completions.generated == []
+    assert sb.rpcs("apply_extraction_edit") == []
+    assert resp["data"]["outputs"] == []
+
+
+def test_invalid_patch_is_rejected_before_any_call(monkeypatch) -> None:
+    sb, completions = setup(monkeypatch)
+
+    for patch in ({"highlights": []}, {"tempo": "fast"}):
+        with pytest.raises(AppError) as exc:
+            edit(patch)
+        assert exc.value.code == "VALIDATION"
+    with pytest.raises(AppError):
+        asyncio.run(lessons_routes.edit_extraction("lesson-1", {}, "Bearer t"))
+
+    assert completions.generated == []
+    assert sb.rpcs("apply_extraction_edit") == []
+
+
+def test_failed_regeneration_saves_nothing(monkeypatch) -> None:
+    sb, completions = setup(monkeypatch, fail="parent_email")
+
+    with pytest.raises(AppError) as exc:
+        edit({"student": "Samuel"})
+
+    assert exc.value.code == "GENERATION_FAILED"
+    assert exc.value.message.startswith("parent_email: ")
+    assert len(completions.generated) == 2
+    assert sb.rpcs("apply_extraction_edit") == []
+
+
+def test_api_error_fails_regeneration(monkeypatch) -> None:
+    sb, _ = setup(monkeypatch, fail="parent_email", error=httpx.ConnectError("connection reset"))
+
+    with pytest.raises(AppError) as exc:
+        edit({"student": "Samuel"})
+
+    assert exc.value.code == "GENERATION_FAILED"
+    assert exc.value.message == "parent_email: connection reset"
+    assert sb.rpcs("apply_extraction_edit") == []
+
+
+def test_unexpected_error_propagates(monkeypatch) -> None:
+    # Only API and validation errors are per-output failures; a bug is not a 400.
+    sb, _ = setup(monkeypatch, fail="parent_email", error=KeyError("choices"))
+
+    with pytest.raises(KeyError):
+        edit({"student": "Samuel"})
+    assert sb.rpcs("apply_extraction_edit") == []
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+
+import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.routes import lessons as lessons_routes
+
+JOB_MINUTES = 10
+WORKERS = 4
+LANES = ("interactive", "bulk")
+# Seed of public.plan_weights (migration 015). Unknown plans weigh 1.
+PLAN_WEIGHTS = {"SOLO": 1.0, "STUDIO": 2.0}
+
+
+@dataclass(order=True)
+class QueuedJob:
+    vstart: float
+    seq: int
+    job_id: str = field(compare=False)
+    owner_id: str = field(compare=False)
+    lane: str = field(compare=False)
+
+
+class FairQueue:
+    """
+    Model of the scheduling rules in migration 015, for simulating wait times: start-time
+    fair queueing across owners, weighted by plan, with interactive jobs always claimed before
+    bulk ones. push() tags a job like the jobs_assign_vstart trigger and pop() claims like
+    claim_job. It is a model, not the SQL; test_query_plans.py runs claim_job itself.
+    """
+
+    def __init__(self, weights: Mapping[str, float] = PLAN_WEIGHTS) -> None:
+        self.weights = weights
+        self.clock = {lane: 0.0 for lane in LANES}
+        self.finish: dict[tuple[str, str], float] = {}
+        self._heaps: dict[str, list[QueuedJob]] = {lane: [] for lane in LANES}
+        self._seq = itertools.count()
+
+    def push(self, job_id: str, owner_id: str, plan: str, lane: str = "interactive") -> float:
+        if lane not in LANES:
+            raise ValueError(f"unknown lane {lane!r}")
+        cost = 1 / self.weights.get(plan, 1.0)
+        vstart = max(self.clock[lane], self.finish.get((owner_id, lane), 0.0))
+        self.finish[(owner_id, lane)] = vstart + cost
+        heapq.heappush(
+            self._heaps[lane], QueuedJob(vstart, next(self._seq), job_id, owner_id, lane)
+        )
+        return vstart
+
+    def pop(self) -> QueuedJob | None:
+        for lane in LANES:
+            if self._heaps[lane]:
+                job = heapq.heappop(self._heaps[lane])
+                self.clock[lane] = max(self.clock[lane], job.vstart)
+                return job
+        return None
+
+
+class FifoQueue:
+    """The previous claim order (run_after, created_at), for comparison."""
+
+    def __init__(self) -> None:
+        self.jobs: deque[QueuedJob] = deque()
+
+    def push(self, job_id: str, owner_id: str, plan: str, lane: str = "interactive") -> None:
+        self.jobs.append(QueuedJob(0.0, len(self.jobs), job_id, owner_id, lane))
+
+    def pop(self) -> QueuedJob | None:
+        return self.jobs.popleft() if self.jobs else None
+
+
+def simulate(queue, arrivals: list[tuple], workers: int = WORKERS) -> dict[str, int]:
+    """
+    Minute-by-minute worker pool: arrivals are (minute, job_id, owner, plan, lane); every job
+    takes JOB_MINUTES. Returns each job's wait in minutes between upload and claim.
+    """
+    pending = sorted(arrivals)
+    arrived = {job_id: minute for minute, job_id, *_ in pending}
+    busy_until = [0] * workers
+    waits: dict[str, int] = {}
+    minute = 0
+    while len(waits) < len(arrived):
+        while pending and pending[0][0] <= minute:
+            _, job_id, owner, plan, lane = pending.pop(0)
+            queue.push(job_id, owner, plan, lane)
+        for worker, free_at in enumerate(busy_until):
+            if free_at <= minute:
+                job = queue.pop()
+                if job is None:
+                    break
+                waits[job.job_id] = minute - arrived[job.job_id]
+                busy_until[worker] = minute + JOB_MINUTES
+        minute += 1
+    return waits
+
+
+def week_of_uploads(lane: str = "interactive") -> list[tuple]:
+    """One teacher uploads 40 lessons at once; five others upload one each while it runs."""
+    heavy = [(0, f"heavy-{n}", "heavy", "SOLO", lane) for n in range(40)]
+    small = [(5 + 10 * n, f"small-{n}", f"teacher-{n}", "SOLO", "interactive") for n in range(5)]
+    return heavy + small
+
+
+def small_waits(waits: dict[str, int]) -> list[int]:
+    return [wait for job_id, wait in waits.items() if job_id.startswith("small-")]
+
+
+def test_small_teachers_wait_bounded_under_a_bulk_upload() -> None:
+    fifo = small_waits(simulate(FifoQueue(), week_of_uploads()))
+    fair_waits = simulate(FairQueue(), week_of_uploads())
+    fair = small_waits(fair_waits)
+
+    # First come first served: the first small lesson sits behind the whole backlog.
+    assert max(fifo) >= 90
+    # Fair queueing: a small teacher waits at most for a worker to free up.
+    assert max(fair) <= JOB_MINUTES
+    # The heavy teacher still gets every lesson done, in about the same total time.
+    heavy = [w for job_id, w in fair_waits.items() if job_id.startswith("heavy-")]
+    assert len(heavy) == 40
+    assert max(heavy) <= 40 // WORKERS * JOB_MINUTES + 2 * JOB_MINUTES
+
+
+def test_bounded_wait_holds_with_many_small_teachers() -> None:
+    arrivals = [(0, f"heavy-{n}", "heavy", "SOLO", "interactive") for n in range(200)]
+    arrivals += [
+        (minute, f"small-{minute}", f"teacher-{minute % 12}", "SOLO", "interactive")
+        for minute in range(1, 300, 7)
+    ]
+
+    waits = small_waits(simulate(FairQueue(), arrivals))
+
+    # At most one job per other active teacher runs first: 13 teachers on 4 workers.
+    assert max(waits) <= 4 * JOB_MINUTES
+
+
+def test_plan_weight_sets_share_of_a_contended_pool() -> None:
+    queue = FairQueue()
+    for n in range(30):
+        queue.push(f"solo-{n}", "solo", "SOLO")
+        queue.push(f"studio-{n}", "studio", "STUDIO")
+
+    first = [queue.pop().owner_id for _ in range(30)]
+
+    assert first.count("studio") == 20
+    assert first.count("solo") == 10
+
+
+def test_bulk_lane_yields_to_interactive_jobs() -> None:
+    waits = simulate(FairQueue(), week_of_uploads(lane="bulk"))
+
+    assert max(small_waits(waits)) <= JOB_MINUTES
+    # Backfill still drains when nothing interactive is waiting.
+    assert len([job_id for job_id in waits if job_id.startswith("heavy-")]) == 40
+
+    queue = FairQueue()
+    queue.push("backfill", "heavy", "SOLO", lane="bulk")
+    queue.push("new", "heavy", "SOLO")
+    assert [queue.pop().job_id, queue.pop().job_id] == ["new", "backfill"]
+    with pytest.raises(ValueError):
+        queue.push("x", "heavy", "SOLO", lane="urgent")
+
+
+def test_returning_teacher_does_not_jump_ahead_with_old_credit() -> None:
+    queue = FairQueue()
+    queue.push("early", "a", "SOLO")
+    queue.pop()
+    for n in range(10):
+        queue.push(f"b-{n}", "b", "SOLO")
+    for _ in range(5):
+        queue.pop()
+
+    # "a" was idle; it starts at the current clock, not at its old finish tag of 1.
+    assert queue.push("late", "a", "SOLO") == queue.clock["interactive"]
+    assert queue.pop().job_id == "late"
+
+
+def test_create_lesson_sets_the_lane(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient({})
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+
+    req = lessons_routes.CreateLessonRequest(
+        studentId="student-1", audioStoragePath="path.wav", lane="bulk"
+    )
+    asyncio.run(lessons_routes.create_lesson(req, "Bearer t"))
+    assert sb.rpcs("create_lesson")[0]["p_lane"] == "bulk"
+
+    default = lessons_routes.CreateLessonRequest(studentId="student-1", audioStoragePath="p.wav")
+    assert default.lane == "interactive"
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app import idempotency
+from app.errors import AppError
+from app.idempotency import idempotent
+from app.routes import lessons as lessons_routes
+from app.routes import outputs as outputs_routes
+
+OUTPUT_ID = "00000000-0000-0000-0000-000000000001"
+
+
+class IdempotencyKeys:
+    """public.idempotency_keys with the claim/complete semantics of migration 013."""
+
+    def __init__(self) -> None:
+        self.rows: dict[tuple[str, str], dict] = {}
+
+    def claim(self, p: dict) -> dict:
+        row = self.rows.get((p["p_owner"], p["p_key"]))
+        if row is None:
+            self.rows[(p["p_owner"], p["p_key"])] = {
+                "scope": p["p_scope"],
+                "request_hash": p["p_request_hash"],
+                "status": "pending",
+                "response": None,
+            }
+            return {"claimed": True}
+        return {"claimed": False, **row}
+
+    def complete(self, p: dict) -> None:
+        self.rows[(p["p_owner"], p["p_key"])].update(status="done", response=p["p_response"])
+
+    def store(self) -> dict:
+        return {
+            "rpc:idempotency_claim": self.claim,
+            "rpc:idempotency_complete": self.complete,
+            "rpc:create_lesson": "lesson-1",
+        }
+
+
+@pytest.fixture
+def keys(monkeypatch) -> IdempotencyKeys:
+    monkeypatch.setattr(idempotency.settings, "idempotency_poll_seconds", 0.001)
+    return IdempotencyKeys()
+
+
+def lesson_request(title: str = "Lesson") -> lessons_routes.CreateLessonRequest:
+    return lessons_routes.CreateLessonRequest(
+        studentId="student-1", title=title, audioStoragePath="path.wav"
+    )
+
+
+def test_concurrent_duplicate_lesson_submissions_create_one_lesson(monkeypatch, keys) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    # Latency on every table call lets the duplicates interleave with the first request.
+    sb = FakeAsyncClient(keys.store(), latency=0.01)
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+
+    async def submit_five():
+        return await asyncio.gather(
+            *(lessons_routes.create_lesson(lesson_request(), "Bearer t", "tap-1") for _ in range(5))
+        )
+
+    responses = asyncio.run(submit_five())
+
+    assert len(sb.rpcs("create_lesson")) == 1
+    assert all(
+        r == {"success": True, "data": {"lessonId": "lesson-1", "status": "QUEUED"}}
+        for r in responses
+    )
+    assert len(sb.rpcs("idempotency_complete")) == 1
+
+
+def test_replay_returns_stored_response_and_new_key_runs_again(monkeypatch, keys) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient(keys.store())
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+
+    first = asyncio.run(lessons_routes.create_lesson(lesson_request(), "Bearer t", "k1"))
+    replay = asyncio.run(lessons_routes.create_lesson(lesson_request(), "Bearer t", "k1"))
+    assert replay == first
+    assert len(sb.rpcs("create_lesson")) == 1
+
+    asyncio.run(lessons_routes.create_lesson(lesson_request(), "Bearer t", "k2"))
+    asyncio.run(lessons_routes.create_lesson(lesson_request(), "Bearer t"))
+    assert len(sb.rpcs("create_lesson")) == 3
+
+
+def test_key_reused_for_a_different_request_is_rejected(monkeypatch, keys) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient(keys.store())
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+
+    asyncio.run(lessons_routes.create_lesson(lesson_request("Scales"), "Bearer t", "k1"))
+    with pytest.raises(AppError) as err:
+        asyncio.run(lessons_routes.create_lesson(lesson_request("Chords"), "Bearer t", "k1"))
+    assert err.value.code == "IDEMPOTENCY_MISMATCH"
+    assert len(sb.rpcs("create_lesson")) == 1
+
+
+def test_failed_request_releases_the_key(keys) -> None:
+    sb = FakeAsyncClient(keys.store())
+
+    async def fail() -> dict:
+        raise AppError(code="VALIDATION", message="Student not found")
+
+    with pytest.raises(AppError):
+        asyncio.run(idempotent(sb, "user-1", "k1", "POST /v1/lessons", {}, fail))
+
+    deletes = [filters for name, op, _, filters in sb.calls if op == "delete"]
+    assert deletes == [(("eq", "owner_id", "user-1"), ("eq", "key", "k1"))]
+    assert sb.rpcs("idempotency_complete") == []
+
+
+def test_key_length_is_validated(keys) -> None:
+    sb = FakeAsyncClient(keys.store())
+    with pytest.raises(AppError) as err:
+        asyncio.run(idempotent(sb, "user-1", "x" * 256, "scope", {}, returns({})))
+    assert err.value.code == "VALIDATION"
+
+
+def test_batch_retry_with_key_writes_once(monkeypatch, keys) -> None:
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    store = keys.store()
+    store["rpc:update_outputs_batch"] = [{"id": OUTPUT_ID, "edited_content": "x"}]
+    sb = FakeAsyncClient(store)
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(sb))
+    payload = {"outputs": [{"id": OUTPUT_ID, "editedContent": "x"}]}
+
+    async def submit_twice():
+        return await asyncio.gather(
+            outputs_routes.update_outputs_batch(payload, "Bearer t", "edit-1"),
+            outputs_routes.update_outputs_batch(payload, "Bearer t", "edit-1"),
+        )
+
+    first, second = asyncio.run(submit_twice())
+
+    assert first == second
+    assert first["data"]["succeeded"] == 1
+    assert len(sb.rpcs("update_outputs_batch")) == 1
@@ -1,52 +1,128 @@
 from __future__ import annotations
 
+import asyncio
+
+import pytest
+from fastapi import Response
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.errors import AppError
 from app.routes import lessons as lessons_routes
-from services.api.tests.fakes import FakeClient
 
 
-def test_create_lesson_not_implemented(monkeypatch) -> None:
-    monkeypatch.setattr(lessons_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(lessons_routes, "supabase_service", lambda: FakeClient({}))
-    monkeypatch.setattr(lessons_routes, "openai_client", lambda: object())
+def test_create_lesson_enqueues_job(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient({"rpc:create_lesson": "lesson-1"})
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
 
     req = lessons_routes.CreateLessonRequest(
         studentId="student-1",
         title="Lesson",
         audioStoragePath="path.wav",
     )
-    resp = lessons_routes.create_lesson(req, "Bearer t")
-    assert resp["success"] is False
-    assert resp["error"]["code"] == "NOT_IMPLEMENTED"
-
+    resp = asyncio.run(lessons_routes.create_lesson(req, "Bearer t"))
+    assert resp["success"] is True
+    assert resp["data"] == {"lessonId": "lesson-1", "status": "QUEUED"}
 
-def test_create_lesson_handles_exception(monkeypatch) -> None:
-    monkeypatch.setattr(lessons_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(lessons_routes, "supabase_service", lambda: FakeClient({}))
+    # Lesson and job are created together by one RPC, never by two separate inserts.
+    assert sb.rpcs("create_lesson") == [
+        {
+            "p_owner": "user-1",
+            "p_student_id": "student-1",
+            "p_title": "Lesson",
+            "p_audio_path": "path.wav",
+            "p_lane": "interactive",
+        }
+    ]
+    assert sb.inserts("lessons") == sb.inserts("jobs") == []
 
-    def boom():
-        raise RuntimeError("boom")
 
-    monkeypatch.setattr(lessons_routes, "openai_client", boom)
+def test_create_lesson_does_not_run_pipeline(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient({})
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
 
     req = lessons_routes.CreateLessonRequest(
         studentId="student-1",
         title=None,
         audioStoragePath="path.wav",
     )
-    resp = lessons_routes.create_lesson(req, "Bearer t")
-    assert resp["success"] is False
-    assert resp["error"]["code"] == "UNKNOWN"
+    asyncio.run(lessons_routes.create_lesson(req, "Bearer t"))
+    assert [name for name, *_ in sb.calls] == ["create_lesson"]
+    assert sb.updates("lessons") == []
 
 
-def test_lesson_status(monkeypatch) -> None:
-    monkeypatch.setattr(lessons_routes, "verify_supabase_token", lambda _token: "user-1")
-    store = {
-        "lessons": [{"id": "lesson-1", "owner_id": "user-1", "status": "READY"}],
-        "jobs": [{"lesson_id": "lesson-1", "owner_id": "user-1", "step": "DONE", "progress": 100}],
+def status_store(updated_at: str = "2026-01-01T00:00:00+00:00", status: str = "READY") -> dict:
+    return {
+        "lesson_status_v": [
+            {
+                "status": status,
+                "step": "DONE" if status == "READY" else "GENERATING",
+                "progress": 100 if status == "READY" else 70,
+                "last_error": None,
+                "job_updated_at": updated_at,
+            }
+        ]
     }
-    monkeypatch.setattr(lessons_routes, "supabase_service", lambda: FakeClient(store))
 
-    resp = lessons_routes.lesson_status("lesson-1", "Bearer t")
+
+def get_status(monkeypatch, store: dict, if_none_match: str | None = None):
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient(store)
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(sb))
+    response = Response()
+    result = asyncio.run(
+        lessons_routes.lesson_status("lesson-1", response, "Bearer t", if_none_match)
+    )
+    return result, response, sb
+
+
+def test_lesson_status(monkeypatch) -> None:
+    resp, response, sb = get_status(monkeypatch, status_store())
+
     assert resp["success"] is True
-    assert resp["data"]["status"] == "READY"
-    assert resp["data"]["step"] == "DONE"
+    assert resp["data"] == {
+        "lessonId": "lesson-1",
+        "status": "READY",
+        "step": "DONE",
+        "progress": 100,
+        "lastError": None,
+    }
+    assert response.headers["ETag"].startswith('"')
+    assert [(name, columns) for name, _, columns, _ in sb.calls] == [
+        ("lesson_status_v", "status, step, progress, last_error, job_updated_at")
+    ]
+
+
+def test_lesson_status_not_modified(monkeypatch) -> None:
+    _, first, _ = get_status(monkeypatch, status_store())
+    etag = first.headers["ETag"]
+
+    resp, _, _ = get_status(monkeypatch, status_store(), if_none_match=etag)
+    assert isinstance(resp, Response)
+    assert resp.status_code == 304
+    assert resp.body == b""
+    assert resp.headers["ETag"] == etag
+
+    weak, _, _ = get_status(monkeypatch, status_store(), if_none_match=f'"other", W/{etag}')
+    assert weak.status_code == 304
+
+
+def test_lesson_status_changes_etag_when_job_moves(monkeypatch) -> None:
+    _, first, _ = get_status(monkeypatch, status_store(status="GENERATING"))
+    etag = first.headers["ETag"]
+
+    later = status_store(updated_at="2026-01-01T00:00:05+00:00", status="GENERATING")
+    resp, second, _ = get_status(monkeypatch, later, if_none_match=etag)
+    assert resp["data"]["progress"] == 70
+    assert second.headers["ETag"] != etag
+
+    done = status_store(updated_at="2026-01-01T00:00:05+00:00")
+    _, third, _ = get_status(monkeypatch, done)
+    assert third.headers["ETag"] != second.headers["ETag"]
+
+
+def test_lesson_status_unknown_lesson(monkeypatch) -> None:
+    with pytest.raises(AppError) as exc:
+        get_status(monkeypatch, {"lesson_status_v": []})
+    assert exc.value.code == "NOT_FOUND"
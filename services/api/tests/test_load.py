@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import anyio.to_thread
+import httpx
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.main import app
+from app.routes import students as students_routes
+
+DB_LATENCY = 0.2
+
+
+def test_concurrency_beyond_threadpool_without_latency_collapse(monkeypatch) -> None:
+    """
+    Five times more concurrent requests than the default threadpool has threads, each waiting
+    DB_LATENCY on the database. Sync routes would queue for threads and need about
+    5 * DB_LATENCY; async routes all wait at once and finish in about one DB_LATENCY.
+    """
+    store = {"students": [{"id": "s1", "owner_id": "user-1", "name": "Sam"}]}
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(
+        students_routes, "supabase_async", returns(FakeAsyncClient(store, latency=DB_LATENCY))
+    )
+
+    async def run() -> tuple[int, float, list[float]]:
+        threads = int(anyio.to_thread.current_default_thread_limiter().total_tokens)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+
+            async def one() -> float:
+                started = time.perf_counter()
+                resp = await client.get("/v1/students", headers={"Authorization": "Bearer t"})
+                assert resp.status_code == 200
+                return time.perf_counter() - started
+
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(one() for _ in range(threads * 5)))
+            return threads, time.perf_counter() - started, sorted(latencies)
+
+    threads, elapsed, latencies = asyncio.run(run())
+
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    assert len(latencies) == threads * 5
+    assert elapsed < 2.5 * DB_LATENCY
+    assert p95 < 2.5 * DB_LATENCY
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
+
+from app.errors import AppError
+from app.routes import lessons as lessons_routes
+from app.services import ai_pipeline
+from app.services.output_stream import output_events
+
+EXTRACTION = {"student": "Sam", "instrument": "Piano"}
+TEXTS = {
+    "student recap": "Great lesson today Sam, your scales were even and your rhythm was steady. ",
+    "practice plan": "Day 1: scales slowly. Day 2: arpeggios. Day 3: Bach left hand alone. "
+    "Day 4: hands together. Day 5: metronome at 60. Day 6: play through. Day 7: rest and listen. ",
+    "parent email": "Hello, Sam had a strong lesson this week and has a clear plan for practice. ",
+}
+
+
+def chunk(text: str | None) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeStreamingCompletions:
+    """AsyncOpenAI stand-in: streams the text for the prompt marker word by word, delay before each chunk."""
+
+    def __init__(
+        self,
+        texts: dict[str, str],
+        delay: float = 0.0,
+        fail: str | None = None,
+        error: Exception | None = None,
+    ):
+        self.texts = texts
+        self.delay = delay
+        self.fail = fail
+        self.error = error or httpx.ReadError("stream reset")
+        self.calls = 0
+
+    async def create(self, *, model: str, messages: list[dict], stream: bool = False):
+        assert stream is True
+        self.calls += 1
+        prompt = messages[0]["content"]
+        marker = next(k for k in self.texts if k in prompt)
+
+        async def chunks():
+            yield chunk(None)  # role-only first chunk, as the real API sends
+            for i, word in enumerate(self.texts[marker].split(" ")):
+                await asyncio.sleep(self.delay)
+                if marker == self.fail and i == 3:
+                    raise self.error
+                yield chunk(word + " ")
+
+        return chunks()
+
+
+def fake_openai(**kwargs) -> SimpleNamespace:
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeStreamingCompletions(dict(TEXTS), **kwargs))
+    )
+
+
+def collect(stream) -> list:
+    async def run() -> list:
+        return [item async for item in stream]
+
+    return asyncio.run(run())
+
+
+def parse(frames: list[str]) -> list[tuple[str, dict]]:
+    out = []
+    for frame in frames:
+        lines = dict(line.split(": ", 1) for line in frame.strip().splitlines())
+        out.append((lines["event"], json.loads(lines["data"])))
+    return out
+
+
+def test_stream_outputs_interleaves_deltas() -> None:
+    deltas = collect(ai_pipeline.stream_outputs(fake_openai(delay=0.001), EXTRACTION))
+
+    by_output: dict[str, str] = {}
+    for name, text in deltas:
+        by_output[name] = by_output.get(name, "") + text
+    assert set(by_output) == {"student_recap", "practice_plan", "parent_email"}
+    assert (
+        ai_pipeline.validate_outputs(by_output)["practice_plan"] == TEXTS["practice plan"].strip()
+    )
+    first_names = [name for name, _ in deltas[:20]]
+    assert len(set(first_names)) > 1
+
+
+def test_first_token_arrives_long_before_generation_finishes() -> None:
+    delay = 0.01
+    sb = FakeAsyncClient({"outputs": []})
+    lesson = {"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}
+
+    first_frame_at = None
+    frames = []
+
+    async def run() -> None:
+        nonlocal first_frame_at
+        async for frame in output_events(sb, fake_openai(delay=delay), lesson):
+            if first_frame_at is None:
+                first_frame_at = time.perf_counter() - started
+            frames.append(frame)
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    total = time.perf_counter() - started
+
+    events = parse(frames)
+    assert events[0][0] == "delta"
+    kind, done = events[-1]
+    assert kind == "done"
+    longest = max(len(t.split(" ")) for t in TEXTS.values())
+    assert total >= longest * delay
+    assert first_frame_at < 5 * delay
+    assert done["ttftMs"] < 5 * delay * 1000
+    assert done["ttftMs"] < done["totalMs"] / 4
+    assert done["outputs"]["student_recap"] == TEXTS["student recap"].strip()
+
+    saved = sb.rpcs("save_outputs")[0]
+    assert set(saved["p_outputs"]) == {"student_recap", "practice_plan", "parent_email"}
+
+
+def test_outputs_are_saved_in_one_call() -> None:
+    sb = FakeAsyncClient({})
+    lesson = {"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}
+
+    collect(output_events(sb, fake_openai(), lesson))
+
+    # Updates of existing outputs and inserts of missing ones happen in one transaction.
+    assert [name for name, *_ in sb.calls] == ["save_outputs"]
+    assert sb.rpcs("save_outputs") == [
+        {
+            "p_owner": "user-1",
+            "p_lesson_id": "lesson-1",
+            "p_outputs": {
+                "student_recap": TEXTS["student recap"].strip(),
+                "practice_plan": TEXTS["practice plan"].strip(),
+                "parent_email": TEXTS["parent email"].strip(),
+            },
+        }
+    ]
+
+
+def test_failed_stream_reports_error_and_saves_nothing() -> None:
+    sb = FakeAsyncClient({"outputs": []})
+    lesson = {"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}
+
+    events = parse(collect(output_events(sb, fake_openai(fail="parent email"), lesson)))
+
+    kind, error = events[-1]
+    assert kind == "error"
+    assert error["code"] == "GENERATION_FAILED"
+    assert error["message"] == "parent_email: stream reset"
+    assert sb.rpcs("save_outputs") == []
+
+
+def test_unexpected_stream_error_propagates() -> None:
+    # A bug in a stream must not pass for a shorter, finished output.
+    sb = FakeAsyncClient({"outputs": []})
+    lesson = {"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}
+    oai = fake_openai(fail="practice plan", error=KeyError("choices"))
+
+    with pytest.raises(KeyError):
+        collect(output_events(sb, oai, lesson))
+    assert sb.rpcs("save_outputs") == []
+
+
+def test_failed_save_reports_error() -> None:
+    def unavailable(_params: dict) -> None:
+        raise httpx.ConnectError("database unavailable")
+
+    sb = FakeAsyncClient({"rpc:save_outputs": unavailable})
+    lesson = {"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}
+
+    kind, error = parse(collect(output_events(sb, fake_openai(), lesson)))[-1]
+
+    assert kind == "error"
+    assert error["code"] == "SAVE_FAILED"
+
+
+def test_short_output_fails_validation() -> None:
+    with pytest.raises(AppError) as exc:
+        ai_pipeline.validate_outputs(
+            {"student_recap": "ok", "practice_plan": TEXTS["practice plan"]}
+        )
+    assert exc.value.code == "GENERATION_FAILED"
+    assert exc.value.message.startswith("student_recap: ")
+    assert "parent_email: " in exc.value.message
+
+
+def test_generate_route_requires_extraction(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    store = {"lessons": [{"id": "lesson-1", "owner_id": "user-1", "extraction": None}]}
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(FakeAsyncClient(store)))
+
+    with pytest.raises(AppError) as exc:
+        asyncio.run(lessons_routes.generate_outputs("lesson-1", "Bearer t"))
+    assert exc.value.code == "NOT_READY"
+
+
+def test_generate_route_streams(monkeypatch) -> None:
+    monkeypatch.setattr(lessons_routes, "verify_supabase_token", returns("user-1"))
+    store = {
+        "lessons": [{"id": "lesson-1", "owner_id": "user-1", "extraction": EXTRACTION}],
+        "outputs": [],
+    }
+    monkeypatch.setattr(lessons_routes, "supabase_async", returns(FakeAsyncClient(store)))
+    monkeypatch.setattr(lessons_routes, "openai_client", fake_openai)
+
+    resp = asyncio.run(lessons_routes.generate_outputs("lesson-1", "Bearer t"))
+
+    assert resp.media_type == "text/event-stream"
+    assert parse(collect(resp.body_iterator))[-1][0] == "done"
@@ -1,31 +1,39 @@
 from __future__ import annotations
 
+import asyncio
+import uuid
+
+from services.api.tests.fakes import FakeAsyncClient, returns
+
 from app.routes import outputs as outputs_routes
-from services.api.tests.fakes import FakeClient
 
 
 def test_update_output(monkeypatch) -> None:
-    monkeypatch.setattr(outputs_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(outputs_routes, "supabase_service", lambda: FakeClient({}))
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(FakeAsyncClient({})))
 
-    resp = outputs_routes.update_output("out-1", {"editedContent": "Updated"}, "Bearer t")
+    resp = asyncio.run(
+        outputs_routes.update_output("out-1", {"editedContent": "Updated"}, "Bearer t")
+    )
     assert resp["success"] is True
     assert resp["data"]["output"]["edited_content"] == "Updated"
 
 
 def test_mark_sent(monkeypatch) -> None:
-    monkeypatch.setattr(outputs_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(outputs_routes, "supabase_service", lambda: FakeClient({}))
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(FakeAsyncClient({})))
 
-    resp = outputs_routes.mark_sent(
-        "out-1", {"sentTo": "p@example.com", "sentVia": "email"}, "Bearer t"
+    resp = asyncio.run(
+        outputs_routes.mark_sent(
+            "out-1", {"sentTo": "p@example.com", "sentVia": "email"}, "Bearer t"
+        )
     )
     assert resp["success"] is True
     assert resp["data"]["output"]["sent_via"] == "email"
 
 
 def test_send_email_returns_mailto(monkeypatch) -> None:
-    monkeypatch.setattr(outputs_routes, "verify_supabase_token", lambda _token: "user-1")
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
     store = {
         "outputs": [
             {
@@ -37,20 +45,81 @@ def test_send_email_returns_mailto(monkeypatch) -> None:
             }
         ]
     }
-    monkeypatch.setattr(outputs_routes, "supabase_service", lambda: FakeClient(store))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(FakeAsyncClient(store)))
     monkeypatch.setattr(outputs_routes, "can_send", lambda: False)
 
-    resp = outputs_routes.send_email("out-1", {"to": ""}, "Bearer t")
+    resp = asyncio.run(outputs_routes.send_email("out-1", {"to": ""}, "Bearer t"))
     assert resp["success"] is True
     assert resp["data"]["method"] == "mailto"
 
 
 def test_send_email_when_resend_configured(monkeypatch) -> None:
-    monkeypatch.setattr(outputs_routes, "verify_supabase_token", lambda _token: "user-1")
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
     store = {"outputs": [{"id": "out-1", "owner_id": "user-1", "content": "Hi"}]}
-    monkeypatch.setattr(outputs_routes, "supabase_service", lambda: FakeClient(store))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(FakeAsyncClient(store)))
     monkeypatch.setattr(outputs_routes, "can_send", lambda: True)
 
-    resp = outputs_routes.send_email("out-1", {"to": "parent@example.com"}, "Bearer t")
+    resp = asyncio.run(outputs_routes.send_email("out-1", {"to": "parent@example.com"}, "Bearer t"))
     assert resp["success"] is False
     assert resp["error"]["code"] == "NOT_IMPLEMENTED"
+
+
+def owned_outputs(ids: set[str]):
+    """RPC handler standing in for the batch functions: updates the ids the caller owns."""
+
+    def handler(params: dict) -> list[dict]:
+        assert params["p_owner"] == "user-1"
+        return [{**item, "owner_id": "user-1"} for item in params["p_items"] if item["id"] in ids]
+
+    return handler
+
+
+def test_update_outputs_batch(monkeypatch) -> None:
+    ids = [str(uuid.uuid4()) for _ in range(400)]
+    foreign = str(uuid.uuid4())
+    store = {"rpc:update_outputs_batch": owned_outputs(set(ids))}
+    sb = FakeAsyncClient(store)
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(sb))
+
+    items = [{"id": i, "editedContent": f"edit {n}"} for n, i in enumerate(ids)]
+    items += [{"id": foreign, "editedContent": "x"}, {"id": "nope"}, {"id": ids[0]}]
+    resp = asyncio.run(outputs_routes.update_outputs_batch({"outputs": items}, "Bearer t"))
+
+    data = resp["data"]
+    assert (data["succeeded"], data["failed"]) == (400, 3)
+    assert data["results"][7]["output"]["edited_content"] == "edit 7"
+    assert [r["error"]["code"] for r in data["results"][400:]] == [
+        "NOT_FOUND",
+        "VALIDATION",
+        "VALIDATION",
+    ]
+    assert data["results"][402]["error"]["message"] == "Duplicate id in batch"
+    rpc_calls = [c for c in sb.calls if c[1] == "rpc"]
+    assert len(rpc_calls) == 1
+    assert len(rpc_calls[0][2]["p_items"]) == 401
+
+
+def test_mark_sent_batch(monkeypatch) -> None:
+    ids = [str(uuid.uuid4()) for _ in range(300)]
+    sb = FakeAsyncClient({"rpc:mark_outputs_sent": owned_outputs(set(ids))})
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(sb))
+
+    items = [{"id": i, "sentTo": "p@example.com", "sentVia": "email"} for i in ids]
+    resp = asyncio.run(outputs_routes.mark_sent_batch({"outputs": items}, "Bearer t"))
+
+    assert resp["data"]["succeeded"] == 300
+    assert all(r["output"]["sent_via"] == "email" for r in resp["data"]["results"])
+    assert [c[0] for c in sb.calls] == ["mark_outputs_sent"]
+
+
+def test_batch_with_no_valid_items_skips_the_database(monkeypatch) -> None:
+    sb = FakeAsyncClient({})
+    monkeypatch.setattr(outputs_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(outputs_routes, "supabase_async", returns(sb))
+
+    resp = asyncio.run(outputs_routes.mark_sent_batch({"outputs": [{"id": None}, "x"]}, "Bearer t"))
+
+    assert resp["data"]["failed"] == 2
+    assert sb.calls == []
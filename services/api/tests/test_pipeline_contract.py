@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from packages.ai_contract.src.validate import validate_json, load_schema
+from packages.ai_contract.src.validate import load_schema, validate_json
 
 
 def test_outputs_schema_validates() -> None:
@@ -0,0 +1,263 @@
+"""
+Query-plan regression suite: applies supabase/migrations to a scratch Postgres, loads
+synthetic data and asserts with EXPLAIN that every API query is served by an index.
+claim_job's fair ordering across owners (migration 015) and the upsert of regenerated outputs
+by apply_extraction_edit (migration 019) are checked on the same data.
+
+Runs only when NOTE2_TEST_DATABASE_URL points at a database it may write to and psycopg
+is installed; everything happens in one transaction that is rolled back at the end.
+"""
+
+from __future__ import annotations
+
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+DATABASE_URL = os.environ.get("NOTE2_TEST_DATABASE_URL")
+if not DATABASE_URL:
+    pytest.skip("NOTE2_TEST_DATABASE_URL not set", allow_module_level=True)
+psycopg = pytest.importorskip("psycopg")
+
+MIGRATIONS = Path(__file__).resolve().parents[3] / "supabase" / "migrations"
+
+# Stand-ins for what Supabase provides: the auth schema, auth.uid() and the API roles.
+SUPABASE_STUBS = """
+create schema if not exists auth;
+create table if not exists auth.users (id uuid primary key);
+create or replace function auth.uid() returns uuid language sql stable as $$
+  select nullif(current_setting('request.jwt.claim.sub', true), '')::uuid
+$$;
+do $$
+begin
+  if not exists (select 1 from pg_roles where rolname = 'anon') then
+    create role anon nologin;
+  end if;
+  if not exists (select 1 from pg_roles where rolname = 'authenticated') then
+    create role authenticated nologin;
+  end if;
+end $$;
+"""
+
+OWNERS = 100
+STUDENTS_PER_OWNER = 30
+LESSONS_PER_STUDENT = 10
+
+SYNTHETIC_DATA = f"""
+insert into auth.users (id)
+select uuid_generate_v4() from generate_series(1, {OWNERS});
+
+insert into public.profiles (id) select id from auth.users;
+
+insert into public.students (owner_id, name, created_at)
+select p.id, 'Student ' || s, now() - make_interval(days => s)
+from public.profiles p, generate_series(1, {STUDENTS_PER_OWNER}) s;
+
+insert into public.lessons (owner_id, student_id, audio_path, status, created_at)
+select st.owner_id, st.id, 'audio/' || st.id || '/' || n || '.m4a',
+       case when n = 1 then 'TRANSCRIBING' else 'READY' end,
+       now() - make_interval(hours => n)
+from public.students st, generate_series(1, {LESSONS_PER_STUDENT}) n;
+
+insert into public.jobs (owner_id, lesson_id, step, progress)
+select owner_id, id,
+       case when status = 'READY' then 'DONE' else status end,
+       case when status = 'READY' then 100 else 10 end
+from public.lessons;
+
+insert into public.outputs (owner_id, lesson_id, type, content)
+select l.owner_id, l.id, t, 'text'
+from public.lessons l, unnest(array['student_recap', 'practice_plan', 'parent_email']) t;
+
+insert into public.ai_result_cache (key, kind, value, expires_at)
+select 'extract:' || n, 'extract', '{{}}'::jsonb, now() + make_interval(days => n % 30 - 5)
+from generate_series(1, 20000) n;
+
+analyze;
+"""
+
+
+@pytest.fixture(scope="module")
+def db() -> Iterator[object]:
+    conn = psycopg.connect(DATABASE_URL, cursor_factory=psycopg.ClientCursor)
+    try:
+        conn.execute(SUPABASE_STUBS)
+        for migration in sorted(MIGRATIONS.glob("*.sql")):
+            conn.execute(migration.read_text(encoding="utf-8"))
+        conn.execute(SYNTHETIC_DATA)
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture(scope="module")
+def sample(db) -> dict:
+    row = db.execute(
+        """
+        select l.owner_id, l.student_id, l.id, o.id, l.created_at
+        from public.lessons l join public.outputs o on o.lesson_id = l.id
+        order by l.id limit 1
+        """
+    ).fetchone()
+    owner, student, lesson, output, created_at = (str(v) for v in row)
+    return {
+        "owner": owner,
+        "student": student,
+        "lesson": lesson,
+        "output": output,
+        "created_at": created_at,
+    }
+
+
+def scans(plan: dict) -> Iterator[tuple[str, str | None]]:
+    yield plan["Node Type"], plan.get("Relation Name")
+    for child in plan.get("Plans", []):
+        yield from scans(child)
+
+
+def explain(db, query: str, params: dict) -> list[tuple[str, str | None]]:
+    args = params if "%(" in query else None
+    (result,) = db.execute(f"explain (format json) {query}", args).fetchone()
+    return list(scans(result[0]["Plan"]))
+
+
+# The SQL PostgREST runs for each API query (service role, so no RLS predicate).
+API_QUERIES = {
+    "list_students": """
+        select created_at, id, name from public.students
+        where owner_id = %(owner)s order by created_at desc, id desc limit 51
+    """,
+    "list_students_after_cursor": """
+        select created_at, id, name from public.students
+        where owner_id = %(owner)s
+          and (created_at < %(created_at)s or (created_at = %(created_at)s and id < %(student)s))
+        order by created_at desc, id desc limit 51
+    """,
+    "list_student_lessons": """
+        select created_at, id, title, status from public.lessons
+        where owner_id = %(owner)s and student_id = %(student)s
+        order by created_at desc, id desc limit 51
+    """,
+    "lesson_status": """
+        select status, step, progress, last_error, job_updated_at from public.lesson_status_v
+        where lesson_id = %(lesson)s and owner_id = %(owner)s limit 1
+    """,
+    "generate_lesson": """
+        select id, owner_id, extraction from public.lessons
+        where id = %(lesson)s and owner_id = %(owner)s limit 1
+    """,
+    "lesson_outputs": """
+        select id, type from public.outputs
+        where lesson_id = %(lesson)s and owner_id = %(owner)s
+    """,
+    "update_output": """
+        select * from public.outputs where id = %(output)s and owner_id = %(owner)s
+    """,
+    "job_by_lesson": """
+        select * from public.jobs where lesson_id = %(lesson)s and owner_id = %(owner)s
+    """,
+    # One probe per lane inside claim_job (migration 015).
+    "claim_job": """
+        select q.id from public.jobs q
+        where q.lane = 'interactive' and q.step not in ('DONE', 'FAILED') and q.run_after <= now()
+          and (q.locked_by is null or q.locked_at < now() - make_interval(secs => 900))
+        order by q.vstart, q.created_at
+        for update skip locked limit 1
+    """,
+    "result_cache_get": """
+        select value from public.ai_result_cache
+        where key = 'extract:42' and expires_at > now() limit 1
+    """,
+    # Purges run often, so each one only removes the small slice that expired since the last.
+    "result_cache_purge": """
+        select key from public.ai_result_cache where expires_at < now() - interval '4 days'
+    """,
+}
+
+
+@pytest.mark.parametrize("name", sorted(API_QUERIES))
+def test_api_query_uses_index(db, sample, name) -> None:
+    plan = explain(db, API_QUERIES[name], sample)
+
+    seq_scans = [relation for node, relation in plan if node == "Seq Scan"]
+    assert not seq_scans, f"{name} scans {seq_scans} sequentially: {plan}"
+
+
+def test_rls_scoped_query_uses_owner_index(db, sample) -> None:
+    """Client queries carry no owner filter of their own; the policy's auth.uid() must use the index."""
+    db.execute("savepoint rls")
+    try:
+        db.execute("grant usage on schema auth to authenticated")
+        db.execute("grant select on public.students, public.lessons to authenticated")
+        db.execute("set local role authenticated")
+        db.execute("select set_config('request.jwt.claim.sub', %(owner)s, true)", sample)
+        plan = explain(
+            db, "select id, name from public.students order by created_at desc limit 20", sample
+        )
+        lessons = explain(
+            db, "select id, status from public.lessons order by created_at desc limit 20", sample
+        )
+    finally:
+        db.execute("rollback to savepoint rls")
+
+    assert not [r for node, r in plan + lessons if node == "Seq Scan"], plan + lessons
+
+
+def test_claim_job_serves_a_new_owner_before_another_owners_backlog(db) -> None:
+    db.execute("savepoint fair")
+    try:
+        db.execute("update public.jobs set step = 'DONE' where step not in ('DONE', 'FAILED')")
+        heavy, light = (
+            str(row[0])
+            for row in db.execute("select id from public.profiles order by id limit 2").fetchall()
+        )
+        enqueue = """
+            insert into public.jobs (owner_id, lesson_id)
+            select owner_id, id from public.lessons where owner_id = %(owner)s limit %(count)s
+        """
+
+        def claim() -> str:
+            return str(db.execute("select owner_id from public.claim_job('w1')").fetchone()[0])
+
+        db.execute(enqueue, {"owner": heavy, "count": 40})
+        assert [claim() for _ in range(3)] == [heavy] * 3
+
+        db.execute(enqueue, {"owner": light, "count": 1})
+        assert claim() == light
+        assert claim() == heavy
+    finally:
+        db.execute("rollback to savepoint fair")
+
+
+def test_extraction_edit_creates_a_missing_output_row(db) -> None:
+    db.execute("savepoint edit")
+    try:
+        owner, lesson = db.execute("select owner_id, id from public.lessons limit 1").fetchone()
+        db.execute(
+            "delete from public.outputs where lesson_id = %s and type = 'practice_plan'", (lesson,)
+        )
+        saved = db.execute(
+            """
+            select type, content from public.apply_extraction_edit(
+              %s, %s, '{"student": "Sam"}'::jsonb,
+              '{"student_recap": "new recap", "practice_plan": "new plan"}'::jsonb
+            ) order by type
+            """,
+            (owner, lesson),
+        ).fetchall()
+        rows = db.execute(
+            "select type, content from public.outputs where lesson_id = %s order by type",
+            (lesson,),
+        ).fetchall()
+    finally:
+        db.execute("rollback to savepoint edit")
+
+    assert saved == [("practice_plan", "new plan"), ("student_recap", "new recap")]
+    assert rows == [
+        ("parent_email", "text"),
+        ("practice_plan", "new plan"),
+        ("student_recap", "new recap"),
+    ]
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from fastapi.testclient import TestClient
+from services.api.tests.fakes import FakeClient
+
+from app.main import app
+from app.services import rate_governor
+from app.services.openai_client import GovernedOpenAI, estimate_tokens
+from app.services.rate_governor import RateGovernor, TableStore, parse_duration
+
+
+class FakeClock:
+    """Deterministic time: sleeping advances the clock and is recorded."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def governor(clock: FakeClock, rpm: float = 0, tpm: float = 0, **kwargs) -> RateGovernor:
+    return RateGovernor(rpm=rpm, tpm=tpm, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def rate_limit_error(headers: dict | None = None) -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+class RawResponse:
+    def __init__(self, result, headers: dict | None = None) -> None:
+        self.result = result
+        self.headers = headers or {}
+
+    def parse(self):
+        return self.result
+
+
+class Fake429Client:
+    """
+    Stands in for OpenAI(...).chat.completions.with_raw_response: the first `failures`
+    calls answer 429 with the given headers, later ones succeed and report token usage.
+    """
+
+    def __init__(self, failures: int, headers: dict | None = None, tokens: int = 50) -> None:
+        self.failures = failures
+        self.headers = headers or {"retry-after": "2"}
+        self.tokens = tokens
+        self.sent: list[float] = []
+        self.lock = threading.Lock()
+        completions = SimpleNamespace(with_raw_response=SimpleNamespace(create=self.create))
+        self.chat = SimpleNamespace(completions=completions)
+
+    def create(self, **request):
+        with self.lock:
+            self.sent.append(time.monotonic())
+            if self.failures > 0:
+                self.failures -= 1
+                raise rate_limit_error(self.headers)
+        usage = SimpleNamespace(total_tokens=self.tokens)
+        return RawResponse(SimpleNamespace(usage=usage, text="ok"))
+
+
+def test_parse_duration() -> None:
+    assert parse_duration("20ms") == pytest.approx(0.02)
+    assert parse_duration("6m0s") == 360
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("soon") is None
+
+
+def test_requests_per_minute_spaces_calls_in_order() -> None:
+    clock = FakeClock()
+    gov = governor(clock, rpm=6)
+
+    waits = [gov.acquire(0) for _ in range(8)]
+
+    assert waits[:6] == [0] * 6
+    assert waits[6] == pytest.approx(10)
+    assert waits[7] == pytest.approx(10)
+    assert gov.snapshot()["calls"] == 8
+
+
+def test_tokens_per_minute_budget_and_usage_correction() -> None:
+    clock = FakeClock()
+    gov = governor(clock, tpm=1000)
+
+    assert gov.acquire(600) == 0
+    assert gov.acquire(600) == pytest.approx(12)  # 200 tokens short at 1000/min
+
+    # The response used far less than reserved; the difference is returned to the budget.
+    gov.settle(600, 100)
+    assert gov.acquire(400) == 0
+
+
+def test_429_pauses_and_retries_after_retry_after() -> None:
+    clock = FakeClock()
+    gov = governor(clock, rpm=600, backoff_base=0.5)
+    fake = Fake429Client(failures=2, headers={"retry-after": "2"})
+    oai = GovernedOpenAI(fake, gov)
+
+    result = oai.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+
+    assert result.text == "ok"
+    assert len(fake.sent) == 3
+    assert sum(clock.sleeps) >= 4  # at least Retry-After before each retry
+    snap = gov.snapshot()
+    assert snap["rateLimited"] == 2
+    assert snap["retries"] == 2
+
+
+def test_retries_give_up_and_other_errors_are_not_retried() -> None:
+    clock = FakeClock()
+    gov = governor(clock, max_retries=2)
+    fake = Fake429Client(failures=10, headers={"retry-after-ms": "10"})
+
+    with pytest.raises(openai.RateLimitError):
+        GovernedOpenAI(fake, gov).chat.completions.create(model="m", messages=[])
+    assert len(fake.sent) == 3
+
+    def bad_request():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        gov.call(bad_request)
+    assert gov.snapshot()["retries"] == 2
+
+
+def test_rate_limit_headers_lower_the_budget() -> None:
+    clock = FakeClock()
+    gov = governor(clock, rpm=1000)
+
+    gov.observe(
+        {
+            "x-ratelimit-limit-requests": "60",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "3s",
+        }
+    )
+
+    assert gov.requests.per_minute == 60
+    # Nothing left until the reset in 3s, then one request per second at the adopted limit.
+    assert gov.acquire(0) == pytest.approx(4)
+    assert gov.snapshot()["pausedForSeconds"] == 0
+
+
+class WindowLimitClient(Fake429Client):
+    """Answers 429 to everything sent within `window` seconds of the first request."""
+
+    def __init__(self, window: float) -> None:
+        super().__init__(failures=0)
+        self.window = window
+        self.limited: list[float] = []
+
+    def create(self, **request):
+        with self.lock:
+            now = time.monotonic()
+            opened = self.sent[0] if self.sent else now
+            self.sent.append(now)
+            if now - opened < self.window:
+                self.limited.append(now)
+                left_ms = (opened + self.window - now) * 1000
+                raise rate_limit_error({"retry-after-ms": f"{left_ms:.0f}"})
+        return RawResponse(SimpleNamespace(usage=None, text="ok"))
+
+
+def test_workers_hitting_429_together_retry_spread_out() -> None:
+    """
+    Ten threads start at once; whoever gets the 429 pauses all of them. They wait out
+    Retry-After together, then the drained budget lets them through one by one instead of
+    retrying at the same moment.
+    """
+    gov = RateGovernor(rpm=6000, tpm=0, backoff_base=0.01, backoff_max=0.02)
+    fake = WindowLimitClient(window=0.1)
+    oai = GovernedOpenAI(fake, gov)
+    start = threading.Barrier(10)
+
+    def worker() -> None:
+        start.wait()
+        oai.chat.completions.create(model="m", messages=[])
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    # Only calls already in flight when the first 429 arrived were rejected; none retried early.
+    assert 1 <= len(fake.limited) <= 10
+    served = sorted(set(fake.sent) - set(fake.limited))
+    assert len(served) == 10
+    assert served[0] - fake.sent[0] >= 0.095
+    # At 6000/min the drained bucket admits one call per 10ms.
+    assert served[-1] - served[0] >= 0.08
+    snap = gov.snapshot()
+    assert snap["queueDepth"] == 0
+    assert snap["rateLimited"] == len(fake.limited)
+
+
+def test_async_calls_share_the_governor() -> None:
+    gov = RateGovernor(rpm=600, tpm=0, backoff_base=0.001)
+    calls = []
+
+    async def send():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise rate_limit_error({"retry-after-ms": "1"})
+        return RawResponse("streamed")
+
+    assert asyncio.run(gov.call_async(send, tokens=10)) == "streamed"
+    assert len(calls) == 2
+    assert calls[1] - calls[0] >= 0.001
+    assert gov.snapshot()["rateLimited"] == 1
+
+
+def test_transcription_retry_rewinds_the_upload() -> None:
+    clock = FakeClock()
+    gov = governor(clock)
+    uploads: list[bytes] = []
+
+    def create(*, model, file):
+        uploads.append(file[1].read())
+        if len(uploads) == 1:
+            raise rate_limit_error({"retry-after": "1"})
+        return RawResponse(SimpleNamespace(text="transcript"))
+
+    transcriptions = SimpleNamespace(with_raw_response=SimpleNamespace(create=create))
+    oai = GovernedOpenAI(SimpleNamespace(audio=SimpleNamespace(transcriptions=transcriptions)), gov)
+
+    result = oai.audio.transcriptions.create(model="whisper-1", file=("a.wav", io.BytesIO(b"abc")))
+
+    assert result.text == "transcript"
+    assert uploads == [b"abc", b"abc"]
+
+
+def test_shared_store_budget_and_fallback() -> None:
+    clock = FakeClock()
+    waits = {"openai:requests": 0.0, "openai:tokens": 4.0}
+    sb = FakeClient({"rpc:rate_reserve": lambda p: waits[p["p_key"]], "rpc:rate_pause": None})
+    gov = governor(clock, rpm=60, tpm=1000, store=TableStore(sb))
+
+    assert gov.acquire(10) == pytest.approx(4)
+    gov.rate_limited({"retry-after": "3"})
+    assert sb.rpcs("rate_pause") == [{"p_key": "openai", "p_seconds": 3.0}]
+
+    def down(_name, _params=None):
+        raise httpx.ConnectError("database unavailable")
+
+    sb.rpc = down
+    # The local budget and pause still apply: 3s of pause, then one request per second.
+    assert gov.acquire(10) == pytest.approx(4)
+
+
+def test_async_shared_store_calls_run_off_the_event_loop() -> None:
+    threads: list[int] = []
+
+    def reserve(_params: dict) -> float:
+        threads.append(threading.get_ident())
+        return 0.0
+
+    def pause(_params: dict) -> None:
+        threads.append(threading.get_ident())
+
+    sb = FakeClient({"rpc:rate_reserve": reserve, "rpc:rate_pause": pause})
+    gov = RateGovernor(rpm=600, tpm=1000, store=TableStore(sb), backoff_base=0.001)
+    attempts = []
+
+    async def send():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise rate_limit_error({"retry-after-ms": "1"})
+        return RawResponse("ok")
+
+    async def run() -> int:
+        await gov.call_async(send, tokens=10)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    # Two reserves per attempt and one pause, none of them on the loop's thread.
+    assert len(threads) == 5
+    assert loop_thread not in threads
+
+
+def test_estimate_tokens_counts_prompt_and_completion() -> None:
+    request = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}
+    assert estimate_tokens(request) == 150
+
+
+def test_metrics_include_governor(monkeypatch) -> None:
+    monkeypatch.setattr(rate_governor, "governor", RateGovernor(rpm=10, tpm=100))
+
+    data = TestClient(app).get("/metrics").json()["data"]
+
+    assert data["openai"]["queueDepth"] == 0
+    assert set(data["openai"]) >= {"calls", "rateLimited", "waitSecondsTotal", "waitSecondsMax"}
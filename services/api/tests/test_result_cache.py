@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import shutil
+import time
+
+import httpx
+from packages.ai_contract.src.registry import ContractRegistry
+from services.api.tests.fakes import FakeClient
+
+from app.services import result_cache
+from app.services.result_cache import LRUCache, TableCache, TieredCache
+
+EXTRACTION = {"student": "Sam", "instrument": "Piano"}
+OUTPUTS = {"student_recap": "A" * 60, "practice_plan": "B" * 120, "parent_email": "C" * 60}
+
+
+def counting(monkeypatch, name: str, value) -> list:
+    calls = []
+
+    def fake(*args, **kwargs):
+        calls.append(args)
+        return value
+
+    monkeypatch.setattr(result_cache.ai_pipeline, name, fake)
+    return calls
+
+
+def test_extract_hit_skips_llm(monkeypatch) -> None:
+    monkeypatch.setattr(result_cache, "cache", LRUCache(10, 60))
+    monkeypatch.setattr(result_cache, "stats", result_cache.CacheStats())
+    calls = counting(monkeypatch, "extract", EXTRACTION)
+
+    assert result_cache.cached_extract(object(), "transcript") == EXTRACTION
+    assert result_cache.cached_extract(object(), "transcript") == EXTRACTION
+    assert result_cache.cached_extract(object(), "other transcript") == EXTRACTION
+
+    assert len(calls) == 2
+    assert result_cache.stats.snapshot() == {"extract": {"hits": 1, "misses": 2}}
+
+
+def test_generate_key_ignores_dict_order(monkeypatch) -> None:
+    monkeypatch.setattr(result_cache, "cache", LRUCache(10, 60))
+    calls = counting(monkeypatch, "generate", OUTPUTS)
+
+    result_cache.cached_generate(object(), {"a": 1, "b": 2})
+    result_cache.cached_generate(object(), {"b": 2, "a": 1})
+    assert len(calls) == 1
+
+
+def test_key_changes_with_model_mode_and_prompt(monkeypatch, tmp_path) -> None:
+    base = result_cache.generate_key(EXTRACTION, "per_output")
+    assert result_cache.generate_key(EXTRACTION, "combined") != base
+
+    monkeypatch.setattr(result_cache.settings, "openai_llm_model", "another-model")
+    assert result_cache.generate_key(EXTRACTION, "per_output") != base
+    monkeypatch.undo()
+
+    root = result_cache.registry.root
+    shutil.copytree(root / "prompts", tmp_path / "prompts")
+    shutil.copytree(root / "schema", tmp_path / "schema")
+    local = ContractRegistry(tmp_path)
+    monkeypatch.setattr(result_cache, "registry", local)
+    before = result_cache.extract_key("transcript")
+
+    (tmp_path / "prompts" / "extraction.md").write_text("New rules\n{{SCHEMA_JSON}}", encoding="utf-8")
+    local.reload()
+    assert result_cache.extract_key("transcript") != before
+
+
+def test_lru_bounded_and_ttl() -> None:
+    cache = LRUCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert len(cache) == 2
+
+    short = LRUCache(max_entries=2, ttl_seconds=0.01)
+    short.put("a", 1)
+    time.sleep(0.02)
+    assert short.get("a") is None
+
+
+def test_table_cache_round_trip() -> None:
+    sb = FakeClient({"ai_result_cache": [{"value": EXTRACTION}]})
+    cache = TableCache(sb, ttl_seconds=60)
+    cache.put("extract:abc", EXTRACTION)
+    assert cache.get("extract:abc") == EXTRACTION
+
+    # ai_cache_put upserts the entry and deletes expired ones in the same call.
+    assert sb.rpcs("ai_cache_put") == [
+        {"p_key": "extract:abc", "p_kind": "extract", "p_value": EXTRACTION, "p_ttl_seconds": 60}
+    ]
+
+
+def test_tiered_promotes_far_hits() -> None:
+    near = LRUCache(10, 60)
+    far = LRUCache(10, 60)
+    far.put("k", "v")
+    tiered = TieredCache(near, far)
+    assert tiered.get("k") == "v"
+    assert near.get("k") == "v"
+
+
+def test_cache_failure_falls_through(monkeypatch) -> None:
+    class Broken:
+        def get(self, key):
+            raise httpx.ConnectError("db down")
+
+        def put(self, key, value):
+            raise httpx.ConnectError("db down")
+
+    calls = counting(monkeypatch, "extract", EXTRACTION)
+    monkeypatch.setattr(result_cache, "cache", Broken())
+    assert result_cache.cached_extract(object(), "transcript") == EXTRACTION
+    assert len(calls) == 1
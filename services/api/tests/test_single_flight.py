@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from services.api.tests.fakes import FakeClient
+
+from app.errors import AppError
+from app.main import app
+from app.services import result_cache, single_flight, transcripts
+from app.services.result_cache import LRUCache
+from app.services.single_flight import SingleFlight, TableLease
+
+EXTRACTION = {"student": "Sam", "instrument": "Piano"}
+
+
+def run_together(count: int, fn) -> list:
+    """Start count threads at the same moment; returns each one's result or AppError."""
+    start = threading.Barrier(count)
+    results: list = [None] * count
+
+    def run(index: int) -> None:
+        start.wait()
+        try:
+            results[index] = fn()
+        except AppError as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return results
+
+
+def slow(calls: list, value=None, error: Exception | None = None):
+    def fn():
+        calls.append(1)
+        time.sleep(0.05)
+        if error is not None:
+            raise error
+        return value
+
+    return fn
+
+
+@pytest.fixture
+def flights(monkeypatch) -> SingleFlight:
+    flights = SingleFlight()
+    monkeypatch.setattr(result_cache, "flights", flights)
+    monkeypatch.setattr(transcripts, "flights", flights)
+    return flights
+
+
+def test_concurrent_extractions_share_one_llm_call(monkeypatch, flights) -> None:
+    monkeypatch.setattr(result_cache, "cache", LRUCache(10, 60))
+    calls: list = []
+    monkeypatch.setattr(
+        result_cache.ai_pipeline, "extract", lambda _oai, _t: slow(calls, EXTRACTION)()
+    )
+
+    results = run_together(8, lambda: result_cache.cached_extract(object(), "transcript"))
+
+    assert len(calls) == 1
+    assert results == [EXTRACTION] * 8
+    assert flights.shared == 7
+    assert flights.in_flight() == 0
+
+
+def test_concurrent_generations_share_one_call_without_a_cache(monkeypatch, flights) -> None:
+    monkeypatch.setattr(result_cache, "cache", None)
+    outputs = {"student_recap": "recap", "practice_plan": "plan", "parent_email": "email"}
+    calls: list = []
+    monkeypatch.setattr(
+        result_cache.ai_pipeline, "generate", lambda *_a, **_k: slow(calls, outputs)()
+    )
+
+    results = run_together(5, lambda: result_cache.cached_generate(object(), EXTRACTION))
+
+    assert len(calls) == 1
+    assert results == [outputs] * 5
+
+
+def test_concurrent_transcriptions_upload_once(monkeypatch, flights, tmp_path) -> None:
+    path = tmp_path / "audio.wav"
+    path.write_bytes(b"same recording")
+    calls: list = []
+    monkeypatch.setattr(
+        transcripts, "transcribe", lambda *_a, **_k: slow(calls, "transcript text")()
+    )
+    sb = FakeClient({"audio_transcripts": []})
+
+    results = run_together(4, lambda: transcripts.cached_transcribe(sb, object(), str(path)))
+
+    assert len(calls) == 1
+    assert {transcript for transcript, _digest in results} == {"transcript text"}
+    assert len(sb.upserts("audio_transcripts")) == 1
+
+
+def test_error_is_shared_and_key_is_released() -> None:
+    flights = SingleFlight()
+    calls: list = []
+    error = AppError(code="GENERATION_FAILED", message="too short")
+
+    results = run_together(6, lambda: flights.do("k", slow(calls, error=error)))
+
+    assert len(calls) == 1
+    assert all(r is error for r in results)
+    # The key is forgotten once the call finishes: a later caller runs again.
+    assert flights.do("k", lambda: "fresh") == "fresh"
+    assert flights.do("other", lambda: "other") == "other"
+
+
+class InflightTable:
+    """public.inflight_calls with the claim/finish semantics of migration 012."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.rows: dict[str, dict] = {}
+
+    def claim(self, p: dict) -> dict:
+        with self.lock:
+            row = self.rows.get(p["p_key"])
+            if row is None or row["expires_at"] <= time.monotonic():
+                self.rows[p["p_key"]] = {
+                    "holder": p["p_holder"],
+                    "state": "running",
+                    "result": None,
+                    "error": None,
+                    "expires_at": time.monotonic() + p["p_lease_seconds"],
+                }
+                return {"claimed": True}
+            return {"claimed": False, **{k: row[k] for k in ("state", "result", "error")}}
+
+    def finish(self, p: dict) -> None:
+        with self.lock:
+            row = self.rows.get(p["p_key"])
+            if row is not None and row["holder"] == p["p_holder"]:
+                row.update(
+                    state="done" if p["p_error"] is None else "failed",
+                    result=p["p_result"],
+                    error=p["p_error"],
+                    expires_at=time.monotonic() + p["p_keep_seconds"],
+                )
+
+    def client(self) -> FakeClient:
+        return FakeClient({"rpc:inflight_claim": self.claim, "rpc:inflight_finish": self.finish})
+
+
+def test_processes_share_one_call_through_the_table() -> None:
+    table = InflightTable()
+    # Two "processes", each with its own in-process flights and database connection.
+    processes = [SingleFlight(TableLease(table.client(), poll_seconds=0.01)) for _ in range(2)]
+    calls: list = []
+    fn = slow(calls, EXTRACTION)
+    turn = itertools.count()
+
+    results = run_together(6, lambda: processes[next(turn) % 2].do("extract:k", fn))
+
+    assert len(calls) == 1
+    assert results == [EXTRACTION] * 6
+
+
+def test_table_lease_shares_errors_and_takes_over_expired_leases() -> None:
+    table = InflightTable()
+    leader = TableLease(table.client(), poll_seconds=0.01)
+    follower = TableLease(table.client(), poll_seconds=0.01)
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.05)
+        raise AppError(code="EXTRACTION_FAILED", message="bad json")
+
+    thread = threading.Thread(target=lambda: pytest.raises(AppError, leader.run, "k", failing))
+    thread.start()
+    started.wait(1)
+    with pytest.raises(AppError) as err:
+        follower.run("k", lambda: "never called")
+    thread.join()
+    assert err.value.code == "EXTRACTION_FAILED"
+
+    # A leader that died without finishing: its lease runs out and the next caller runs fn.
+    table.rows["dead"] = {
+        "holder": "gone",
+        "state": "running",
+        "result": None,
+        "error": None,
+        "expires_at": time.monotonic() + 0.05,
+    }
+    assert follower.run("dead", lambda: "recomputed") == "recomputed"
+
+
+def test_table_unreachable_runs_the_call() -> None:
+    sb = FakeClient({})
+
+    def down(_name, _params=None):
+        raise httpx.ConnectError("database unavailable")
+
+    sb.rpc = down
+    assert TableLease(sb).run("k", lambda: "value") == "value"
+
+
+def test_metrics_report_single_flight(monkeypatch) -> None:
+    monkeypatch.setattr(single_flight, "flights", SingleFlight())
+    data = TestClient(app).get("/metrics").json()["data"]
+    assert data["singleFlight"] == {"inFlight": 0, "shared": 0}
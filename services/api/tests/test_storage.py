@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import ClassVar
+
+import pytest
+import requests
+
+from app.errors import AppError
+from app.services import storage
+
+AUDIO = bytes(range(256)) * 400  # 100 KiB
+
+
+class StorageStandIn(BaseHTTPRequestHandler):
+    """Serves AUDIO at /storage/v1/object/lesson-audio/<path>, honouring Range requests."""
+
+    drop_after: ClassVar[list[int]] = []  # per request: bytes to send before dropping the connection
+    seen: ClassVar[list[dict]] = []
+
+    def log_message(self, *_args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        type(self).seen.append({"range": self.headers.get("Range"), "auth": self.headers.get("Authorization")})
+        if not self.path.endswith("/lesson-audio/teacher/lesson%201.wav"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].removeprefix("bytes=").rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(AUDIO) - 1}/{len(AUDIO)}")
+        else:
+            self.send_response(200)
+        body = AUDIO[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        drop = type(self).drop_after.pop(0) if type(self).drop_after else None
+        if drop is not None:
+            self.wfile.write(body[:drop])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def storage_server(monkeypatch):
+    StorageStandIn.drop_after = []
+    StorageStandIn.seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StorageStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(storage.settings, "supabase_url", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(storage.settings, "audio_fetch_chunk_bytes", 4096)
+    monkeypatch.setattr(storage, "_session", requests.Session())
+    yield StorageStandIn
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_streams_into_memory_capped_spool(storage_server, monkeypatch) -> None:
+    monkeypatch.setattr(storage.settings, "audio_spool_max_bytes", 16 * 1024)
+    with storage.fetch_audio("teacher/lesson 1.wav") as f:
+        assert f._rolled  # spilled to disk once past the memory cap
+        assert f.read() == AUDIO
+    assert storage_server.seen[0]["auth"] == f"Bearer {storage.settings.supabase_service_role_key}"
+
+
+def test_small_file_stays_in_memory(storage_server, monkeypatch) -> None:
+    monkeypatch.setattr(storage.settings, "audio_spool_max_bytes", len(AUDIO) * 2)
+    with storage.fetch_audio("teacher/lesson 1.wav") as f:
+        assert not f._rolled
+        assert f.read() == AUDIO
+
+
+def test_dropped_connection_resumes_with_range(storage_server) -> None:
+    storage_server.drop_after = [8 * 4096, 5 * 4096]
+    with storage.fetch_audio("teacher/lesson 1.wav") as f:
+        assert f.read() == AUDIO
+
+    ranges = [r["range"] for r in storage_server.seen]
+    assert ranges[0] is None
+    assert ranges[1] == f"bytes={8 * 4096}-"
+    assert ranges[2] == f"bytes={13 * 4096}-"
+    assert len(ranges) == 3
+
+
+def test_gives_up_after_retries(storage_server, monkeypatch) -> None:
+    monkeypatch.setattr(storage.settings, "audio_fetch_retries", 1)
+    storage_server.drop_after = [10, 10, 10]
+    with pytest.raises(AppError) as exc:
+        storage.fetch_audio("teacher/lesson 1.wav")
+    assert exc.value.code == "AUDIO_FETCH_FAILED"
+
+
+def test_missing_object(storage_server) -> None:
+    with pytest.raises(AppError) as exc:
+        storage.fetch_audio("teacher/missing.wav")
+    assert exc.value.code == "AUDIO_NOT_FOUND"
@@ -1,37 +1,183 @@
 from __future__ import annotations
 
+import asyncio
+import re
+
 import pytest
+from services.api.tests.fakes import FakeAsyncClient, returns
 
 from app.errors import AppError
 from app.routes import students as students_routes
-from services.api.tests.fakes import FakeClient
+from app.settings import settings
 
 
 def test_list_students_returns_data(monkeypatch) -> None:
-    monkeypatch.setattr(students_routes, "verify_supabase_token", lambda _token: "user-1")
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
     store = {"students": [{"id": "s1", "owner_id": "user-1", "name": "Sam"}]}
-    monkeypatch.setattr(students_routes, "supabase_service", lambda: FakeClient(store))
+    monkeypatch.setattr(students_routes, "supabase_async", returns(FakeAsyncClient(store)))
 
-    resp = students_routes.list_students("Bearer token")
+    resp = asyncio.run(students_routes.list_students("Bearer token"))
     assert resp["success"] is True
     assert resp["data"]["students"][0]["id"] == "s1"
 
 
 def test_create_student_requires_name(monkeypatch) -> None:
-    monkeypatch.setattr(students_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(students_routes, "supabase_service", lambda: FakeClient({}))
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(students_routes, "supabase_async", returns(FakeAsyncClient({})))
 
     with pytest.raises(AppError):
-        students_routes.create_student({"name": "   "}, "Bearer token")
+        asyncio.run(students_routes.create_student({"name": "   "}, "Bearer token"))
 
 
 def test_create_student_success(monkeypatch) -> None:
-    monkeypatch.setattr(students_routes, "verify_supabase_token", lambda _token: "user-1")
-    monkeypatch.setattr(students_routes, "supabase_service", lambda: FakeClient({}))
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(students_routes, "supabase_async", returns(FakeAsyncClient({})))
 
-    resp = students_routes.create_student(
-        {"name": "Ava", "instrument": "piano", "parent_email": "p@example.com"},
-        "Bearer token",
+    resp = asyncio.run(
+        students_routes.create_student(
+            {"name": "Ava", "instrument": "piano", "parent_email": "p@example.com"},
+            "Bearer token",
+        )
     )
     assert resp["success"] is True
     assert resp["data"]["student"]["name"] == "Ava"
+
+
+def keyset_table(rows: list[dict]):
+    """Callable fake table that applies eq filters and the keyset cursor, newest first."""
+    ordered = sorted(rows, key=lambda r: (r["created_at"], r["id"]), reverse=True)
+
+    def select(filters: list[tuple]) -> list[dict]:
+        out = ordered
+        for kind, *args in filters:
+            if kind == "eq":
+                out = [r for r in out if r[args[0]] == args[1]]
+            elif kind == "or":
+                created_at, id_ = re.search(r'lt\."([^"]+)".*id\.lt\."([^"]+)"', args[0]).groups()
+                out = [r for r in out if (r["created_at"], r["id"]) < (created_at, id_)]
+        return out
+
+    return select
+
+
+def students(count: int) -> list[dict]:
+    # Pairs share a created_at so the id tie-break is exercised.
+    return [
+        {
+            "id": f"s{i:04d}",
+            "owner_id": "user-1",
+            "created_at": f"2026-01-01T00:{i // 2 // 60:02d}:{i // 2 % 60:02d}+00:00",
+            "name": f"Student {i}",
+        }
+        for i in range(count)
+    ]
+
+
+def test_list_students_pages_with_cursor(monkeypatch) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    rows = students(120) + [{**students(1)[0], "id": "other", "owner_id": "user-2"}]
+    sb = FakeAsyncClient({"students": keyset_table(rows)})
+    monkeypatch.setattr(students_routes, "supabase_async", returns(sb))
+
+    pages, cursor = [], None
+    while True:
+        resp = asyncio.run(students_routes.list_students("Bearer t", 50, cursor, None))
+        pages.append(resp["data"]["students"])
+        cursor = resp["data"]["nextCursor"]
+        if cursor is None:
+            break
+
+    assert [len(p) for p in pages] == [50, 50, 20]
+    ids = [s["id"] for page in pages for s in page]
+    assert ids == [f"s{i:04d}" for i in reversed(range(120))]
+    assert sb.calls[0][2] == "created_at, id, name, instrument, parent_email"
+
+
+def test_list_students_projects_fields(monkeypatch) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient({"students": []})
+    monkeypatch.setattr(students_routes, "supabase_async", returns(sb))
+
+    resp = asyncio.run(students_routes.list_students("Bearer t", None, None, "name, id"))
+
+    assert resp["data"] == {"students": [], "nextCursor": None}
+    assert sb.calls[0][2] == "created_at, id, name"
+
+
+@pytest.mark.parametrize(
+    "limit, cursor, fields",
+    [(0, None, None), (500, None, None), (None, "not-a-cursor", None), (None, None, "password")],
+)
+def test_list_students_rejects_bad_params(monkeypatch, limit, cursor, fields) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(students_routes, "supabase_async", returns(FakeAsyncClient({})))
+
+    with pytest.raises(AppError) as exc:
+        asyncio.run(students_routes.list_students("Bearer t", limit, cursor, fields))
+    assert exc.value.code == "VALIDATION"
+
+
+def test_list_student_lessons_omits_transcripts_by_default(monkeypatch) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    lessons = [
+        {
+            "id": f"l{i}",
+            "owner_id": "user-1",
+            "student_id": "s1" if i % 2 else "s2",
+            "created_at": f"2026-02-0{i + 1}T10:00:00+00:00",
+            "status": "READY",
+        }
+        for i in range(6)
+    ]
+    sb = FakeAsyncClient({"lessons": keyset_table(lessons)})
+    monkeypatch.setattr(students_routes, "supabase_async", returns(sb))
+
+    first = asyncio.run(students_routes.list_student_lessons("s1", "Bearer t", 2, None, None))
+    assert [row["id"] for row in first["data"]["lessons"]] == ["l5", "l3"]
+    cursor = first["data"]["nextCursor"]
+    second = asyncio.run(students_routes.list_student_lessons("s1", "Bearer t", 2, cursor, None))
+    assert [row["id"] for row in second["data"]["lessons"]] == ["l1"]
+    assert second["data"]["nextCursor"] is None
+
+    columns = sb.calls[0][2]
+    assert "transcript" not in columns and "extraction" not in columns
+    filters = sb.calls[0][3]
+    assert ("eq", "owner_id", "user-1") in filters and ("eq", "student_id", "s1") in filters
+
+    asyncio.run(students_routes.list_student_lessons("s1", "Bearer t", 2, None, "title,transcript"))
+    assert sb.calls[-1][2] == "created_at, id, title, transcript"
+
+
+def test_create_students_batch_inserts_once(monkeypatch) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    sb = FakeAsyncClient({})
+    monkeypatch.setattr(students_routes, "supabase_async", returns(sb))
+
+    items = [{"name": f" Student {i} ", "instrument": "piano"} for i in range(300)]
+    items[10] = {"name": "  "}
+    items[250] = {"name": "Ava", "parent_email": 42}
+
+    resp = asyncio.run(students_routes.create_students_batch({"students": items}, "Bearer t"))
+
+    data = resp["data"]
+    assert (data["succeeded"], data["failed"]) == (298, 2)
+    assert [r["index"] for r in data["results"]] == list(range(300))
+    assert data["results"][10]["error"]["code"] == "VALIDATION"
+    assert data["results"][250]["error"]["message"] == "parent_email must be a string"
+    assert data["results"][11]["student"]["name"] == "Student 11"
+    inserts = sb.inserts("students")
+    assert len(inserts) == 1 and len(inserts[0]) == 298
+    assert all(row["owner_id"] == "user-1" for row in inserts[0])
+
+
+def test_create_students_batch_limits_size(monkeypatch) -> None:
+    monkeypatch.setattr(students_routes, "verify_supabase_token", returns("user-1"))
+    monkeypatch.setattr(settings, "batch_max_items", 5)
+    sb = FakeAsyncClient({})
+    monkeypatch.setattr(students_routes, "supabase_async", returns(sb))
+
+    for payload in ({"students": [{"name": "A"}] * 6}, {"students": []}, {}):
+        with pytest.raises(AppError) as exc:
+            asyncio.run(students_routes.create_students_batch(payload, "Bearer t"))
+        assert exc.value.code == "VALIDATION"
+    assert sb.calls == []
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import hashlib
+import io
+
+from services.api.tests.fakes import FakeClient
+
+from app.services import transcripts
+
+
+class CountingTranscriptions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, model: str, file):
+        self.calls += 1
+        return type("Result", (), {"text": "transcript text"})()
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.audio = type("Audio", (), {})()
+        self.audio.transcriptions = CountingTranscriptions()
+
+
+class RecordingReader(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.reads: list[int] = []
+
+    def read(self, size: int = -1) -> bytes:
+        self.reads.append(size)
+        return super().read(size)
+
+
+def test_audio_digest_streams_in_chunks(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(transcripts, "HASH_CHUNK_SIZE", 1024)
+    data = bytes(range(256)) * 40
+    path = tmp_path / "audio.wav"
+    path.write_bytes(data)
+
+    assert transcripts.audio_digest(str(path)) == hashlib.sha256(data).hexdigest()
+
+    reader = RecordingReader(data)
+    assert transcripts.audio_digest(reader) == hashlib.sha256(data).hexdigest()
+    assert reader.reads and all(size == 1024 for size in reader.reads)
+    assert reader.tell() == 0
+
+
+def test_repeat_audio_reuses_transcript(tmp_path) -> None:
+    path = tmp_path / "audio.wav"
+    path.write_bytes(b"same recording")
+    oai = FakeOpenAI()
+    store: dict = {"audio_transcripts": []}
+    sb = FakeClient(store)
+
+    transcript, digest = transcripts.cached_transcribe(sb, oai, str(path))
+    assert transcript == "transcript text"
+    assert oai.audio.transcriptions.calls == 1
+    saved = sb.upserts("audio_transcripts")[0]
+    assert saved["audio_sha256"] == digest
+
+    # A retry or re-submission of the same bytes finds the stored transcript.
+    store["audio_transcripts"] = [saved]
+    again, again_digest = transcripts.cached_transcribe(sb, oai, str(path))
+    assert again == "transcript text"
+    assert again_digest == digest
+    assert oai.audio.transcriptions.calls == 1
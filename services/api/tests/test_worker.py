@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import io
+import threading
+import time
+
+from services.api.tests.fakes import FakeClient
+
+from app import worker as worker_mod
+from app.services import lesson_pipeline
+from app.worker import Worker, WorkerPool
+
+EXTRACTION = {"student": "Sam"}
+OUTPUTS = {"student_recap": "recap", "practice_plan": "plan", "parent_email": "email"}
+
+
+def fake_stages(monkeypatch, calls: list | None = None) -> None:
+    calls = calls if calls is not None else []
+
+    def transcribe(_sb, _oai, audio, on_progress=None, filename=""):
+        calls.append("transcribe")
+        assert audio.read() == b"audio"
+        assert filename == "b.wav"
+        return "transcript text", "sha"
+
+    def extract(_oai, transcript):
+        calls.append("extract")
+        return EXTRACTION
+
+    def generate(_oai, extraction, names=None, on_output=None):
+        calls.append("generate")
+        return OUTPUTS
+
+    monkeypatch.setattr(lesson_pipeline, "fetch_audio", lambda _path: io.BytesIO(b"audio"))
+    monkeypatch.setattr(lesson_pipeline, "cached_transcribe", transcribe)
+    monkeypatch.setattr(lesson_pipeline, "cached_extract", extract)
+    monkeypatch.setattr(lesson_pipeline, "cached_generate", generate)
+
+
+def queue_store(jobs: list[dict]) -> dict:
+    lock = threading.Lock()
+
+    def claim(_params):
+        with lock:
+            return [jobs.pop(0)] if jobs else []
+
+    return {
+        "rpc:claim_job": claim,
+        "lessons": [{"id": "lesson-1", "owner_id": "user-1", "audio_path": "a/b.wav"}],
+    }
+
+
+def test_run_once_empty_queue() -> None:
+    sb = FakeClient(queue_store([]))
+    assert Worker(sb, object(), "w1").run_once() is False
+
+
+def test_run_once_processes_job(monkeypatch) -> None:
+    fake_stages(monkeypatch)
+    sb = FakeClient(queue_store([{"id": "job-1", "lesson_id": "lesson-1", "attempts": 1}]))
+
+    assert Worker(sb, object(), "w1").run_once() is True
+
+    steps = [u["step"] for u in sb.updates("jobs")]
+    assert steps == ["TRANSCRIBING", "EXTRACTING", "GENERATING"]
+    (done,) = sb.rpcs("complete_lesson")
+    assert done == {
+        "p_job_id": "job-1",
+        "p_lesson_id": "lesson-1",
+        "p_transcript": "transcript text",
+        "p_audio_sha256": "sha",
+        "p_extraction": EXTRACTION,
+        "p_outputs": OUTPUTS,
+    }
+    # Results are only written by the RPC, in one transaction.
+    assert sb.inserts("outputs") == []
+    assert [u["status"] for u in sb.updates("lessons")] == ["TRANSCRIBING", "EXTRACTING", "GENERATING"]
+
+
+def test_run_once_publishes_progress_events(monkeypatch) -> None:
+    fake_stages(monkeypatch)
+    published: list[tuple[str, dict]] = []
+    monkeypatch.setattr(lesson_pipeline.bus, "publish", lambda lesson_id, changes: published.append((lesson_id, changes)))
+    sb = FakeClient(queue_store([{"id": "job-1", "lesson_id": "lesson-1", "attempts": 1}]))
+
+    Worker(sb, object(), "w1").run_once()
+
+    assert {lesson_id for lesson_id, _ in published} == {"lesson-1"}
+    assert [c.get("status") for _, c in published] == ["TRANSCRIBING", "EXTRACTING", "GENERATING", "READY"]
+    assert published[-1][1]["progress"] == 100
+
+
+def test_failure_is_retried_with_backoff(monkeypatch) -> None:
+    fake_stages(monkeypatch)
+
+    def boom(_oai, _transcript):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(lesson_pipeline, "cached_extract", boom)
+    sb = FakeClient(queue_store([{"id": "job-1", "lesson_id": "lesson-1", "attempts": 1}]))
+
+    Worker(sb, object(), "w1").run_once()
+
+    (failed,) = sb.rpcs("fail_lesson")
+    assert failed["p_job_id"] == "job-1"
+    assert failed["p_message"] == "model unavailable"
+    assert failed["p_retry_at"] is not None
+    assert sb.rpcs("complete_lesson") == []
+
+
+def test_failure_after_max_attempts_marks_failed(monkeypatch) -> None:
+    fake_stages(monkeypatch)
+
+    def boom(_oai, _transcript):
+        raise RuntimeError("still broken")
+
+    monkeypatch.setattr(lesson_pipeline, "cached_extract", boom)
+    monkeypatch.setattr(worker_mod.settings, "job_max_attempts", 2)
+    sb = FakeClient(queue_store([{"id": "job-1", "lesson_id": "lesson-1", "attempts": 2}]))
+
+    Worker(sb, object(), "w1").run_once()
+
+    (failed,) = sb.rpcs("fail_lesson")
+    assert failed["p_retry_at"] is None
+    assert failed["p_code"] == "UNKNOWN"
+    assert failed["p_message"] == "still broken"
+
+
+def test_retry_delay_grows_and_is_capped(monkeypatch) -> None:
+    monkeypatch.setattr(worker_mod.settings, "job_retry_base_seconds", 10)
+    monkeypatch.setattr(worker_mod.settings, "job_retry_max_seconds", 60)
+    assert 5 <= worker_mod.retry_delay(1) <= 10
+    assert 20 <= worker_mod.retry_delay(3) <= 40
+    assert worker_mod.retry_delay(10) <= 60
+
+
+def test_concurrent_workers_claim_each_job_once(monkeypatch) -> None:
+    fake_stages(monkeypatch)
+    monkeypatch.setattr(worker_mod.settings, "worker_poll_seconds", 0.01)
+    jobs = [{"id": f"job-{i}", "lesson_id": "lesson-1", "attempts": 1} for i in range(20)]
+    sb = FakeClient(queue_store(jobs))
+
+    pool = WorkerPool([Worker(sb, object(), f"w{i}") for i in range(4)]).start()
+    deadline = time.monotonic() + 5
+    while jobs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pool.stop(timeout=5)
+
+    done = [params["p_job_id"] for params in sb.rpcs("complete_lesson")]
+    assert sorted(done) == sorted(f"job-{i}" for i in range(20))
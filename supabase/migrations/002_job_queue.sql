@@ -0,0 +1,40 @@
+-- Job queue: the API enqueues, workers claim rows and drive the pipeline.
+
+alter table public.jobs
+  add column if not exists run_after timestamptz not null default now(),
+  add column if not exists locked_by text null,
+  add column if not exists locked_at timestamptz null;
+
+alter table public.lessons
+  add column if not exists extraction jsonb null;
+
+create index if not exists idx_jobs_claimable
+  on public.jobs (run_after, created_at)
+  where step not in ('DONE', 'FAILED');
+
+-- Atomically claim the next runnable job.
+-- SKIP LOCKED lets any number of workers (threads or processes) poll concurrently
+-- without blocking each other or double claiming. A lease that is not refreshed
+-- within p_lease_seconds is considered abandoned (crashed worker) and can be reclaimed.
+create or replace function public.claim_job(p_worker text, p_lease_seconds int default 900)
+returns setof public.jobs
+language sql
+as $$
+  update public.jobs j
+  set locked_by = p_worker,
+      locked_at = now(),
+      attempts = j.attempts + 1
+  where j.id = (
+    select q.id
+    from public.jobs q
+    where q.step not in ('DONE', 'FAILED')
+      and q.run_after <= now()
+      and (q.locked_by is null or q.locked_at < now() - make_interval(secs => p_lease_seconds))
+    order by q.run_after, q.created_at
+    for update skip locked
+    limit 1
+  )
+  returning j.*;
+$$;
+
+revoke execute on function public.claim_job(text, int) from public, anon, authenticated;
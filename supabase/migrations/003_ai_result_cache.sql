@@ -0,0 +1,16 @@
+-- Content-addressed cache of extraction and generation results.
+-- key = kind:sha256(model, prompt text, schema text, input); see app/services/result_cache.py.
+-- Only the service role reads or writes it (RLS on, no policies).
+
+create table if not exists public.ai_result_cache (
+  key text primary key,
+  kind text not null,
+  value jsonb not null,
+  created_at timestamptz not null default now(),
+  expires_at timestamptz not null
+);
+
+create index if not exists idx_ai_result_cache_expires_at
+  on public.ai_result_cache (expires_at);
+
+alter table public.ai_result_cache enable row level security;
@@ -0,0 +1,18 @@
+-- Transcripts keyed by audio content hash, so identical recordings are transcribed once.
+
+create table if not exists public.audio_transcripts (
+  audio_sha256 text not null,
+  model text not null,
+  transcript text not null,
+  created_at timestamptz not null default now(),
+  primary key (audio_sha256, model)
+);
+
+alter table public.audio_transcripts enable row level security;
+
+alter table public.lessons
+  add column if not exists audio_sha256 text null;
+
+create index if not exists idx_lessons_audio_sha256
+  on public.lessons (audio_sha256)
+  where audio_sha256 is not null;
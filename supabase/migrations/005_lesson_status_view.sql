@@ -0,0 +1,26 @@
+-- Lesson status in one round-trip: the lesson joined with its latest job,
+-- projected to the columns GET /v1/lessons/{id}/status returns (no transcript or extraction).
+
+create index if not exists idx_jobs_lesson_latest
+  on public.jobs (lesson_id, created_at desc);
+
+-- security_invoker keeps the lessons/jobs RLS policies in force for non-service callers.
+create or replace view public.lesson_status_v
+with (security_invoker = true)
+as
+select
+  l.id as lesson_id,
+  l.owner_id,
+  l.status,
+  j.step,
+  j.progress,
+  j.last_error,
+  j.updated_at as job_updated_at
+from public.lessons l
+left join lateral (
+  select q.step, q.progress, q.last_error, q.updated_at
+  from public.jobs q
+  where q.lesson_id = l.id
+  order by q.created_at desc
+  limit 1
+) j on true;
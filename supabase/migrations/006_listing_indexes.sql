@@ -0,0 +1,9 @@
+-- Keyset pagination for GET /v1/students and GET /v1/students/{id}/lessons.
+-- Both list newest first on (created_at, id) within one owner; these indexes serve the
+-- filter, the order and the cursor comparison from one index range scan.
+
+create index if not exists idx_students_owner_created
+  on public.students (owner_id, created_at desc, id desc);
+
+create index if not exists idx_lessons_owner_student_created
+  on public.lessons (owner_id, student_id, created_at desc, id desc);
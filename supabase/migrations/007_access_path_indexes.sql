@@ -0,0 +1,23 @@
+-- Secondary indexes for the remaining access paths. 001 only had primary keys, so every
+-- owner, lesson or recency filter was a sequential scan; RLS adds auth.uid() = owner_id to
+-- every client query on top. Covered elsewhere: jobs by lesson (005), student and per-student
+-- lesson listings (006), claimable jobs (002), cache expiry (003).
+-- services/api/tests/test_query_plans.py checks each API query against these with EXPLAIN.
+
+-- Outputs of a lesson (review screen, output generation, save by type).
+create index if not exists idx_outputs_lesson_type
+  on public.outputs (lesson_id, type);
+
+-- A teacher's recent outputs and lessons across students (RLS-scoped client queries).
+create index if not exists idx_outputs_owner_created
+  on public.outputs (owner_id, created_at desc);
+
+create index if not exists idx_lessons_owner_created
+  on public.lessons (owner_id, created_at desc, id desc);
+
+-- Foreign keys without a leading index make the cascades from students and profiles scan.
+create index if not exists idx_lessons_student
+  on public.lessons (student_id);
+
+create index if not exists idx_jobs_owner
+  on public.jobs (owner_id);
@@ -0,0 +1,33 @@
+-- Batch writes for PATCH /v1/outputs:batch and POST /v1/outputs/sent:batch.
+-- PostgREST can only apply one set of values per update, so each batch is one call that
+-- joins the items (a jsonb array) against outputs. p_owner scopes every row to the caller;
+-- ids that belong to someone else are simply not updated and not returned.
+
+create or replace function public.update_outputs_batch(p_owner uuid, p_items jsonb)
+returns setof public.outputs
+language sql
+as $$
+  update public.outputs o
+  set edited_content = i.edited_content
+  from jsonb_to_recordset(p_items) as i(id uuid, edited_content text)
+  where o.id = i.id
+    and o.owner_id = p_owner
+  returning o.*;
+$$;
+
+create or replace function public.mark_outputs_sent(p_owner uuid, p_items jsonb)
+returns setof public.outputs
+language sql
+as $$
+  update public.outputs o
+  set sent_to = i.sent_to,
+      sent_via = i.sent_via,
+      sent_at = now()
+  from jsonb_to_recordset(p_items) as i(id uuid, sent_to text, sent_via text)
+  where o.id = i.id
+    and o.owner_id = p_owner
+  returning o.*;
+$$;
+
+revoke execute on function public.update_outputs_batch(uuid, jsonb) from public, anon, authenticated;
+revoke execute on function public.mark_outputs_sent(uuid, jsonb) from public, anon, authenticated;
@@ -0,0 +1,89 @@
+-- Pipeline results and failures are persisted in one transaction per call, so a crash or
+-- network error between writes can no longer leave outputs without a READY lesson, or a
+-- FAILED lesson whose job is still running. Called by app/services/lesson_pipeline.py and
+-- app/worker.py with the service role.
+
+-- Save transcript, extraction and outputs, then mark the lesson READY and the job DONE.
+-- p_outputs is {"student_recap": "...", ...}. Outputs that already exist for the lesson
+-- (a previous run, or a regeneration) get their content replaced; edited_content is kept.
+create or replace function public.complete_lesson(
+  p_job_id uuid,
+  p_lesson_id uuid,
+  p_transcript text,
+  p_audio_sha256 text,
+  p_extraction jsonb,
+  p_outputs jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+  v_owner uuid;
+begin
+  select owner_id into v_owner from public.lessons where id = p_lesson_id for update;
+  if v_owner is null then
+    raise exception 'lesson % not found', p_lesson_id using errcode = 'P0002';
+  end if;
+
+  update public.outputs o
+  set content = x.value
+  from jsonb_each_text(p_outputs) x
+  where o.lesson_id = p_lesson_id and o.type = x.key;
+
+  insert into public.outputs (owner_id, lesson_id, type, content)
+  select v_owner, p_lesson_id, x.key, x.value
+  from jsonb_each_text(p_outputs) x
+  where not exists (
+    select 1 from public.outputs o where o.lesson_id = p_lesson_id and o.type = x.key
+  );
+
+  update public.lessons
+  set status = 'READY',
+      transcript = p_transcript,
+      audio_sha256 = p_audio_sha256,
+      extraction = p_extraction,
+      error_code = null,
+      error_message = null
+  where id = p_lesson_id;
+
+  update public.jobs
+  set step = 'DONE', progress = 100, last_error = null, locked_by = null, locked_at = null
+  where id = p_job_id;
+end;
+$$;
+
+-- Record a failed attempt. With p_retry_at the job is requeued for that time and the lesson
+-- shows QUEUED; without it both are marked FAILED with the error.
+create or replace function public.fail_lesson(
+  p_job_id uuid,
+  p_lesson_id uuid,
+  p_code text,
+  p_message text,
+  p_retry_at timestamptz default null
+)
+returns void
+language plpgsql
+as $$
+begin
+  if p_retry_at is not null then
+    update public.jobs
+    set step = 'QUEUED', last_error = p_message, run_after = p_retry_at,
+        locked_by = null, locked_at = null
+    where id = p_job_id;
+    update public.lessons set status = 'QUEUED' where id = p_lesson_id;
+  else
+    update public.jobs
+    set step = 'FAILED', progress = 100, last_error = p_message,
+        locked_by = null, locked_at = null
+    where id = p_job_id;
+    update public.lessons
+    set status = 'FAILED', error_code = p_code, error_message = p_message
+    where id = p_lesson_id;
+  end if;
+end;
+$$;
+
+revoke execute on function public.complete_lesson(uuid, uuid, text, text, jsonb, jsonb)
+  from public, anon, authenticated;
+revoke execute on function public.fail_lesson(uuid, uuid, text, text, timestamptz)
+  from public, anon, authenticated;
@@ -0,0 +1,66 @@
+-- Per-stage results of a lesson's pipeline run, so a retried job resumes from the first
+-- incomplete stage instead of starting again from the audio (app/services/checkpoints.py).
+-- stage: transcript | extraction | output:<name>
+-- input_hash: hash of everything the stage read (model, prompt, upstream result); a
+-- checkpoint whose hash no longer matches is recomputed.
+
+create table if not exists public.pipeline_checkpoints (
+  lesson_id uuid not null references public.lessons(id) on delete cascade,
+  stage text not null,
+  input_hash text not null,
+  payload jsonb not null,
+  created_at timestamptz not null default now(),
+  primary key (lesson_id, stage)
+);
+
+-- Service role only (RLS on, no policies).
+alter table public.pipeline_checkpoints enable row level security;
+
+-- complete_lesson (009) now also drops the lesson's checkpoints in the same transaction.
+create or replace function public.complete_lesson(
+  p_job_id uuid,
+  p_lesson_id uuid,
+  p_transcript text,
+  p_audio_sha256 text,
+  p_extraction jsonb,
+  p_outputs jsonb
+)
+returns void
+language plpgsql
+as $$
+declare
+  v_owner uuid;
+begin
+  select owner_id into v_owner from public.lessons where id = p_lesson_id for update;
+  if v_owner is null then
+    raise exception 'lesson % not found', p_lesson_id using errcode = 'P0002';
+  end if;
+
+  update public.outputs o
+  set content = x.value
+  from jsonb_each_text(p_outputs) x
+  where o.lesson_id = p_lesson_id and o.type = x.key;
+
+  insert into public.outputs (owner_id, lesson_id, type, content)
+  select v_owner, p_lesson_id, x.key, x.value
+  from jsonb_each_text(p_outputs) x
+  where not exists (
+    select 1 from public.outputs o where o.lesson_id = p_lesson_id and o.type = x.key
+  );
+
+  update public.lessons
+  set status = 'READY',
+      transcript = p_transcript,
+      audio_sha256 = p_audio_sha256,
+      extraction = p_extraction,
+      error_code = null,
+      error_message = null
+  where id = p_lesson_id;
+
+  update public.jobs
+  set step = 'DONE', progress = 100, last_error = null, locked_by = null, locked_at = null
+  where id = p_job_id;
+
+  delete from public.pipeline_checkpoints where lesson_id = p_lesson_id;
+end;
+$$;
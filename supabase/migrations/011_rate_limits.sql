@@ -0,0 +1,62 @@
+-- Token buckets shared by every API and worker process (OPENAI_RATE_STORE=table),
+-- used by app/services/rate_governor.py. One row per budget: "openai:requests",
+-- "openai:tokens"; a 429 pauses the base key ("openai") for everyone.
+
+create table if not exists public.rate_limits (
+  key text primary key,
+  tokens double precision not null default 0,
+  refilled_at timestamptz not null default now(),
+  paused_until timestamptz null
+);
+
+alter table public.rate_limits enable row level security;
+
+-- Take p_amount from the bucket (capacity and refill: p_per_minute per minute) and return
+-- how many seconds the caller must wait before sending. The bucket may go negative, so
+-- callers are spaced out in the order they reserved.
+create or replace function public.rate_reserve(p_key text, p_amount double precision, p_per_minute double precision)
+returns double precision
+language plpgsql
+as $$
+declare
+  v_tokens double precision;
+  v_pause double precision;
+begin
+  insert into public.rate_limits (key, tokens) values (p_key, p_per_minute)
+  on conflict (key) do nothing;
+
+  update public.rate_limits
+  set tokens = least(p_per_minute,
+                     tokens + extract(epoch from now() - refilled_at) * p_per_minute / 60)
+               - least(p_amount, p_per_minute),
+      refilled_at = now()
+  where key = p_key
+  returning tokens into v_tokens;
+
+  select coalesce(extract(epoch from max(paused_until) - now()), 0) into v_pause
+  from public.rate_limits
+  where key = split_part(p_key, ':', 1);
+
+  return greatest(0, -v_tokens * 60 / p_per_minute, v_pause);
+end;
+$$;
+
+-- Pause every caller of p_key for p_seconds (after a 429) and drain its buckets.
+create or replace function public.rate_pause(p_key text, p_seconds double precision)
+returns void
+language sql
+as $$
+  insert into public.rate_limits (key, paused_until)
+  values (p_key, now() + make_interval(secs => p_seconds))
+  on conflict (key) do update
+  set paused_until = greatest(coalesce(public.rate_limits.paused_until, now()), excluded.paused_until);
+
+  update public.rate_limits
+  set tokens = least(tokens, 0), refilled_at = now()
+  where key like p_key || ':%';
+$$;
+
+revoke execute on function public.rate_reserve(text, double precision, double precision)
+  from public, anon, authenticated;
+revoke execute on function public.rate_pause(text, double precision)
+  from public, anon, authenticated;
@@ -0,0 +1,84 @@
+-- Cross-process single flight for AI calls (SINGLE_FLIGHT_BACKEND=table), used by
+-- app/services/single_flight.py. The first process to claim a key runs the call and
+-- publishes its result or error on the row; other processes poll the row instead of
+-- calling OpenAI again, and take over if the leader's lease expires first.
+
+create table if not exists public.inflight_calls (
+  key text primary key,
+  holder text not null,
+  state text not null default 'running' check (state in ('running', 'done', 'failed')),
+  result jsonb null,
+  error jsonb null,
+  expires_at timestamptz not null,
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists idx_inflight_calls_expires_at
+  on public.inflight_calls (expires_at);
+
+-- Service role only (RLS on, no policies).
+alter table public.inflight_calls enable row level security;
+
+-- Claim p_key for p_lease_seconds unless another holder's lease is still live.
+-- Returns {"claimed": true}, or the current row: {"claimed": false, "state", "result", "error"}.
+create or replace function public.inflight_claim(p_key text, p_holder text, p_lease_seconds integer)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_row public.inflight_calls%rowtype;
+begin
+  insert into public.inflight_calls (key, holder, state, expires_at)
+  values (p_key, p_holder, 'running', now() + make_interval(secs => p_lease_seconds))
+  on conflict (key) do update
+  set holder = excluded.holder,
+      state = 'running',
+      result = null,
+      error = null,
+      expires_at = excluded.expires_at,
+      updated_at = now()
+  where public.inflight_calls.expires_at <= now()
+  returning * into v_row;
+
+  if found then
+    return jsonb_build_object('claimed', true);
+  end if;
+
+  select * into v_row from public.inflight_calls where key = p_key;
+  return jsonb_build_object(
+    'claimed', false,
+    'state', v_row.state,
+    'result', v_row.result,
+    'error', v_row.error
+  );
+end;
+$$;
+
+-- Publish the outcome of a claimed call. The row is kept p_keep_seconds for pollers,
+-- then the key is free again. Rows finished long ago are cleared on the way.
+create or replace function public.inflight_finish(
+  p_key text,
+  p_holder text,
+  p_result jsonb,
+  p_error jsonb,
+  p_keep_seconds integer
+)
+returns void
+language sql
+as $$
+  update public.inflight_calls
+  set state = case when p_error is null then 'done' else 'failed' end,
+      result = p_result,
+      error = p_error,
+      expires_at = now() + make_interval(secs => p_keep_seconds),
+      updated_at = now()
+  where key = p_key and holder = p_holder;
+
+  delete from public.inflight_calls
+  where expires_at < now() - interval '1 hour';
+$$;
+
+revoke execute on function public.inflight_claim(text, text, integer)
+  from public, anon, authenticated;
+revoke execute on function public.inflight_finish(text, text, jsonb, jsonb, integer)
+  from public, anon, authenticated;
@@ -0,0 +1,95 @@
+-- Idempotency-Key support for mutating routes (app/idempotency.py). One row per
+-- (owner, key): the first request claims it, stores its response when done, and replays
+-- within the TTL return that response instead of writing again.
+-- status pending: the first request is still running; its lock lapses at expires_at so a
+-- crashed request does not block the key. status done: response is replayed until expires_at.
+
+create table if not exists public.idempotency_keys (
+  owner_id uuid not null references public.profiles(id) on delete cascade,
+  key text not null,
+  scope text not null,
+  request_hash text not null,
+  status text not null default 'pending' check (status in ('pending', 'done')),
+  response jsonb null,
+  created_at timestamptz not null default now(),
+  expires_at timestamptz not null,
+  primary key (owner_id, key)
+);
+
+create index if not exists idx_idempotency_keys_expires_at
+  on public.idempotency_keys (expires_at);
+
+-- Service role only (RLS on, no policies).
+alter table public.idempotency_keys enable row level security;
+
+-- Claim (p_owner, p_key) unless a live row holds it. The primary key serializes concurrent
+-- duplicates: exactly one of them gets {"claimed": true}; the others get the current row
+-- ({"claimed": false, "scope", "request_hash", "status", "response"}) and replay or wait.
+create or replace function public.idempotency_claim(
+  p_owner uuid,
+  p_key text,
+  p_scope text,
+  p_request_hash text,
+  p_lock_seconds integer
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+  v_row public.idempotency_keys%rowtype;
+begin
+  insert into public.idempotency_keys (owner_id, key, scope, request_hash, status, expires_at)
+  values (p_owner, p_key, p_scope, p_request_hash, 'pending', now() + make_interval(secs => p_lock_seconds))
+  on conflict (owner_id, key) do update
+  set scope = excluded.scope,
+      request_hash = excluded.request_hash,
+      status = 'pending',
+      response = null,
+      created_at = now(),
+      expires_at = excluded.expires_at
+  where public.idempotency_keys.expires_at <= now()
+  returning * into v_row;
+
+  if found then
+    return jsonb_build_object('claimed', true);
+  end if;
+
+  select * into v_row
+  from public.idempotency_keys
+  where owner_id = p_owner and key = p_key;
+
+  return jsonb_build_object(
+    'claimed', false,
+    'scope', v_row.scope,
+    'request_hash', v_row.request_hash,
+    'status', v_row.status,
+    'response', v_row.response
+  );
+end;
+$$;
+
+-- Store the response of a claimed key and keep it for p_ttl_seconds.
+-- Keys that expired a day ago are cleared on the way.
+create or replace function public.idempotency_complete(
+  p_owner uuid,
+  p_key text,
+  p_response jsonb,
+  p_ttl_seconds integer
+)
+returns void
+language sql
+as $$
+  update public.idempotency_keys
+  set status = 'done',
+      response = p_response,
+      expires_at = now() + make_interval(secs => p_ttl_seconds)
+  where owner_id = p_owner and key = p_key;
+
+  delete from public.idempotency_keys
+  where expires_at < now() - interval '1 day';
+$$;
+
+revoke execute on function public.idempotency_claim(uuid, text, text, text, integer)
+  from public, anon, authenticated;
+revoke execute on function public.idempotency_complete(uuid, text, jsonb, integer)
+  from public, anon, authenticated;
@@ -0,0 +1,35 @@
+-- PATCH /v1/lessons/{id}/extraction (app/services/extraction_edits.py): save the corrected
+-- extraction and the outputs regenerated from it in one transaction. p_outputs holds only
+-- the regenerated outputs ({"practice_plan": "..."}); the others are not touched, and
+-- edited_content is never changed. Returns the updated output rows.
+
+create or replace function public.apply_extraction_edit(
+  p_owner uuid,
+  p_lesson_id uuid,
+  p_extraction jsonb,
+  p_outputs jsonb
+)
+returns setof public.outputs
+language plpgsql
+as $$
+begin
+  update public.lessons
+  set extraction = p_extraction
+  where id = p_lesson_id and owner_id = p_owner;
+  if not found then
+    raise exception 'lesson % not found', p_lesson_id using errcode = 'P0002';
+  end if;
+
+  return query
+  update public.outputs o
+  set content = x.value
+  from jsonb_each_text(p_outputs) x
+  where o.lesson_id = p_lesson_id
+    and o.owner_id = p_owner
+    and o.type = x.key
+  returning o.*;
+end;
+$$;
+
+revoke execute on function public.apply_extraction_edit(uuid, uuid, jsonb, jsonb)
+  from public, anon, authenticated;
@@ -0,0 +1,137 @@
+-- Fair scheduling for claim_job: start-time fair queueing across owners, with two lanes.
+-- One teacher bulk-uploading 40 lessons no longer holds up everyone else's single lesson.
+--
+-- - Every job gets a virtual start tag (vstart) when it is inserted:
+--     vstart = greatest(lane clock, the owner's previous finish tag)
+--     finish = vstart + 1 / weight        (weight from profiles.plan via plan_weights)
+--   so an owner's backlog is spread out in virtual time, while a newly arriving owner starts
+--   at the current clock and is served after at most one job per other active owner.
+-- - claim_job takes the runnable job with the lowest vstart and advances the lane clock to it.
+-- - Lanes: interactive jobs (the default) are always claimed before bulk (backfill) jobs;
+--   bulk jobs only wait while interactive work is runnable.
+-- services/api/tests/test_fair_queue.py simulates wait times with a model of these rules.
+
+create table if not exists public.plan_weights (
+  plan text primary key,
+  weight double precision not null check (weight > 0)
+);
+
+insert into public.plan_weights (plan, weight)
+values ('SOLO', 1), ('STUDIO', 2)
+on conflict (plan) do nothing;
+
+alter table public.jobs
+  add column if not exists lane text not null default 'interactive'
+    check (lane in ('interactive', 'bulk')),
+  add column if not exists vstart double precision not null default 0;
+
+-- Per lane virtual clock: the start tag of the latest claimed job.
+create table if not exists public.queue_clock (
+  lane text primary key,
+  vtime double precision not null default 0
+);
+
+insert into public.queue_clock (lane)
+values ('interactive'), ('bulk')
+on conflict (lane) do nothing;
+
+-- Finish tag of each owner's latest job, per lane.
+create table if not exists public.queue_tenants (
+  owner_id uuid not null references public.profiles(id) on delete cascade,
+  lane text not null,
+  vfinish double precision not null,
+  primary key (owner_id, lane)
+);
+
+-- Service role only (RLS on, no policies).
+alter table public.plan_weights enable row level security;
+alter table public.queue_clock enable row level security;
+alter table public.queue_tenants enable row level security;
+
+-- security definer: queue_clock and queue_tenants are service-only, whoever inserts the job.
+create or replace function public.jobs_assign_vstart()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  v_cost double precision;
+  v_clock double precision;
+  v_finish double precision;
+begin
+  select 1 / w.weight into v_cost
+  from public.profiles p
+  join public.plan_weights w on w.plan = p.plan
+  where p.id = new.owner_id;
+  v_cost := coalesce(v_cost, 1);
+
+  select vtime into v_clock from public.queue_clock where lane = new.lane;
+  v_clock := coalesce(v_clock, 0);
+
+  insert into public.queue_tenants (owner_id, lane, vfinish)
+  values (new.owner_id, new.lane, v_clock + v_cost)
+  on conflict (owner_id, lane) do update
+  set vfinish = greatest(public.queue_tenants.vfinish, v_clock) + v_cost
+  returning vfinish into v_finish;
+
+  new.vstart := v_finish - v_cost;
+  return new;
+end;
+$$;
+
+drop trigger if exists jobs_assign_vstart on public.jobs;
+create trigger jobs_assign_vstart
+  before insert on public.jobs
+  for each row execute function public.jobs_assign_vstart();
+
+-- claim_job walks this index from the lowest tag, one lane at a time.
+drop index if exists public.idx_jobs_claimable;
+create index if not exists idx_jobs_fair_claim
+  on public.jobs (lane, vstart, created_at)
+  where step not in ('DONE', 'FAILED');
+
+-- Same contract as 002: SKIP LOCKED, lease expiry, attempts counted on claim.
+create or replace function public.claim_job(p_worker text, p_lease_seconds int default 900)
+returns setof public.jobs
+language plpgsql
+as $$
+declare
+  v_lane text;
+  v_id uuid;
+  v_job public.jobs%rowtype;
+begin
+  foreach v_lane in array array['interactive', 'bulk'] loop
+    select q.id into v_id
+    from public.jobs q
+    where q.lane = v_lane
+      and q.step not in ('DONE', 'FAILED')
+      and q.run_after <= now()
+      and (q.locked_by is null or q.locked_at < now() - make_interval(secs => p_lease_seconds))
+    order by q.vstart, q.created_at
+    for update skip locked
+    limit 1;
+    exit when v_id is not null;
+  end loop;
+
+  if v_id is null then
+    return;
+  end if;
+
+  update public.jobs
+  set locked_by = p_worker,
+      locked_at = now(),
+      attempts = attempts + 1
+  where id = v_id
+  returning * into v_job;
+
+  update public.queue_clock
+  set vtime = greatest(vtime, v_job.vstart)
+  where lane = v_job.lane;
+
+  return next v_job;
+end;
+$$;
+
+revoke execute on function public.claim_job(text, int) from public, anon, authenticated;
+revoke execute on function public.jobs_assign_vstart() from public, anon, authenticated;
@@ -0,0 +1,31 @@
+-- POST /v1/lessons inserts the lesson and its job in one transaction (app/routes/lessons.py).
+-- With two separate inserts, a failure after the first left a QUEUED lesson that no worker
+-- would ever pick up, and a retry after the Idempotency-Key lock lapsed created a second one.
+
+-- Returns the new lesson id. The job goes through jobs_assign_vstart (015) like any insert.
+create or replace function public.create_lesson(
+  p_owner uuid,
+  p_student_id uuid,
+  p_title text,
+  p_audio_path text,
+  p_lane text default 'interactive'
+)
+returns uuid
+language plpgsql
+as $$
+declare
+  v_lesson_id uuid;
+begin
+  insert into public.lessons (owner_id, student_id, title, status, audio_path)
+  values (p_owner, p_student_id, p_title, 'QUEUED', p_audio_path)
+  returning id into v_lesson_id;
+
+  insert into public.jobs (owner_id, lesson_id, step, progress, lane)
+  values (p_owner, v_lesson_id, 'QUEUED', 0, p_lane);
+
+  return v_lesson_id;
+end;
+$$;
+
+revoke execute on function public.create_lesson(uuid, uuid, text, text, text)
+  from public, anon, authenticated;
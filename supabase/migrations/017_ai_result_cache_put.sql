@@ -0,0 +1,27 @@
+-- Writes to public.ai_result_cache (003) go through ai_cache_put, which also deletes the rows
+-- that have expired. Reads already skipped them, but nothing removed them, so the table grew
+-- without bound. Puts happen on every cache miss, so each call only finds the small slice
+-- that expired since the previous one (idx_ai_result_cache_expires_at).
+create or replace function public.ai_cache_put(
+  p_key text,
+  p_kind text,
+  p_value jsonb,
+  p_ttl_seconds integer
+)
+returns void
+language sql
+as $$
+  insert into public.ai_result_cache (key, kind, value, expires_at)
+  values (p_key, p_kind, p_value, now() + make_interval(secs => p_ttl_seconds))
+  on conflict (key) do update
+  set kind = excluded.kind,
+      value = excluded.value,
+      created_at = now(),
+      expires_at = excluded.expires_at;
+
+  delete from public.ai_result_cache
+  where expires_at < now();
+$$;
+
+revoke execute on function public.ai_cache_put(text, text, jsonb, integer)
+  from public, anon, authenticated;
@@ -0,0 +1,45 @@
+-- Replace a lesson's generated output content in one transaction. Used by
+-- POST /v1/lessons/{id}/generate (app/services/output_stream.py), which previously issued an
+-- update per existing output and an insert for the missing ones: a failure part way left the
+-- lesson with a mix of old and new outputs.
+-- p_outputs is {"student_recap": "...", ...}. Existing outputs get their content replaced
+-- (edited_content is kept); missing ones are inserted. Returns the saved output rows.
+create or replace function public.save_outputs(
+  p_owner uuid,
+  p_lesson_id uuid,
+  p_outputs jsonb
+)
+returns setof public.outputs
+language plpgsql
+as $$
+begin
+  -- Serializes concurrent saves for the lesson, so two of them cannot both insert a type.
+  perform 1 from public.lessons
+  where id = p_lesson_id and owner_id = p_owner
+  for update;
+  if not found then
+    raise exception 'lesson % not found', p_lesson_id using errcode = 'P0002';
+  end if;
+
+  update public.outputs o
+  set content = x.value
+  from jsonb_each_text(p_outputs) x
+  where o.lesson_id = p_lesson_id and o.type = x.key;
+
+  insert into public.outputs (owner_id, lesson_id, type, content)
+  select p_owner, p_lesson_id, x.key, x.value
+  from jsonb_each_text(p_outputs) x
+  where not exists (
+    select 1 from public.outputs o where o.lesson_id = p_lesson_id and o.type = x.key
+  );
+
+  return query
+  select o.*
+  from public.outputs o
+  where o.lesson_id = p_lesson_id and p_outputs ? o.type
+  order by o.created_at;
+end;
+$$;
+
+revoke execute on function public.save_outputs(uuid, uuid, jsonb)
+  from public, anon, authenticated;
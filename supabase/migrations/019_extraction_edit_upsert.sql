@@ -0,0 +1,28 @@
+-- apply_extraction_edit (014) only updated existing outputs: a regenerated output whose row
+-- was missing was silently dropped, while the API still reported it as regenerated. The
+-- outputs are now saved with save_outputs (018), which inserts missing rows, in the same
+-- transaction as the extraction. Returns the saved output rows.
+create or replace function public.apply_extraction_edit(
+  p_owner uuid,
+  p_lesson_id uuid,
+  p_extraction jsonb,
+  p_outputs jsonb
+)
+returns setof public.outputs
+language plpgsql
+as $$
+begin
+  update public.lessons
+  set extraction = p_extraction
+  where id = p_lesson_id and owner_id = p_owner;
+  if not found then
+    raise exception 'lesson % not found', p_lesson_id using errcode = 'P0002';
+  end if;
+
+  return query
+  select * from public.save_outputs(p_owner, p_lesson_id, p_outputs);
+end;
+$$;
+
+revoke execute on function public.apply_extraction_edit(uuid, uuid, jsonb, jsonb)
+  from public, anon, authenticated;